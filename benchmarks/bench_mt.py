@@ -0,0 +1,115 @@
+"""Microbenchmark de las operaciones de matrices de mt.
+
+Compara multiplicar, invertir y el determinante de mt con las versiones
+anteriores (triple ciclo, adjunta por cofactores y expansion recursiva por
+cofactores) para matrices de 3 x 3, 4 x 4 y 6 x 6, y transformar_puntos con
+un ciclo de multiplicar_matriz_vector por punto. Antes de medir revisa los
+resultados contra NumPy:
+
+    python benchmarks/bench_mt.py
+    python benchmarks/bench_mt.py --number 20000 --points 100000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+import mt
+
+
+# Versiones anteriores, tal como estaban en mt
+def old_multiplicar_matrices(matriz1, matriz2):
+    resultado = [[0 for y in range(len(matriz2[0]))] for x in range(len(matriz1))]
+    for i in range(len(matriz1)):
+        for j in range(len(matriz2[0])):
+            for k in range(len(matriz1[0])):
+                resultado[i][j] += matriz1[i][k] * matriz2[k][j]
+    return resultado
+
+def old_multiplicar_matriz_vector(matriz, vector):
+    resultado = [0 for x in range(len(matriz))]
+    for i in range(len(matriz)):
+        for k in range(len(matriz[0])):
+            resultado[i] += matriz[i][k] * vector[k]
+    return resultado
+
+def old_determinante(matriz):
+    if len(matriz) == 2:
+        return matriz[0][0] * matriz[1][1] - matriz[0][1] * matriz[1][0]
+    det = 0
+    for i in range(len(matriz)):
+        submatriz = [fila[1:] for fila in matriz[:i] + matriz[i+1:]]
+        det += ((-1)**i) * matriz[i][0] * old_determinante(submatriz)
+    return det
+
+def old_matriz_inversa(matriz):
+    det = old_determinante(matriz)
+    adjunta = []
+    for i in range(len(matriz)):
+        fila_adjunta = []
+        for j in range(len(matriz)):
+            submatriz = [fila[:j] + fila[j+1:] for fila in (matriz[:i]+matriz[i+1:])]
+            fila_adjunta.append(((-1)**(i+j)) * old_determinante(submatriz))
+        adjunta.append(fila_adjunta)
+    return [[adjunta[j][i] / det for j in range(len(matriz))] for i in range(len(matriz))]
+
+
+def measure(label, new, old, number):
+    after = min(timeit.repeat(new, number=number, repeat=3)) / number
+    before = min(timeit.repeat(old, number=number, repeat=3)) / number
+    print("%-34s %10.0f ns  anterior %10.0f ns  %7.1fx" % (label, after * 1e9, before * 1e9, before / after))
+
+
+def check(rng):
+    # Errores relativos contra NumPy
+    worst = 0
+    for n in (2, 3, 4, 5, 6, 8):
+        for _ in range(20):
+            a = [[rng.uniform(-2, 2) for _ in range(n)] for _ in range(n)]
+            b = [[rng.uniform(-2, 2) for _ in range(n)] for _ in range(n)]
+            A = np.array(a)
+            inverse = np.linalg.inv(A)
+            worst = max(worst,
+                        np.abs(np.array(mt.multiplicar_matrices(a, b)) - A @ np.array(b)).max(),
+                        abs(mt.determinante(a) - np.linalg.det(A)) / max(1, abs(np.linalg.det(A))),
+                        np.abs(np.array(mt.matriz_inversa(a)) - inverse).max() / max(1, np.abs(inverse).max()))
+    return worst
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara las operaciones de matrices de mt con las anteriores.")
+    parser.add_argument("--number", type=int, default=5000, help="llamadas por medicion")
+    parser.add_argument("--points", type=int, default=20000, help="puntos para transformar_puntos")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    worst = check(rng)
+    print("error relativo maximo contra NumPy: %.2e" % worst)
+    if worst > 1e-9:
+        sys.exit(1)
+
+    for n in (3, 4, 6):
+        a = [[rng.uniform(-2, 2) for _ in range(n)] for _ in range(n)]
+        b = [[rng.uniform(-2, 2) for _ in range(n)] for _ in range(n)]
+        number = args.number if n < 6 else max(1, args.number // 50)
+        measure("multiplicar_matrices %dx%d" % (n, n), lambda: mt.multiplicar_matrices(a, b),
+                lambda: old_multiplicar_matrices(a, b), number)
+        measure("determinante %dx%d" % (n, n), lambda: mt.determinante(a), lambda: old_determinante(a), number)
+        measure("matriz_inversa %dx%d" % (n, n), lambda: mt.matriz_inversa(a), lambda: old_matriz_inversa(a), number)
+
+    matrix = mt.multiplicar_matrices([[1, 0, 0, 2], [0, 1, 0, -1], [0, 0, 1, -8], [0, 0, 0, 1]],
+                                     [[0.8, -0.6, 0, 0], [0.6, 0.8, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]])
+    points = np.random.default_rng(args.seed).uniform(-5, 5, (args.points, 3))
+    rows = points.tolist()
+    measure("transformar_puntos %d puntos" % args.points, lambda: mt.transformar_puntos(matrix, points),
+            lambda: [old_multiplicar_matriz_vector(matrix, p + [1])[:3] for p in rows], 3)
+
+
+if __name__ == "__main__":
+    main()
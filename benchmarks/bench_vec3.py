@@ -0,0 +1,103 @@
+"""Microbenchmark de la capa de vectores (vec3).
+
+Mide Sphere.ray_intersect y PointLight.getSpecularColor con las funciones de
+vec3 y con las versiones anteriores (generadores y zip en figures, las de mt
+con validacion de longitud en lights), cambiando solo los nombres que cada
+modulo usa:
+
+    python benchmarks/bench_vec3.py
+    python benchmarks/bench_vec3.py --number 200000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import figures
+import lights
+import mt
+from figures import Sphere, Intercept
+from lights import PointLight
+from materials import Material
+
+
+# Versiones anteriores de las operaciones, tal como estaban en cada modulo
+def old_dot(v1, v2):
+    return sum(x * y for x, y in zip(v1, v2))
+
+def old_add(v1, v2):
+    return [x + y for x, y in zip(v1, v2)]
+
+def old_subtract(v1, v2):
+    return [x - y for x, y in zip(v1, v2)]
+
+def old_multiply(v, scalar):
+    return [x * scalar for x in v]
+
+def old_magnitude(v):
+    return (sum(x ** 2 for x in v)) ** 0.5
+
+def old_normalize(v):
+    mag = old_magnitude(v)
+    return [x / mag for x in v]
+
+def old_reflect(normal, direction):
+    reflect = [2 * old_dot(normal, direction) * i for i in normal]
+    reflect = old_subtract(reflect, direction)
+    return old_normalize(reflect)
+
+
+OLD_FIGURES = {"dot": old_dot, "add": old_add, "subtract": old_subtract,
+               "multiply": old_multiply, "magnitude": old_magnitude, "normalize": old_normalize}
+
+OLD_LIGHTS = {"dot": mt.producto_punto, "subtract": mt.subtract_arrays,
+              "magnitude": mt.calcular_norma, "divide": mt.divide_array_scalar,
+              "normalize": mt.normalizar_vector, "multiply": old_multiply,
+              "reflect": old_reflect}
+
+
+def swapped(module, names):
+    # Reemplaza los nombres del modulo y devuelve los originales
+    previous = {name: getattr(module, name) for name in names}
+    for name, function in names.items():
+        setattr(module, name, function)
+    return previous
+
+
+def measure(label, function, number):
+    seconds = min(timeit.repeat(function, number=number, repeat=3))
+    print("%-40s %8.0f ns/llamada" % (label, seconds / number * 1e9))
+    return seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara vec3 con las operaciones de vectores anteriores.")
+    parser.add_argument("--number", type=int, default=100000, help="llamadas por medicion")
+    args = parser.parse_args(argv)
+
+    material = Material(diffuse=(1, 1, 1), spec=32, Ks=0.5)
+    sphere = Sphere(position=(0, 0, -5), radius=1.5, material=material)
+    orig = [0, 0, 0]
+    dir = figures.normalize([0.1, 0.2, -1])
+
+    light = PointLight(point=(2, 3, 0), intensity=1)
+    intercept = sphere.ray_intersect(orig, dir)
+    viewPos = [0, 0, 0]
+
+    cases = (("Sphere.ray_intersect", figures, OLD_FIGURES, lambda: sphere.ray_intersect(orig, dir)),
+             ("PointLight.getSpecularColor", lights, OLD_LIGHTS, lambda: light.getSpecularColor(intercept, viewPos)))
+
+    for label, module, old, function in cases:
+        new = measure(label + " (vec3)", function, args.number)
+        previous = swapped(module, old)
+        try:
+            before = measure(label + " (anterior)", function, args.number)
+        finally:
+            swapped(module, previous)
+        print("%-40s %8.2fx" % ("", before / new))
+
+
+if __name__ == "__main__":
+    main()
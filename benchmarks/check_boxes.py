@@ -0,0 +1,134 @@
+"""Compara la interseccion de AABB y OBB con una version por fuerza bruta.
+
+La fuerza bruta prueba el rayo contra los seis planos de cada cara en el
+espacio del mundo (para los OBB, las caras ya rotadas), se queda con el
+hit mas cercano cuyo punto cae dentro de la caja y calcula su normal sin
+pasar por el slab test. Se generan cajas al azar (los OBB con rotaciones al
+azar) y rayos hacia ellas y desde adentro, y se comparan la distancia, el
+punto y la normal de ray_intersect, ray_intersect_many y CompiledScene. Sale
+con codigo 1 si alguno difiere:
+
+    python benchmarks/check_boxes.py
+    python benchmarks/check_boxes.py --boxes 200 --rays 500 --seed 3
+"""
+import argparse
+import os
+import random
+import sys
+from math import cos, sin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+from compiled import CompiledScene
+from figures import AABB, OBB
+from materials import Material
+from vec3 import add, subtract, multiply, dot, normalize
+
+TOLERANCE = 1e-6
+
+
+def rotation(rng):
+    # Rotacion al azar como producto de rotaciones sobre x, y y z
+    a, b, c = [rng.uniform(0, 6.3) for _ in range(3)]
+    rx = [[1, 0, 0], [0, cos(a), -sin(a)], [0, sin(a), cos(a)]]
+    ry = [[cos(b), 0, sin(b)], [0, 1, 0], [-sin(b), 0, cos(b)]]
+    rz = [[cos(c), -sin(c), 0], [sin(c), cos(c), 0], [0, 0, 1]]
+    product = lambda m, n: [[sum(m[i][k] * n[k][j] for k in range(3)) for j in range(3)] for i in range(3)]
+    return product(rz, product(ry, rx))
+
+
+def faces(box):
+    # (centro, normal hacia afuera, eje local) de cada cara en el mundo
+    axes = box.rotation if isinstance(box, OBB) else [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    result = []
+    for axis in range(3):
+        column = [axes[i][axis] for i in range(3)]
+        for sign in (-1, 1):
+            normal = [sign * c for c in column]
+            result.append((add(box.position, multiply(normal, box.size[axis] / 2)), normal, axis))
+    return result
+
+
+def brute_force(box, orig, dir):
+    # (t, punto, normal) del hit mas cercano contra las seis caras, o None
+    axes = box.rotation if isinstance(box, OBB) else [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    best = None
+    for center, normal, axis in faces(box):
+        denom = dot(dir, normal)
+        if denom == 0:
+            continue
+        t = dot(subtract(center, orig), normal) / denom
+        if t < 0 or (best is not None and t >= best[0]):
+            continue
+        P = add(orig, multiply(dir, t))
+        offset = subtract(P, box.position)
+        local = [sum(axes[i][j] * offset[i] for i in range(3)) for j in range(3)]
+        if all(abs(local[j]) <= box.size[j] / 2 + TOLERANCE for j in range(3)):
+            best = (t, P, normal)
+    return best
+
+
+def random_ray(rng, box):
+    # Desde afuera hacia un punto de la caja, o desde adentro hacia cualquier lado
+    target = [box.position[i] + rng.uniform(-0.6, 0.6) * box.size[i] for i in range(3)]
+    if rng.random() < 0.2:
+        return [box.position[i] + rng.uniform(-0.3, 0.3) * box.size[i] for i in range(3)], \
+               normalize([rng.uniform(-1, 1) for _ in range(3)])
+    orig = [box.position[i] + rng.uniform(-6, 6) for i in range(3)]
+    return orig, normalize(subtract(target, orig))
+
+
+def close(a, b):
+    return all(abs(a[i] - b[i]) <= TOLERANCE * max(1, abs(b[i])) for i in range(len(b)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara AABB y OBB con la interseccion por fuerza bruta.")
+    parser.add_argument("--boxes", type=int, default=100)
+    parser.add_argument("--rays", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    material = Material()
+    failures = {}
+    rays = 0
+    for k in range(args.boxes):
+        position = [rng.uniform(-5, 5) for _ in range(3)]
+        size = [rng.uniform(0.2, 3) for _ in range(3)]
+        if k % 2:
+            box = OBB(position=position, size=size, rotation_matrix=rotation(rng), material=material)
+        else:
+            box = AABB(position=position, size=size, material=material)
+        compiled = CompiledScene([box])
+        name = type(box).__name__
+
+        samples = [random_ray(rng, box) for _ in range(args.rays)]
+        many = box.ray_intersect_many([o for o, _ in samples], [d for _, d in samples])
+        for i, (orig, dir) in enumerate(samples):
+            rays += 1
+            expected = brute_force(box, orig, dir)
+            intercept = box.ray_intersect(orig, dir)
+            compiledHit = compiled.ray_intersect(orig, dir)
+            if expected is None:
+                ok = intercept is None and compiledHit is None and not many[4][i]
+            else:
+                t, P, normal = expected
+                ok = intercept is not None and compiledHit is not None and many[4][i] and \
+                     close([intercept.distance], [t]) and close(intercept.point, P) and close(intercept.normal, normal) and \
+                     close([compiledHit.distance], [t]) and \
+                     close([many[0][i]], [t]) and close(many[1][i], P) and close(many[2][i], normal)
+            if not ok:
+                failures[name] = failures.get(name, 0) + 1
+
+    print("%d rayos contra %d cajas" % (rays, args.boxes))
+    for name in ("AABB", "OBB"):
+        print("%-5s %s" % (name, "%d distintos" % failures[name] if name in failures else "igual a la fuerza bruta"))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
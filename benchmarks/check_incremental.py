@@ -0,0 +1,98 @@
+"""Comprueba que IncrementalRender.update da la misma imagen que un render completo.
+
+Renderiza la escena del osito (RayTracer.py) con IncrementalRender y aplica
+una tras otra varias ediciones: cambiar una luz, cambiar un material, mover
+una figura (a un lugar donde queda delante de los elipsoides, que reportan
+sus distancias en el espacio escalado), agregar una figura y quitarla. Despues
+de cada update compara la imagen byte a byte con un rtRender completo de la
+escena con las mismas ediciones y muestra cuantos pixeles se recalcularon.
+Sale con codigo 1 si alguna difiere:
+
+    python benchmarks/check_incremental.py
+    python benchmarks/check_incremental.py --width 200 --height 100
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame
+
+from figures import Sphere
+from incremental import IncrementalRender
+from rt import RayTracer
+from RayTracer import build_scene
+
+
+def change_light(raytracer):
+    raytracer.lights[1].intensity = 0.4
+    return {"lights": True}
+
+def change_material(raytracer):
+    raytracer.scene[0].material.diffuse = (1, 0, 0)
+    return {"materials": [raytracer.scene[0].material]}
+
+def move_shape(raytracer):
+    raytracer.scene[2] = Sphere((-0.3, 1.0, -3.5), 0.3, raytracer.scene[2].material)
+    return {}
+
+def add_shape(raytracer):
+    raytracer.scene.append(Sphere((-1, 1.5, -6), 0.5, raytracer.scene[0].material))
+    return {}
+
+def remove_shape(raytracer):
+    del raytracer.scene[-1]
+    return {}
+
+EDITS = [("luz", change_light), ("material", change_material), ("mover", move_shape),
+         ("agregar", add_shape), ("quitar", remove_shape)]
+
+
+def full_render(width, height, edits):
+    surface = pygame.Surface((width, height))
+    raytracer = RayTracer(surface)
+    build_scene(raytracer)
+    for edit in edits:
+        edit(raytracer)
+    raytracer.rtClear()
+    raytracer.rtRender()
+    return pygame.image.tostring(surface, "RGB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara IncrementalRender.update con renders completos.")
+    parser.add_argument("--width", type=int, default=150)
+    parser.add_argument("--height", type=int, default=65)
+    args = parser.parse_args(argv)
+
+    surface = pygame.Surface((args.width, args.height))
+    raytracer = RayTracer(surface)
+    build_scene(raytracer)
+    raytracer.rtClear()
+    incremental = IncrementalRender(raytracer)
+    incremental.render()
+
+    failures = 0
+    done = []
+    for name, edit in EDITS:
+        options = edit(raytracer)
+        done.append(edit)
+        start = time.perf_counter()
+        updated = incremental.update(**options)
+        elapsed = time.perf_counter() - start
+
+        image = pygame.image.tostring(surface, "RGB")
+        expected = full_render(args.width, args.height, done)
+        differ = sum(1 for i in range(0, len(image), 3) if image[i:i + 3] != expected[i:i + 3])
+        failures += differ > 0
+        print("%-9s %5d pixeles en %.3f s  %s" %
+              (name, updated, elapsed, "%d pixeles distintos" % differ if differ else "igual al render completo"))
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Compara las figuras instanciadas (instance.py) con las mismas figuras armadas en el mundo.
+
+Para transformaciones al azar se comparan la distancia, el punto y la
+normal de cada rayo (ray_intersect, ray_intersect_many y ray_hits) entre:
+
+    Instance(Sphere en el origen, traslacion)            y  Sphere
+    Instance(AABB en el origen, rotacion y traslacion)   y  OBB
+    Instance(Mesh en el origen, rotacion y escala)       y  Mesh con los vertices ya transformados
+
+Tambien revisa que la BVH elija el mismo hit que el recorrido lineal
+cuando una instancia de un Ellipsoid (que reporta distancias en el espacio
+escalado) compite con una esfera que esta detras. Ademas mide cuanto tarda
+colocar --copies copias de una malla como instancias y como mallas
+independientes. Sale con codigo 1 si algo difiere:
+
+    python benchmarks/check_instances.py
+    python benchmarks/check_instances.py --rays 500 --copies 1000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from math import sin, cos, pi
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import numpy as np
+
+from bvh import BVH
+from figures import Sphere, Ellipsoid, AABB, OBB
+from instance import Instance, transform
+from materials import Material
+from mesh import Mesh
+from vec3 import subtract, normalize
+
+TOLERANCE = 1e-6
+
+
+def bumpy_sphere(material, n=24):
+    # Malla de una esfera deformada, centrada en el origen
+    vertices = []
+    for i in range(n + 1):
+        for j in range(n):
+            theta = pi * i / n
+            phi = 2 * pi * j / n
+            r = 1 + 0.15 * sin(5 * theta) * cos(3 * phi)
+            vertices.append([r * sin(theta) * cos(phi), r * cos(theta), r * sin(theta) * sin(phi)])
+    faces = []
+    for i in range(n):
+        for j in range(n):
+            a = i * n + j
+            b = i * n + (j + 1) % n
+            c = (i + 1) * n + j
+            d = (i + 1) * n + (j + 1) % n
+            faces += [[a, c, d], [a, d, b]]
+    # Se quitan las caras degeneradas de los polos
+    faces = [f for f in faces if len({tuple(vertices[k]) for k in f}) == 3]
+    return Mesh(vertices, faces, material)
+
+
+def close(a, b):
+    return all(abs(a[i] - b[i]) <= TOLERANCE * max(1, abs(b[i])) for i in range(len(b)))
+
+
+def same(instance, shape, rays, compareDistance=True):
+    # Cantidad de rayos en que la instancia y la figura no coinciden
+    failures = 0
+    many = instance.ray_intersect_many([o for o, _ in rays], [d for _, d in rays])
+    for i, (orig, dir) in enumerate(rays):
+        expected = shape.ray_intersect(orig, dir)
+        intercept = instance.ray_intersect(orig, dir)
+        if expected is None:
+            ok = intercept is None and not many[4][i]
+        else:
+            ok = intercept is not None and many[4][i] and \
+                 close(intercept.point, expected.point) and close(intercept.normal, expected.normal) and \
+                 close(many[1][i], expected.point) and close(many[2][i], expected.normal)
+            if ok and compareDistance:
+                ok = close([intercept.distance], [expected.distance]) and close([many[0][i]], [expected.distance])
+                for maxDist in (expected.distance * 0.99, expected.distance * 1.01):
+                    ok = ok and instance.ray_hits(orig, dir, maxDist) == shape.ray_hits(orig, dir, maxDist)
+        if not ok:
+            failures += 1
+    return failures
+
+
+def nearest_matches(rng, material, count):
+    # Rayos en que la BVH y el recorrido lineal eligen figuras distintas. La
+    # instancia del Ellipsoid reporta su distancia en el espacio escalado,
+    # menor que la real, y la esfera queda entre las dos: el recorrido lineal
+    # elige el Ellipsoid y la BVH no debe descartarlo
+    cases = [((0, 0, -3), 2, 1, 3.2, 0.3)]
+    for _ in range(count):
+        c, radius, scale = rng.uniform(2, 3), rng.uniform(2, 3), rng.uniform(0.5, 2)
+        near, far = (c - 1) * scale, (c - 1) * radius * scale
+        cases.append(((0, 0, -c), radius, scale, near + rng.uniform(0.3, 0.7) * (far - near), 0.1 * (far - near)))
+
+    failures = 0
+    for position, radius, scale, depth, sphereRadius in cases:
+        objs = [Instance(Ellipsoid(position, (radius, radius, radius), material),
+                         transform(rotation=(0, 0, rng.uniform(0, 360)), scale=scale)),
+                Sphere((0, 0, -depth), sphereRadius, material)]
+        orig = [0, 0, 0]
+        dir = normalize([rng.uniform(-0.01, 0.01), rng.uniform(-0.01, 0.01), -1])
+        linear = min(((t, obj) for obj in objs for t in [obj.ray_distance(orig, dir)] if t is not None),
+                     key=lambda hit: hit[0], default=(None, None))[1]
+        if BVH(objs, leafSize=1).nearest(orig, dir)[1] is not linear:
+            failures += 1
+    return failures
+
+
+def random_rays(rng, center, count, spread=2):
+    rays = []
+    for _ in range(count):
+        orig = [center[i] + rng.uniform(-6, 6) for i in range(3)]
+        target = [center[i] + rng.uniform(-spread, spread) for i in range(3)]
+        rays.append((orig, normalize(subtract(target, orig))))
+    return rays
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara figuras instanciadas con las mismas figuras en el mundo.")
+    parser.add_argument("--cases", type=int, default=20)
+    parser.add_argument("--rays", type=int, default=200)
+    parser.add_argument("--copies", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    material = Material()
+    sphere = Sphere(position=[0, 0, 0], radius=1, material=material)
+    mesh = bumpy_sphere(material)
+    failures = {}
+
+    for _ in range(args.cases):
+        position = [rng.uniform(-5, 5) for _ in range(3)]
+        rotation = [rng.uniform(0, 360) for _ in range(3)]
+        size = [rng.uniform(0.5, 3) for _ in range(3)]
+        scale = rng.uniform(0.3, 3)
+
+        checks = []
+        radius = rng.uniform(0.3, 2)
+        checks.append(("Sphere", Instance(sphere, transform(position=position, scale=radius)),
+                       Sphere(position=position, radius=radius, material=material)))
+
+        matrix = transform(position=position, rotation=rotation)
+        box = AABB(position=[0, 0, 0], size=size, material=material)
+        checks.append(("OBB", Instance(box, matrix),
+                       OBB(position=position, size=size, rotation_matrix=[row[:3] for row in matrix[:3]],
+                           material=material)))
+
+        matrix = np.array(transform(position=position, rotation=rotation, scale=scale))
+        vertices = mesh.vertices @ matrix[:3, :3].T + matrix[:3, 3]
+        checks.append(("Mesh", Instance(mesh, matrix.tolist()), Mesh(vertices, mesh.faces, material)))
+
+        for name, instance, shape in checks:
+            failures[name] = failures.get(name, 0) + same(instance, shape, random_rays(rng, position, args.rays))
+
+    failures["BVH"] = nearest_matches(rng, material, args.cases * 10)
+
+    for name, count in failures.items():
+        print("%-6s %s" % (name, "%d distintos" % count if count else "igual"))
+
+    start = time.perf_counter()
+    [Instance(mesh, transform(position=(i, 0, -8), rotation=(0, i, 0))) for i in range(args.copies)]
+    instances = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(args.copies):
+        matrix = np.array(transform(position=(i, 0, -8), rotation=(0, i, 0)))
+        Mesh(mesh.vertices @ matrix[:3, :3].T + matrix[:3, 3], mesh.faces, material)
+    copies = time.perf_counter() - start
+    print("%d copias de una malla de %d caras: instancias %.3f s, mallas %.3f s" %
+          (args.copies, len(mesh.faces), instances, copies))
+
+    if any(failures.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
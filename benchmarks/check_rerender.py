@@ -0,0 +1,72 @@
+"""Comprueba que volver a renderizar despues de mover una figura da la imagen correcta.
+
+Renderiza la escena del osito (RayTracer.py), mueve en su lugar una esfera
+(cambiando su position, sin tocar raytracer.scene) y vuelve a llamar a
+rtRender con el mismo raytracer. La imagen se compara byte a byte con la de
+un raytracer nuevo con la esfera ya movida, para cada estructura de
+aceleracion. Sale con codigo 1 si alguna difiere:
+
+    python benchmarks/check_rerender.py
+    python benchmarks/check_rerender.py --width 200 --height 100
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame
+
+from figures import Sphere
+from rt import RayTracer
+from RayTracer import build_scene
+
+OFFSET = (0.8, 0.8, 1.5)
+
+
+def move(raytracer):
+    sphere = next(obj for obj in raytracer.scene if type(obj) is Sphere)
+    sphere.position = [sphere.position[i] + OFFSET[i] for i in range(3)]
+
+
+def render(raytracer, seed):
+    raytracer.rtClear()
+    random.seed(seed)
+    raytracer.rtRender()
+    return pygame.image.tostring(raytracer.screen, "RGB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara un re-render despues de mover una figura con un render nuevo.")
+    parser.add_argument("--width", type=int, default=150)
+    parser.add_argument("--height", type=int, default=65)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    failures = 0
+    for accelType in ("bvh", "compiled", None):
+        raytracer = RayTracer(pygame.Surface((args.width, args.height)))
+        build_scene(raytracer)
+        raytracer.accelType = accelType
+        before = render(raytracer, args.seed)
+        move(raytracer)
+        image = render(raytracer, args.seed)
+
+        fresh = RayTracer(pygame.Surface((args.width, args.height)))
+        build_scene(fresh)
+        fresh.accelType = accelType
+        move(fresh)
+        expected = render(fresh, args.seed)
+
+        differ = sum(1 for i in range(0, len(image), 3) if image[i:i + 3] != expected[i:i + 3])
+        failures += differ > 0 or image == before
+        print("%-9s %s" % (accelType or "lineal",
+                           "%d pixeles distintos" % differ if differ else "igual al render nuevo"))
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
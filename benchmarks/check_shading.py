@@ -0,0 +1,89 @@
+"""Comprueba que el sombreado compilado (shading.py) da la misma imagen.
+
+Renderiza cada escena canonica de suite.py dos veces, con
+raytracer.compiledShading = False (las ramas por material de rtRayColor y el
+recorrido de luces de rtLighting) y con el sombreado compilado, y compara las
+imagenes byte a byte. Tambien muestra el tiempo de sombreado de cada render:
+el total menos lo que tardan rtCastRay y rtOccluded, que son iguales en las
+dos versiones y se llevan la mayor parte del render. Sale con codigo 1 si
+alguna difiere:
+
+    python benchmarks/check_shading.py
+    python benchmarks/check_shading.py --scenes osito mirrors --width 200 --height 100
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pygame
+
+from suite import ROOT, scenes
+from rt import RayTracer
+
+
+def timed(raytracer, name, spent):
+    # Envuelve el metodo de esta instancia y suma su tiempo en spent[0]
+    function = getattr(raytracer, name)
+    clock = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            spent[0] += clock() - start
+    setattr(raytracer, name, wrapper)
+
+
+def render(build, width, height, seed, compiled):
+    # (imagen, tiempo de sombreado)
+    surface = pygame.Surface((width, height))
+    raytracer = RayTracer(surface)
+    build(raytracer, random.Random(seed))
+    raytracer.compiledShading = compiled
+    raytracer.rtClear()
+    tracing = [0.0]
+    timed(raytracer, "rtCastRay", tracing)
+    timed(raytracer, "rtOccluded", tracing)
+
+    random.seed(seed)
+    start = time.perf_counter()
+    raytracer.rtRender()
+    return pygame.image.tostring(surface, "RGB"), time.perf_counter() - start - tracing[0]
+
+
+def main(argv=None):
+    table = scenes()
+    parser = argparse.ArgumentParser(description="Compara el sombreado compilado con el de rtRayColor y rtLighting.")
+    parser.add_argument("--scenes", nargs="+", choices=sorted(table), default=list(table))
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--height", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="renders por version; se toma el menor tiempo")
+    args = parser.parse_args(argv)
+
+    os.chdir(ROOT)
+    failed = []
+    for name in args.scenes:
+        reference, before = render(table[name], args.width, args.height, args.seed, False)
+        compiled, after = render(table[name], args.width, args.height, args.seed, True)
+        for _ in range(args.repeat - 1):
+            before = min(before, render(table[name], args.width, args.height, args.seed, False)[1])
+            after = min(after, render(table[name], args.width, args.height, args.seed, True)[1])
+        differ = sum(1 for i in range(0, len(reference), 3) if reference[i:i + 3] != compiled[i:i + 3])
+        if differ:
+            failed.append(name)
+        print("%-16s %s  sombreado: ramas %7.3f s  compilado %7.3f s  (%.2fx)" %
+              (name, "igual " if not differ else "%d pixeles distintos" % differ, before, after, before / after))
+
+    if failed:
+        print("Difieren:", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
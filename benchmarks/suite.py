@@ -0,0 +1,270 @@
+"""Suite de benchmarks de render con escenas canonicas.
+
+Renderiza cada escena sin ventana, con random sembrado para que el orden de
+pixeles de rtRender sea siempre el mismo, y reporta el tiempo total, los
+rayos por segundo (rayos de camara, secundarios y de sombra) y los ns por
+llamada a ray_intersect de cada tipo de figura. Los resultados se guardan en
+JSON para comparar corridas entre commits:
+
+    python benchmarks/suite.py -o out/base.json
+    python benchmarks/suite.py -o out/nuevo.json --compare out/base.json
+    python benchmarks/suite.py --scenes osito spheres-64 --width 200 --height 100
+
+Escenas:
+    osito            la escena de RayTracer.py
+    spheres-N        N esferas opacas (N = 16, 64, 256)
+    ellipsoids-N     N elipsoides opacos (N = 16, 64, 256)
+    textures         esferas y cajas con texturas distintas
+    mirrors          esferas reflectivas y transparentes que llegan a la profundidad maxima
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from math import pi, cos, sin
+from datetime import datetime, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import pygame
+
+import RayTracer as escena
+from rt import RayTracer
+from figures import Sphere, Ellipsoid, AABB, OBB, Plane
+from lights import AmbientLight, DirectionalLight, PointLight
+from materials import Material, OPAQUE, REFLECTIVE, TRANSPARENT
+
+COUNTS = (16, 64, 256)
+
+
+def random_material(rng, matType=OPAQUE, texture=None):
+    return Material(diffuse=(rng.uniform(0.2, 1), rng.uniform(0.2, 1), rng.uniform(0.2, 1)),
+                    spec=rng.choice((8, 32, 64, 256)), Ks=rng.uniform(0.05, 0.3),
+                    ior=1.5, texture=texture, matType=matType)
+
+
+def grid(count):
+    # Posiciones en una cuadricula frente a la camara, de lado ~ sqrt(count)
+    side = max(1, int(round(count ** 0.5)))
+    spacing = spacing_for(count)
+    for i in range(count):
+        row, col = divmod(i, side)
+        yield (-4 + spacing * (col + 0.5), -2 + spacing * 0.5 * (row + 0.5), -6 - (i % 3))
+
+
+def spacing_for(count):
+    return 8.0 / max(1, int(round(count ** 0.5)))
+
+
+def base_lights(raytracer):
+    raytracer.lights.append(AmbientLight(intensity=0.3))
+    raytracer.lights.append(DirectionalLight(direction=(-1, -1, -1), intensity=0.7))
+    raytracer.lights.append(PointLight(point=(2, 3, -2), intensity=1))
+
+
+def build_spheres(raytracer, count, rng):
+    spacing = spacing_for(count)
+    for position in grid(count):
+        raytracer.scene.append(Sphere(position=position, radius=spacing * 0.4, material=random_material(rng)))
+    base_lights(raytracer)
+
+
+def build_ellipsoids(raytracer, count, rng):
+    spacing = spacing_for(count)
+    for position in grid(count):
+        radii = [spacing * rng.uniform(0.2, 0.45) for _ in range(3)]
+        # Ellipsoid escala tambien su posicion por radii
+        position = [position[i] / radii[i] for i in range(3)]
+        raytracer.scene.append(Ellipsoid(position=position, radii=radii, material=random_material(rng)))
+    base_lights(raytracer)
+
+
+def build_textures(raytracer, rng):
+    raytracer.envMap = pygame.image.load(os.path.join(ROOT, "cielo.png"))
+    images = [pygame.image.load(os.path.join(ROOT, name))
+              for name in ("puntitos.jpg", "11563_gift_box_diffuse.jpg", "rosa.jpeg", "REGALOS.png")]
+
+    for i, position in enumerate(grid(12)):
+        material = random_material(rng, texture=images[i % len(images)])
+        if i % 3 == 2:
+            raytracer.scene.append(AABB(position=position, size=(1.2, 1.2, 1.2), material=material))
+        else:
+            raytracer.scene.append(Sphere(position=position, radius=0.7, material=material))
+    identity = [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+    raytracer.scene.append(OBB(position=[-2, -3, -8], size=[1.5, 1.5, 1.5], rotation_matrix=identity,
+                               material=random_material(rng, texture=images[1])))
+    base_lights(raytracer)
+
+
+def build_mirrors(raytracer, rng):
+    raytracer.envMap = pygame.image.load(os.path.join(ROOT, "cielo.png"))
+    raytracer.camPosition = [0, 0, 0]
+
+    # Anillo de esferas casi tocandose alrededor de una esfera de vidrio:
+    # los rebotes van de una a otra hasta raytracer.maxDepth
+    for i in range(8):
+        matType = REFLECTIVE if i % 2 == 0 else TRANSPARENT
+        angle = i * pi / 4
+        position = (2.2 * cos(angle), 2.2 * sin(angle), -6 + 0.5 * sin(2 * angle))
+        raytracer.scene.append(Sphere(position=position, radius=0.85, material=random_material(rng, matType)))
+
+    raytracer.scene.append(Sphere(position=(0, 0, -7), radius=1.2, material=random_material(rng, TRANSPARENT)))
+    raytracer.scene.append(Plane(position=(0, -2.5, 0), normal=(0, 1, 0), material=random_material(rng, REFLECTIVE)))
+    base_lights(raytracer)
+
+
+def scenes():
+    # Nombre -> funcion que arma la escena sobre un raytracer (con un Random sembrado)
+    table = {"osito": lambda raytracer, rng: escena.build_scene(raytracer)}
+    for count in COUNTS:
+        table["spheres-%d" % count] = lambda raytracer, rng, count=count: build_spheres(raytracer, count, rng)
+    for count in COUNTS:
+        table["ellipsoids-%d" % count] = lambda raytracer, rng, count=count: build_ellipsoids(raytracer, count, rng)
+    table["textures"] = build_textures
+    table["mirrors"] = build_mirrors
+    return table
+
+
+def count_rays(raytracer):
+    # Envuelve rtCastRay y rtOccluded de esta instancia para contar rayos.
+    # El costo extra es una llamada por rayo, poco frente a trazarlo.
+    counts = {"cast": 0, "shadow": 0}
+    castRay = raytracer.rtCastRay
+    occluded = raytracer.rtOccluded
+
+    def rtCastRay(orig, dir, sceneObj=None, recursion=0):
+        if recursion < raytracer.maxDepth:
+            counts["cast"] += 1
+        return castRay(orig, dir, sceneObj, recursion)
+
+    def rtOccluded(orig, dir, maxDist=float("inf"), ignore=None):
+        counts["shadow"] += 1
+        return occluded(orig, dir, maxDist, ignore)
+
+    raytracer.rtCastRay = rtCastRay
+    raytracer.rtOccluded = rtOccluded
+    return counts
+
+
+def sample_rays(raytracer, count, rng):
+    # Rayos de camara en pixeles al azar del viewport
+    rays = []
+    for _ in range(count):
+        x = rng.uniform(0, raytracer.vpWidth)
+        y = rng.uniform(0, raytracer.vpHeight)
+        Px = (x / raytracer.vpWidth * 2 - 1) * raytracer.rightEdge
+        Py = (y / raytracer.vpHeight * 2 - 1) * raytracer.topEdge
+        length = (Px * Px + Py * Py + raytracer.nearPlane ** 2) ** 0.5
+        rays.append((raytracer.camPosition, [Px / length, Py / length, -raytracer.nearPlane / length]))
+    return rays
+
+
+def intersect_timings(raytracer, rays):
+    # ns por llamada a ray_intersect de cada clase de figura de la escena
+    byClass = {}
+    for obj in raytracer.scene:
+        byClass.setdefault(type(obj).__name__, []).append(obj)
+
+    timings = {}
+    for name, shapes in sorted(byClass.items()):
+        start = time.perf_counter()
+        for obj in shapes:
+            intersect = obj.ray_intersect
+            for orig, dir in rays:
+                intersect(orig, dir)
+        elapsed = time.perf_counter() - start
+        timings[name] = round(elapsed / (len(shapes) * len(rays)) * 1e9, 1)
+    return timings
+
+
+def run_scene(name, build, width, height, seed, accel, samples):
+    rng = random.Random(seed)
+    surface = pygame.Surface((width, height))
+    raytracer = RayTracer(surface)
+    build(raytracer, rng)
+    raytracer.accelType = accel
+    raytracer.rtClear()
+
+    counts = count_rays(raytracer)
+    random.seed(seed)
+    start = time.perf_counter()
+    raytracer.rtRender()
+    wall = time.perf_counter() - start
+
+    rays = counts["cast"] + counts["shadow"]
+    return {"shapes": len(raytracer.scene),
+            "wall": round(wall, 4),
+            "rays": rays,
+            "castRays": counts["cast"],
+            "shadowRays": counts["shadow"],
+            "raysPerSec": round(rays / wall, 1),
+            "intersectNs": intersect_timings(raytracer, sample_rays(raytracer, samples, rng))}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    print("\nComparado con %s:" % (previous.get("commit") or "la corrida anterior"))
+    for name, result in results["scenes"].items():
+        before = previous.get("scenes", {}).get(name)
+        if before:
+            print("  %-16s wall %6.2fx   rayos/s %6.2fx" % (name, before["wall"] / result["wall"],
+                                                            result["raysPerSec"] / before["raysPerSec"]))
+
+
+def main(argv=None):
+    table = scenes()
+    parser = argparse.ArgumentParser(description="Benchmarks de render sobre escenas canonicas.")
+    parser.add_argument("--scenes", nargs="+", choices=sorted(table), default=list(table),
+                        help="escenas a correr (por defecto todas)")
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--height", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0, help="semilla del orden de pixeles y de las escenas generadas")
+    parser.add_argument("--accel", choices=["bvh", "compiled", "none"], default="bvh")
+    parser.add_argument("--samples", type=int, default=500, help="rayos para medir ray_intersect por clase")
+    parser.add_argument("-o", "--output", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args(argv)
+
+    # Las escenas cargan sus imagenes con rutas relativas a la raiz del repo
+    os.chdir(ROOT)
+    accel = None if args.accel == "none" else args.accel
+
+    results = {"commit": git_commit(),
+               "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+               "python": platform.python_version(),
+               "machine": platform.machine(),
+               "width": args.width,
+               "height": args.height,
+               "seed": args.seed,
+               "accel": args.accel,
+               "scenes": {}}
+
+    for name in args.scenes:
+        result = run_scene(name, table[name], args.width, args.height, args.seed, accel, args.samples)
+        results["scenes"][name] = result
+        intersect = ", ".join("%s %.0f" % item for item in result["intersectNs"].items())
+        print("%-16s %8.3f s  %10.0f rayos/s  ns/ray_intersect: %s" % (name, result["wall"], result["raysPerSec"], intersect))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Jerarquia de volumenes envolventes (BVH) sobre las figuras de la escena.
+
+Cada figura acotada (Shape.bounds() distinto de None) entra en un arbol de
+cajas alineadas a los ejes; las figuras sin limites, como Plane, quedan en
+una lista aparte que se recorre linealmente. El recorrido es de adelante
+hacia atras y descarta los nodos cuya caja empieza mas lejos que el hit
+mas cercano encontrado hasta el momento.
+
+occluded_many recorre el mismo arbol con un paquete de rayos de sombra (los
+del sombreado diferido): cada nodo prueba con NumPy todos los rayos que
+llegaron a el y solo pasa a sus hijos los que tocan su caja.
+"""
+import numpy as np
+
+INF = float("inf")
+
+# Holgura para que los errores de redondeo no dejen fuera hits en el borde de una caja
+BOUNDS_EPSILON = 1e-4
+
+# Inversa usada cuando una componente de la direccion es cero
+HUGE = 1e30
+
+
+def inverse_direction(dir):
+    return [1 / d if d != 0 else HUGE for d in dir]
+
+
+def slab_enter(node, orig, inv):
+    """ Distancia de entrada del rayo a la caja del nodo (0 si empieza adentro), o None si no la toca. """
+    tx1 = (node[0] - orig[0]) * inv[0]
+    tx2 = (node[3] - orig[0]) * inv[0]
+    ty1 = (node[1] - orig[1]) * inv[1]
+    ty2 = (node[4] - orig[1]) * inv[1]
+    tz1 = (node[2] - orig[2]) * inv[2]
+    tz2 = (node[5] - orig[2]) * inv[2]
+
+    tmin = max(min(tx1, tx2), min(ty1, ty2), min(tz1, tz2), 0)
+    tmax = min(max(tx1, tx2), max(ty1, ty2), max(tz1, tz2))
+
+    if tmax < tmin:
+        return None
+    return tmin
+
+
+class BVH(object):
+    def __init__(self, shapes, leafSize=4):
+        self.leafSize = leafSize
+        self.unbounded = []
+        # Cada nodo es una tupla:
+        # (minX, minY, minZ, maxX, maxY, maxZ, distanceScale, left, right, items)
+        # Las hojas tienen left = right = -1 y la lista de figuras en items.
+        self.nodes = []
+        self.root = -1
+        # Posicion de cada figura en shapes, para los indices de occluded_many
+        self.order = {id(obj): k for k, obj in enumerate(shapes)}
+
+        entries = []
+        for obj in shapes:
+            bounds = obj.bounds()
+            if bounds is None:
+                self.unbounded.append(obj)
+            else:
+                boundsMin, boundsMax = bounds
+                centroid = [(boundsMin[i] + boundsMax[i]) / 2 for i in range(3)]
+                entries.append((boundsMin, boundsMax, centroid, obj))
+
+        if entries:
+            self.root = self.build(entries)
+
+    def build(self, entries):
+        boundsMin = [min(e[0][i] for e in entries) - BOUNDS_EPSILON for i in range(3)]
+        boundsMax = [max(e[1][i] for e in entries) + BOUNDS_EPSILON for i in range(3)]
+        scale = min(e[3].distanceScale for e in entries)
+
+        if len(entries) <= self.leafSize:
+            node = (*boundsMin, *boundsMax, scale, -1, -1, [e[3] for e in entries])
+        else:
+            # Partir por la mediana de los centroides en el eje mas largo
+            lows = [min(e[2][i] for e in entries) for i in range(3)]
+            highs = [max(e[2][i] for e in entries) for i in range(3)]
+            axis = max(range(3), key=lambda i: highs[i] - lows[i])
+
+            entries = sorted(entries, key=lambda e: e[2][axis])
+            mid = len(entries) // 2
+            left = self.build(entries[:mid])
+            right = self.build(entries[mid:])
+            node = (*boundsMin, *boundsMax, scale, left, right, None)
+
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def ray_intersect(self, orig, dir, ignore=None):
+        """ Intercept mas cercano del rayo contra todas las figuras, ignorando la figura ignore. """
+        depth, nearest = self.nearest(orig, dir, ignore)
+        if nearest is None:
+            return None
+        # Punto, normal y texcoords solo para la figura ganadora
+        return nearest.surface(orig, dir, depth)
+
+    def nearest(self, orig, dir, ignore=None):
+        """ (distancia, figura) del hit mas cercano, con figura None si no hay. """
+        depth = INF
+        hit = None
+
+        for obj in self.unbounded:
+            if obj is not ignore:
+                t = obj.ray_distance(orig, dir)
+                if t is not None and t < depth:
+                    hit = obj
+                    depth = t
+
+        if self.root < 0:
+            return depth, hit
+
+        nodes = self.nodes
+        inv = inverse_direction(dir)
+
+        root = nodes[self.root]
+        enter = slab_enter(root, orig, inv)
+        if enter is None:
+            return depth, hit
+
+        stack = [(enter * root[6], self.root)]
+        while stack:
+            enter, index = stack.pop()
+            if enter >= depth:
+                continue
+
+            node = nodes[index]
+            items = node[9]
+            if items is not None:
+                for obj in items:
+                    if obj is not ignore:
+                        t = obj.ray_distance(orig, dir)
+                        if t is not None and t < depth:
+                            hit = obj
+                            depth = t
+                continue
+
+            left = nodes[node[7]]
+            right = nodes[node[8]]
+            leftEnter = slab_enter(left, orig, inv)
+            rightEnter = slab_enter(right, orig, inv)
+            if leftEnter is not None:
+                leftEnter *= left[6]
+            if rightEnter is not None:
+                rightEnter *= right[6]
+
+            # El hijo mas cercano se apila al final para visitarlo primero
+            if leftEnter is None:
+                if rightEnter is not None:
+                    stack.append((rightEnter, node[8]))
+            elif rightEnter is None:
+                stack.append((leftEnter, node[7]))
+            elif leftEnter <= rightEnter:
+                stack.append((rightEnter, node[8]))
+                stack.append((leftEnter, node[7]))
+            else:
+                stack.append((leftEnter, node[7]))
+                stack.append((rightEnter, node[8]))
+
+        return depth, hit
+
+    def occluded(self, orig, dir, maxDist=INF, ignore=None):
+        """ True si alguna figura (salvo ignore) corta el rayo antes de maxDist. Termina en el primer bloqueo. """
+        for obj in self.unbounded:
+            if obj is not ignore and obj.ray_hits(orig, dir, maxDist):
+                return True
+
+        if self.root < 0:
+            return False
+
+        nodes = self.nodes
+        inv = inverse_direction(dir)
+
+        stack = [self.root]
+        while stack:
+            node = nodes[stack.pop()]
+            enter = slab_enter(node, orig, inv)
+            if enter is None or enter >= maxDist:
+                continue
+
+            items = node[9]
+            if items is not None:
+                for obj in items:
+                    if obj is not ignore and obj.ray_hits(orig, dir, maxDist):
+                        return True
+            else:
+                stack.append(node[8])
+                stack.append(node[7])
+
+        return False
+
+    def occluded_many(self, origins, dirs, maxDist, ignore):
+        """ Version por paquetes de occluded: True donde alguna figura corta el rayo antes de maxDist.
+
+        ignore es, por rayo, la posicion en shapes de la figura a ignorar (-1 para ninguna).
+        """
+        blocked = np.zeros(len(dirs), dtype=bool)
+        order = self.order
+
+        def test(obj, rows):
+            rows = rows[~blocked[rows] & (ignore[rows] != order[id(obj)])]
+            if len(rows):
+                blocked[rows[obj.ray_hits_many(origins[rows], dirs[rows], maxDist[rows])]] = True
+
+        with np.errstate(all="ignore"):
+            everything = np.arange(len(dirs))
+            for obj in self.unbounded:
+                test(obj, everything)
+
+            if self.root < 0:
+                return blocked
+
+            inv = np.where(dirs != 0, 1 / dirs, HUGE)
+            nodes = self.nodes
+            stack = [(self.root, everything)]
+            while stack:
+                index, rows = stack.pop()
+                rows = rows[~blocked[rows]]
+                if len(rows) == 0:
+                    continue
+
+                # slab_enter para todos los rayos del nodo
+                node = nodes[index]
+                t1 = (np.array(node[0:3]) - origins[rows]) * inv[rows]
+                t2 = (np.array(node[3:6]) - origins[rows]) * inv[rows]
+                tmin = np.maximum(np.minimum(t1, t2).max(axis=1), 0)
+                tmax = np.maximum(t1, t2).min(axis=1)
+                rows = rows[(tmax >= tmin) & (tmin < maxDist[rows])]
+                if len(rows) == 0:
+                    continue
+
+                items = node[9]
+                if items is not None:
+                    for obj in items:
+                        test(obj, rows)
+                else:
+                    stack.append((node[8], rows))
+                    stack.append((node[7], rows))
+
+        return blocked
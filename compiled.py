@@ -0,0 +1,307 @@
+"""Escena compilada como estructura de arreglos (SoA).
+
+CompiledScene agrupa las esferas, elipsoides, cajas (AABB y OBB) y cilindros
+de la escena en arreglos de NumPy por tipo, una columna por componente. Un
+rayo se prueba contra todas las figuras de un tipo con una sola llamada
+vectorizada que devuelve la distancia mas cercana y su indice; solo la figura
+ganadora arma su Intercept con surface.
+
+Cada grupo reproduce la misma aritmetica que el ray_intersect de su figura,
+asi que el render da el mismo resultado que el recorrido lineal.
+
+occluded_many (los rayos de sombra del sombreado diferido) prueba en cambio
+un paquete de rayos contra todas las esferas o elipsoides a la vez, con una
+matriz de distancias rayos x figuras por bloque de rayos.
+"""
+import numpy as np
+
+from figures import Sphere, Ellipsoid, AABB, OBB, ThinCylinder, inverse_direction, inverse_many, slab_hit_many
+
+INF = float("inf")
+
+# Elementos (rayos x figuras) de cada bloque de occluded_many
+PACKET_SIZE = 1 << 18
+
+
+def columns(values):
+    # Lista de vectores -> tres columnas float64 (x, y, z)
+    array = np.array(values, dtype=float).reshape(-1, 3)
+    return array[:, 0].copy(), array[:, 1].copy(), array[:, 2].copy()
+
+
+def columns_of(vectors):
+    # Arreglo N x 3 -> tres columnas N x 1, que se combinan con las de un
+    # grupo en una matriz rayos x figuras
+    return vectors[:, 0:1], vectors[:, 1:2], vectors[:, 2:3]
+
+
+class ShapeGroup(object):
+    # True si world_distances acepta columnas de rayos (ver columns_of)
+    broadcasts = False
+
+    def __init__(self, shapes):
+        self.shapes = shapes
+
+    def distances(self, orig, dir):
+        """ Distancias reportadas por ray_distance para cada figura (inf si no hay hit), o None si el grupo no las calcula. """
+        return None
+
+    def world_distances(self, orig, dir):
+        """ Distancias reales a lo largo del rayo, para comparar contra maxDist. """
+        return self.distances(orig, dir)
+
+
+class SphereGroup(ShapeGroup):
+    broadcasts = True
+
+    def __init__(self, spheres):
+        super().__init__(spheres)
+        self.x, self.y, self.z = columns([s.position for s in spheres])
+        self.radius = np.array([s.radius for s in spheres], dtype=float)
+
+    def distances(self, orig, dir):
+        return sphere_distances(self.x, self.y, self.z, self.radius, *orig, *dir)
+
+
+def sphere_distances(cx, cy, cz, radius, ox, oy, oz, dx, dy, dz):
+    # Sphere.ray_distance; el origen y la direccion pueden ser escalares o
+    # arreglos con un valor por figura
+    Lx = cx - ox
+    Ly = cy - oy
+    Lz = cz - oz
+    lengthL = np.sqrt(Lx * Lx + Ly * Ly + Lz * Lz)
+    tca = Lx * dx + Ly * dy + Lz * dz
+    d = np.sqrt(np.maximum(lengthL ** 2 - tca ** 2, 0))
+
+    thc = np.sqrt(np.maximum(radius ** 2 - d ** 2, 0))
+    t0 = tca - thc
+    t0 = np.where(t0 < 0, tca + thc, t0)
+
+    return np.where((d > radius) | (t0 < 0), INF, t0)
+
+
+class EllipsoidGroup(ShapeGroup):
+    broadcasts = True
+
+    def __init__(self, ellipsoids):
+        super().__init__(ellipsoids)
+        self.x, self.y, self.z = columns([e.position for e in ellipsoids])
+        self.rx, self.ry, self.rz = columns([e.radii for e in ellipsoids])
+        self.one = np.ones(len(ellipsoids))
+
+    def scaled(self, orig, dir):
+        # Igual que Ellipsoid.scaled_ray, para todos los elipsoides a la vez
+        sox = orig[0] / self.rx
+        soy = orig[1] / self.ry
+        soz = orig[2] / self.rz
+        sdx = dir[0] / self.rx
+        sdy = dir[1] / self.ry
+        sdz = dir[2] / self.rz
+        scale = np.sqrt(sdx * sdx + sdy * sdy + sdz * sdz)
+        t = sphere_distances(self.x, self.y, self.z, self.one,
+                             sox, soy, soz, sdx / scale, sdy / scale, sdz / scale)
+        return t, scale
+
+    def distances(self, orig, dir):
+        return self.scaled(orig, dir)[0]
+
+    def world_distances(self, orig, dir):
+        t, scale = self.scaled(orig, dir)
+        return t / scale
+
+
+class AABBGroup(ShapeGroup):
+    def __init__(self, boxes):
+        super().__init__(boxes)
+        self.faceMin = np.array([b.faceMin for b in boxes], dtype=float).reshape(-1, 3)
+        self.faceMax = np.array([b.faceMax for b in boxes], dtype=float).reshape(-1, 3)
+
+    def distances(self, orig, dir):
+        # AABB.ray_distance: el mismo slab test, con una fila por caja
+        return slab_hit_many(self.faceMin, self.faceMax, orig, inverse_direction(dir))[0]
+
+
+class OBBGroup(ShapeGroup):
+    def __init__(self, boxes):
+        super().__init__(boxes)
+        self.x, self.y, self.z = columns([b.position for b in boxes])
+        self.inverse = np.array([b.inverse_rotation for b in boxes], dtype=float).reshape(-1, 3, 3)
+        self.faceMin = np.array([b.faceMin for b in boxes], dtype=float).reshape(-1, 3)
+        self.faceMax = np.array([b.faceMax for b in boxes], dtype=float).reshape(-1, 3)
+
+    def distances(self, orig, dir):
+        # OBB.local_ray
+        rx = orig[0] - self.x
+        ry = orig[1] - self.y
+        rz = orig[2] - self.z
+        m = self.inverse
+        local = np.stack([m[:, i, 0] * rx + m[:, i, 1] * ry + m[:, i, 2] * rz for i in range(3)], axis=1)
+        localDir = np.stack([m[:, i, 0] * dir[0] + m[:, i, 1] * dir[1] + m[:, i, 2] * dir[2]
+                             for i in range(3)], axis=1)
+
+        # OBB.ray_distance
+        return slab_hit_many(self.faceMin, self.faceMax, local, inverse_many(localDir))[0]
+
+
+class ThinCylinderGroup(ShapeGroup):
+    def __init__(self, cylinders):
+        super().__init__(cylinders)
+        self.x, self.y, self.z = columns([c.position for c in cylinders])
+        self.radius = np.array([c.radius for c in cylinders], dtype=float)
+        self.height = np.array([c.height for c in cylinders], dtype=float)
+
+    def distances(self, orig, dir):
+        # ThinCylinder.ray_distance
+        tox = orig[0] - self.x
+        toy = orig[1] - self.y
+        toz = orig[2] - self.z
+
+        a = dir[0] ** 2 + dir[2] ** 2
+        b = 2 * (tox * dir[0] + toz * dir[2])
+        c = tox ** 2 + toz ** 2 - self.radius ** 2
+
+        discriminant = b ** 2 - 4 * a * c
+        miss = discriminant < 0
+
+        if a == 0:
+            miss |= b == 0
+            t0 = -c / np.where(b == 0, 1, b)
+            t1 = t0
+        else:
+            root = np.sqrt(np.maximum(discriminant, 0))
+            t0 = (-b - root) / (2 * a)
+            t1 = (-b + root) / (2 * a)
+            t0, t1 = np.minimum(t0, t1), np.maximum(t0, t1)
+
+        y0 = toy + t0 * dir[1]
+        y1 = toy + t1 * dir[1]
+
+        low = -self.height / 2
+        high = self.height / 2
+        dy = dir[1] if dir[1] != 0 else INF
+
+        clampLow = y0 < low
+        y0 = np.where(clampLow, low, y0)
+        t0 = np.where(clampLow, (low - toy) / dy, t0)
+
+        clampHigh = y1 > high
+        y1 = np.where(clampHigh, high, y1)
+        t1 = np.where(clampHigh, (high - toy) / dy, t1)
+
+        miss |= (y0 > high) | (y1 < low) | (t0 > t1)
+
+        t = np.where(y0 > low, t0, t1)
+        return np.where(miss | (t < 0), INF, t)
+
+
+GROUPS = ((Sphere, SphereGroup),
+          (Ellipsoid, EllipsoidGroup),
+          (AABB, AABBGroup),
+          (OBB, OBBGroup),
+          (ThinCylinder, ThinCylinderGroup))
+
+
+class CompiledScene(object):
+    def __init__(self, shapes):
+        byType = {shapeType: [] for shapeType, _ in GROUPS}
+        self.others = []
+        for obj in shapes:
+            # Solo el tipo exacto: una subclase puede intersectar distinto
+            if type(obj) in byType:
+                byType[type(obj)].append(obj)
+            else:
+                self.others.append(obj)
+
+        self.groups = [groupType(byType[shapeType])
+                       for shapeType, groupType in GROUPS if byType[shapeType]]
+
+        # Figura -> (grupo, indice), para poder ignorar una figura puntual
+        self.index = {}
+        for group in self.groups:
+            for i, obj in enumerate(group.shapes):
+                self.index[id(obj)] = (group, i)
+        # Posicion en la escena, para desempatar hits a la misma distancia
+        # (caras coplanares) igual que el recorrido lineal
+        self.order = {id(obj): k for k, obj in enumerate(shapes)}
+
+    def ray_intersect(self, orig, dir, ignore=None):
+        """ Intercept mas cercano del rayo, ignorando la figura ignore. """
+        depth = INF
+        nearest = None
+
+        ignored = self.index.get(id(ignore))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for group in self.groups:
+                t = group.distances(orig, dir)
+                if t is None:
+                    continue
+                if ignored is not None and ignored[0] is group:
+                    t[ignored[1]] = INF
+
+                i = int(np.argmin(t))
+                if t[i] < depth or (t[i] == depth < INF and self.before(group.shapes[i], nearest)):
+                    depth = float(t[i])
+                    nearest = group.shapes[i]
+
+        for obj in self.others:
+            if obj is not ignore:
+                t = obj.ray_distance(orig, dir)
+                if t is not None and (t < depth or (t == depth < INF and self.before(obj, nearest))):
+                    depth = t
+                    nearest = obj
+
+        if nearest is None:
+            return None
+        return nearest.surface(orig, dir, depth)
+
+    def before(self, obj, other):
+        return self.order[id(obj)] < self.order[id(other)]
+
+    def occluded(self, orig, dir, maxDist=INF, ignore=None):
+        """ True si alguna figura (salvo ignore) corta el rayo antes de maxDist. """
+        ignored = self.index.get(id(ignore))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for group in self.groups:
+                t = group.world_distances(orig, dir)
+                if t is None:
+                    continue
+                if ignored is not None and ignored[0] is group:
+                    t[ignored[1]] = INF
+                if (t < maxDist).any():
+                    return True
+
+        for obj in self.others:
+            if obj is not ignore and obj.ray_hits(orig, dir, maxDist):
+                return True
+        return False
+
+    def occluded_many(self, origins, dirs, maxDist, ignore):
+        """ Version por paquetes de occluded; ignore es, por rayo, la posicion en la escena de la figura a ignorar (-1 para ninguna). """
+        blocked = np.zeros(len(dirs), dtype=bool)
+
+        def test(obj):
+            rows = np.flatnonzero(~blocked & (ignore != self.order[id(obj)]))
+            if len(rows):
+                blocked[rows[obj.ray_hits_many(origins[rows], dirs[rows], maxDist[rows])]] = True
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for group in self.groups:
+                if not group.broadcasts:
+                    for obj in group.shapes:
+                        test(obj)
+                    continue
+
+                # Una matriz rayos x figuras por bloque de rayos
+                positions = np.array([self.order[id(obj)] for obj in group.shapes])
+                step = max(1, PACKET_SIZE // len(positions))
+                for start in range(0, len(dirs), step):
+                    rows = np.flatnonzero(~blocked[start:start + step]) + start
+                    if len(rows) == 0:
+                        continue
+                    t = group.world_distances(columns_of(origins[rows]), columns_of(dirs[rows]))
+                    t[ignore[rows][:, None] == positions] = INF
+                    blocked[rows[(t < maxDist[rows][:, None]).any(axis=1)]] = True
+
+            for obj in self.others:
+                test(obj)
+        return blocked
@@ -0,0 +1,221 @@
+"""Sombreado diferido sobre un G-buffer.
+
+El render se hace en dos pasadas. build_gbuffer traza los rayos primarios de
+todo el viewport por paquetes (rtCastPacketArrays) y guarda por pixel la
+distancia, el punto, la normal, las texcoords y el material del hit en
+arreglos de NumPy. shade_gbuffer calcula despues el color de todos los
+pixeles a la vez: texturas con sample_many, luz ambiental, difusa y
+especular de cada luz direccional y puntual, y sus rayos de sombra por
+paquetes con occluded_many de la estructura de aceleracion (BVH o
+CompiledScene), o con ray_hits_many de cada figura si no hay una. El modelo
+de Phong usa las versiones por arreglos de las luces (getDiffuseColors,
+getSpecularColors), asi que pasa de una llamada por luz y por pixel a unas
+pocas operaciones por luz.
+
+    gbuffer = raytracer.rtRenderDeferred()
+    light.intensity = 0.4
+    raytracer.rtRenderDeferred(gbuffer)     # solo se repite el sombreado
+
+Los pixeles con materiales REFLECTIVE o TRANSPARENT necesitan rayos
+secundarios, asi que se sombrean uno por uno con rtRayColor a partir del
+hit guardado. Los rayos que escapan usan envMap.lookup_many. El resultado
+es el de rtRender salvo diferencias de redondeo en unos pocos pixeles.
+"""
+import numpy as np
+
+from figures import Intercept
+from materials import OPAQUE
+from vec3 import normalize_many
+
+
+class GBuffer(object):
+    """ Hits primarios de cada pixel del viewport.
+
+    Arreglos de largo N (pixeles): xs, ys, directions (N x 3), distances,
+    points (N x 3), normals (N x 3), texcoords (N x 2), hasTexcoords,
+    objectIds (indice en objects, -1 si el rayo escapa) y materialIds
+    (indice en materials, -1 si escapa).
+    """
+
+    def __init__(self, n, objects):
+        self.objects = list(objects)
+        self.materials = []
+        for obj in self.objects:
+            if all(obj.material is not m for m in self.materials):
+                self.materials.append(obj.material)
+
+        self.xs = np.zeros(n, dtype=int)
+        self.ys = np.zeros(n, dtype=int)
+        self.directions = np.zeros((n, 3))
+        self.distances = np.full(n, np.inf)
+        self.points = np.zeros((n, 3))
+        self.normals = np.zeros((n, 3))
+        self.texcoords = np.zeros((n, 2))
+        self.hasTexcoords = np.zeros(n, dtype=bool)
+        self.objectIds = np.full(n, -1)
+        self.materialIds = np.full(n, -1)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def intercept(self, i):
+        """ Intercept del hit primario del pixel i (o None si el rayo escapa). """
+        k = int(self.objectIds[i])
+        if k < 0:
+            return None
+        return Intercept(distance=float(self.distances[i]),
+                         point=self.points[i].tolist(),
+                         normal=self.normals[i].tolist(),
+                         texcoords=tuple(self.texcoords[i].tolist()) if self.hasTexcoords[i] else None,
+                         obj=self.objects[k])
+
+
+def build_gbuffer(raytracer, tileSize=64):
+    """ Primera pasada: traza los rayos primarios del viewport y devuelve el GBuffer. """
+    raytracer.rtPrepare()
+    tiles = raytracer.rtTiles(tileSize)
+    gbuffer = GBuffer(sum(w * h for _, _, w, h in tiles), raytracer.scene)
+
+    # Material de cada figura como indice en gbuffer.materials
+    materialOf = np.array([next(i for i, m in enumerate(gbuffer.materials) if obj.material is m)
+                           for obj in gbuffer.objects] + [-1])
+
+    start = 0
+    for x0, y0, w, h in tiles:
+        xs, ys = np.meshgrid(np.arange(x0, x0 + w), np.arange(y0, y0 + h))
+        xs = xs.ravel()
+        ys = ys.ravel()
+        Px = (((xs + 0.5 - raytracer.vpX) / raytracer.vpWidth) * 2 - 1) * raytracer.rightEdge
+        Py = (((ys + 0.5 - raytracer.vpY) / raytracer.vpHeight) * 2 - 1) * raytracer.topEdge
+        directions = normalize_many(np.stack((Px, Py, np.full(len(Px), -raytracer.nearPlane)), axis=1))
+
+        nearest, depth, points, normals, texcoords, hasTexcoords = raytracer.rtCastPacketArrays(raytracer.camPosition, directions)
+
+        rows = slice(start, start + len(xs))
+        gbuffer.xs[rows] = xs
+        gbuffer.ys[rows] = ys
+        gbuffer.directions[rows] = directions
+        gbuffer.distances[rows] = depth
+        gbuffer.points[rows] = points
+        gbuffer.normals[rows] = normals
+        gbuffer.texcoords[rows] = texcoords
+        gbuffer.hasTexcoords[rows] = hasTexcoords
+        gbuffer.objectIds[rows] = nearest
+        gbuffer.materialIds[rows] = materialOf[nearest]
+        start += len(xs)
+
+    return gbuffer
+
+
+def occluded_many(objects, origins, dirs, maxDist, ignore):
+    """ Rayos de sombra por paquete: True donde alguna figura (salvo ignore, un indice por rayo) corta el rayo antes de maxDist. """
+    blocked = np.zeros(len(dirs), dtype=bool)
+    with np.errstate(all="ignore"):
+        for k, obj in enumerate(objects):
+            rows = np.flatnonzero(~blocked & (ignore != k))
+            if len(rows) == 0:
+                break
+            blocked[rows[obj.ray_hits_many(origins[rows], dirs[rows], maxDist[rows])]] = True
+    return blocked
+
+
+def surface_colors(raytracer, gbuffer, rows):
+    # Color difuso del material por la textura en las filas rows
+    materialIds = gbuffer.materialIds[rows]
+    diffuse = np.array([m.diffuse for m in gbuffer.materials], dtype=float).reshape(-1, 3)
+    colors = diffuse[materialIds]
+
+    for i, material in enumerate(gbuffer.materials):
+        if not material.texture:
+            continue
+        textured = (materialIds == i) & gbuffer.hasTexcoords[rows]
+        if not textured.any():
+            continue
+
+        uv = gbuffer.texcoords[rows][textured]
+        lod = 0.0
+        if raytracer.textureFilter == "trilinear":
+            lod = texture_lods(raytracer, gbuffer, rows[textured], material.texture)
+        colors[textured] *= material.texture.sample_many(uv[:, 0], uv[:, 1], raytracer.textureFilter, lod)
+    return colors
+
+
+def texture_lods(raytracer, gbuffer, rows, texture):
+    # Texture.lod(rtFootprint(intercept)) para cada fila
+    extents = []
+    for obj in gbuffer.objects:
+        bounds = obj.bounds()
+        extents.append(max(bounds[1][i] - bounds[0][i] for i in range(3)) if bounds else 1)
+    footprint = gbuffer.distances[rows] * raytracer.pixelAngle / np.array(extents)[gbuffer.objectIds[rows]]
+    texels = footprint * max(texture.width, texture.height)
+    with np.errstate(divide="ignore"):
+        return np.where(texels <= 1, 0.0, np.minimum(np.log2(texels), len(texture.levels) - 1))
+
+
+def light_colors(raytracer, gbuffer, rows):
+    # Ambiental + difusa + especular de todas las luces, con sombras, en las filas rows
+    n = len(rows)
+    points = gbuffer.points[rows]
+    normals = gbuffer.normals[rows]
+    objectIds = gbuffer.objectIds[rows]
+    materialIds = gbuffer.materialIds[rows]
+    Ks = np.array([m.Ks for m in gbuffer.materials], dtype=float)[materialIds]
+    spec = np.array([m.spec for m in gbuffer.materials], dtype=float)[materialIds]
+
+    viewDirs = normalize_many(np.asarray(raytracer.camPosition, dtype=float) - points)
+
+    # Los rayos de sombra van por la estructura de aceleracion si fue armada
+    # para las mismas figuras del G-buffer (los indices de ignore son los de
+    # la escena); si no, se prueban todas las figuras
+    accel = raytracer.accel
+    if accel is not None and list(raytracer.scene) == gbuffer.objects:
+        occluded = accel.occluded_many
+    else:
+        occluded = lambda *args: occluded_many(gbuffer.objects, *args)
+
+    ambient = np.zeros(3)
+    diffuse = np.zeros((n, 3))
+    specular = np.zeros((n, 3))
+    for light in raytracer.lights:
+        if light.lightType == "Ambient":
+            ambient = ambient + light.getLightColor()
+            continue
+
+        directions = light.getDirections(points)
+        if directions is None:
+            continue
+        lightDirs, distances = directions
+        lit = ~occluded(points, np.ascontiguousarray(lightDirs), distances, objectIds)
+
+        diffuse[lit] += light.getDiffuseColors(points[lit], normals[lit], Ks[lit])
+        specular[lit] += light.getSpecularColors(points[lit], normals[lit], viewDirs[lit], spec[lit], Ks[lit])
+
+    return ambient + diffuse + specular
+
+
+def shade_gbuffer(raytracer, gbuffer):
+    """ Segunda pasada: colores N x 3 de los pixeles del G-buffer y la mascara de pixeles con color. """
+    n = len(gbuffer)
+    colors = np.zeros((n, 3))
+    valid = np.zeros(n, dtype=bool)
+
+    misses = np.flatnonzero(gbuffer.objectIds < 0)
+    if len(misses) and raytracer.envMap:
+        colors[misses] = raytracer.envMap.lookup_many(gbuffer.directions[misses], raytracer.envFilter)
+        valid[misses] = True
+
+    opaque = np.array([m.matType == OPAQUE for m in gbuffer.materials] + [False])
+    rows = np.flatnonzero(opaque[gbuffer.materialIds])
+    if len(rows):
+        with np.errstate(all="ignore"):
+            lightColor = light_colors(raytracer, gbuffer, rows)
+            colors[rows] = np.minimum(1, surface_colors(raytracer, gbuffer, rows) * lightColor)
+        valid[rows] = True
+
+    # Reflejos y refracciones: rtRayColor pixel por pixel desde el hit guardado
+    for i in np.flatnonzero(~opaque[gbuffer.materialIds] & (gbuffer.objectIds >= 0)).tolist():
+        colors[i] = raytracer.rtRayColor(gbuffer.intercept(i), gbuffer.directions[i].tolist())
+        valid[i] = True
+
+    return colors, valid
+
@@ -1,6 +1,14 @@
 from math import tan, pi, atan2, acos
+import numpy as np
+
+from vec3 import (dot, add, subtract, multiply, magnitude, normalize, cross,
+                  dot_many, cross_many, normalize_many, matrix_vector_many)
+
+INF = float("inf")
 
 class Intercept(object):
+    __slots__ = ("distance", "point", "normal", "texcoords", "obj")
+
     def __init__(self, distance, point, normal, texcoords, obj):
         self.distance = distance
         self.point = point
@@ -9,19 +17,87 @@ class Intercept(object):
         self.obj = obj
 
 class Shape(object):
+    # Cota inferior de (distancia reportada por ray_intersect) / (distancia real).
+    # La BVH la usa para podar nodos sin perder el hit mas cercano.
+    distanceScale = 1.0
+
     def __init__(self, position, material):
         self.position = position
         self.material = material
 
+    # La interseccion tiene dos pasos: ray_distance (barato, solo la
+    # distancia) y surface (punto, normal y texcoords), que se calcula una
+    # sola vez para la figura mas cercana. Cada figura define los dos.
     def ray_intersect(self, orig, dir):
+        t = self.ray_distance(orig, dir)
+        if t is None:
+            return None
+        return self.surface(orig, dir, t)
+
+    def ray_distance(self, orig, dir):
+        # Distancia del hit (la que se compara entre figuras), o None
+        return None
+
+    def surface(self, orig, dir, t):
+        # Intercept del hit a la distancia t que devolvio ray_distance
+        return None
+
+    def ray_hits(self, orig, dir, maxDist):
+        # True si el rayo choca con la figura antes de recorrer maxDist
+        t = self.ray_distance(orig, dir)
+        return t is not None and t < maxDist
+
+    def bounds(self):
+        # Caja (boundsMin, boundsMax) en espacio del mundo, o None si la figura no tiene limites
         return None
 
+    def ray_intersect_many(self, origins, dirs):
+        # Version por paquetes de ray_intersect. origins es N x 3 (o un solo
+        # origen para todos) y dirs es N x 3. Devuelve (distances, points,
+        # normals, texcoords, mask): distancias con inf donde no hay hit, puntos
+        # y normales N x 3, texcoords N x 2 (None si la figura no tiene) y la
+        # mascara de rayos con hit. Las filas sin hit no tienen valores utiles.
+        # Esta version generica llama a ray_intersect rayo por rayo.
+        origins, dirs = ray_arrays(origins, dirs)
+        n = len(dirs)
+        distances = np.full(n, INF)
+        points = np.zeros((n, 3))
+        normals = np.zeros((n, 3))
+        texcoords = np.zeros((n, 2))
+        hasTexcoords = False
+
+        for i in range(n):
+            intercept = self.ray_intersect(origins[i].tolist(), dirs[i].tolist())
+            if intercept is not None:
+                distances[i] = intercept.distance
+                points[i] = intercept.point
+                normals[i] = intercept.normal
+                if intercept.texcoords is not None:
+                    texcoords[i] = intercept.texcoords
+                    hasTexcoords = True
+
+        return distances, points, normals, texcoords if hasTexcoords else None, distances < INF
+
+    def ray_hits_many(self, origins, dirs, maxDist):
+        # Version por paquetes de ray_hits: mascara de rayos que chocan con la
+        # figura antes de recorrer maxDist (un arreglo de largo N)
+        origins, dirs = ray_arrays(origins, dirs)
+        _, points, _, _, mask = self.ray_intersect_many(origins, dirs)
+        # Distancia real al hit (la de ray_intersect puede estar escalada, como en Ellipsoid)
+        offset = points - origins
+        with np.errstate(invalid="ignore"):
+            return mask & (np.sqrt(dot_many(offset, offset)) < maxDist)
+
 class Sphere(Shape):
     def __init__(self, position, radius, material):
         self.radius = radius
         super().__init__(position, material)
 
-    def ray_intersect(self, orig, dir):
+    def bounds(self):
+        return ([self.position[i] - self.radius for i in range(3)],
+                [self.position[i] + self.radius for i in range(3)])
+
+    def ray_distance(self, orig, dir):
         L = subtract(self.position, orig)
         lengthL = magnitude(L)
         tca = dot(L, dir)
@@ -32,13 +108,14 @@ class Sphere(Shape):
 
         thc = (self.radius ** 2 - d ** 2) ** 0.5
         t0 = tca - thc
-        t1 = tca + thc
 
         if t0 < 0:
-            t0 = t1
+            t0 = tca + thc
         if t0 < 0:
             return None
+        return t0
 
+    def surface(self, orig, dir, t0):
         P = add(orig, multiply(dir, t0))
 
         normal = subtract(P, self.position)
@@ -53,41 +130,48 @@ class Sphere(Shape):
                          texcoords=(u, v),
                          obj=self)
 
-# Vectores y operaciones
-def dot(v1, v2):
-    return sum(x * y for x, y in zip(v1, v2))
+    def ray_intersect_many(self, origins, dirs):
+        origins, dirs = ray_arrays(origins, dirs)
+        L = np.asarray(self.position, dtype=float) - origins
+        lengthL = np.sqrt(dot_many(L, L))
+        tca = dot_many(L, dirs)
+        d = np.sqrt(np.maximum(lengthL ** 2 - tca ** 2, 0))
 
-def add(v1, v2):
-    return [x + y for x, y in zip(v1, v2)]
+        thc = np.sqrt(np.maximum(self.radius ** 2 - d ** 2, 0))
+        t0 = tca - thc
+        t0 = np.where(t0 < 0, tca + thc, t0)
+        mask = (d <= self.radius) & (t0 >= 0)
 
-def subtract(v1, v2):
-    return [x - y for x, y in zip(v1, v2)]
+        P = origins + dirs * t0[:, None]
+        normals = normalize_many(P - np.asarray(self.position, dtype=float))
 
-def multiply(v, scalar):
-    return [x * scalar for x in v]
+        u = np.arctan2(normals[:, 2], normals[:, 0]) / (2 * pi) + 0.5
+        v = np.arccos(np.clip(normals[:, 1], -1, 1)) / pi
 
-def magnitude(v):
-    return (sum(x ** 2 for x in v)) ** 0.5
+        return np.where(mask, t0, INF), P, normals, np.stack((u, v), axis=1), mask
 
-def normalize(v):
-    mag = magnitude(v)
-    return [x / mag for x in v]
+# Origenes y direcciones como arreglos N x 3 (un solo origen vale para todos)
+def ray_arrays(origins, dirs):
+    dirs = np.asarray(dirs, dtype=float).reshape(-1, 3)
+    origins = np.broadcast_to(np.asarray(origins, dtype=float), dirs.shape)
+    return origins, dirs
 
 class Plane(Shape):
     def __init__(self, position, normal, material):
         self.normal = normalize(normal)
         super().__init__(position, material)
 
-    def ray_intersect(self, origin, dir):
+    def ray_distance(self, origin, dir):
         denom = dot(dir, self.normal)
         if abs(denom) <= 0.0001:
             return None
 
-        num = dot(subtract(self.position, origin), self.normal)
-        t = num / denom
+        t = dot(subtract(self.position, origin), self.normal) / denom
         if t < 0:
             return None
+        return t
 
+    def surface(self, origin, dir, t):
         P = add(origin, multiply(dir, t))
         return Intercept(distance=t,
                          point=P,
@@ -95,107 +179,217 @@ class Plane(Shape):
                          texcoords=None,
                          obj=self)
 
+    def ray_intersect_many(self, origins, dirs):
+        origins, dirs = ray_arrays(origins, dirs)
+        normal = np.asarray(self.normal, dtype=float)
+        denom = dot_many(dirs, normal)
+        parallel = np.abs(denom) <= 0.0001
+
+        t = dot_many(np.asarray(self.position, dtype=float) - origins, normal) / np.where(parallel, 1, denom)
+        mask = ~parallel & (t >= 0)
+
+        P = origins + dirs * t[:, None]
+        normals = np.broadcast_to(normal, P.shape)
+        return np.where(mask, t, INF), P, normals, None, mask
+
 class Disk(Plane):
     def __init__(self, position, normal, radius, material):
         self.radius = radius
         super().__init__(position, normal, material)
 
-    def ray_intersect(self, origin, dir):
-        planeIntersect = super().ray_intersect(origin, dir)
-        if planeIntersect is None:
-            return None
+    def bounds(self):
+        return ([self.position[i] - self.radius for i in range(3)],
+                [self.position[i] + self.radius for i in range(3)])
 
-        contactDistance = subtract(planeIntersect.point, self.position)
-        if magnitude(contactDistance) > self.radius:
+    def ray_distance(self, origin, dir):
+        t = super().ray_distance(origin, dir)
+        if t is None:
             return None
 
-        return Intercept(distance=planeIntersect.distance,
-                         point=planeIntersect.point,
-                         normal=self.normal,
-                         texcoords=None,
-                         obj=self)
+        P = add(origin, multiply(dir, t))
+        if magnitude(subtract(P, self.position)) > self.radius:
+            return None
+        return t
+
+    def ray_intersect_many(self, origins, dirs):
+        t, P, normals, _, mask = super().ray_intersect_many(origins, dirs)
+        contact = P - np.asarray(self.position, dtype=float)
+        mask &= np.sqrt(dot_many(contact, contact)) <= self.radius
+        return np.where(mask, t, INF), P, normals, None, mask
+
+# Inversa usada cuando una componente de la direccion es cero (la misma que la BVH)
+HUGE = 1e30
+
+def inverse_direction(dir):
+    return (1 / dir[0] if dir[0] != 0 else HUGE,
+            1 / dir[1] if dir[1] != 0 else HUGE,
+            1 / dir[2] if dir[2] != 0 else HUGE)
+
+def slab_hit(boundsMin, boundsMax, orig, inv):
+    """ Slab test contra una caja alineada a los ejes: (t, eje) de la cara por
+    la que entra el rayo (o por la que sale, si empieza adentro), o None. """
+    t1 = (boundsMin[0] - orig[0]) * inv[0]
+    t2 = (boundsMax[0] - orig[0]) * inv[0]
+    if t1 > t2:
+        t1, t2 = t2, t1
+    tNear, nearAxis = t1, 0
+    tFar, farAxis = t2, 0
+
+    t1 = (boundsMin[1] - orig[1]) * inv[1]
+    t2 = (boundsMax[1] - orig[1]) * inv[1]
+    if t1 > t2:
+        t1, t2 = t2, t1
+    if t1 > tNear:
+        tNear, nearAxis = t1, 1
+    if t2 < tFar:
+        tFar, farAxis = t2, 1
+
+    t1 = (boundsMin[2] - orig[2]) * inv[2]
+    t2 = (boundsMax[2] - orig[2]) * inv[2]
+    if t1 > t2:
+        t1, t2 = t2, t1
+    if t1 > tNear:
+        tNear, nearAxis = t1, 2
+    if t2 < tFar:
+        tFar, farAxis = t2, 2
+
+    if tNear > tFar or tFar < 0:
+        return None
+    if tNear > 0:
+        return tNear, nearAxis
+    return tFar, farAxis
+
+def inverse_many(dirs):
+    with np.errstate(divide="ignore"):
+        return np.where(dirs != 0, 1 / dirs, HUGE)
+
+def slab_hit_many(boundsMin, boundsMax, origins, inv):
+    # slab_hit sobre arreglos (N x 3, o un solo vector de 3): distancias (inf
+    # donde no hay hit) y eje de la cara de cada hit
+    t1 = (boundsMin - origins) * inv
+    t2 = (boundsMax - origins) * inv
+    near = np.minimum(t1, t2)
+    far = np.maximum(t1, t2)
+    nearAxis = near.argmax(axis=-1)
+    farAxis = far.argmin(axis=-1)
+    tNear = near.max(axis=-1)
+    tFar = far.min(axis=-1)
+
+    entering = tNear > 0
+    t = np.where(entering, tNear, tFar)
+    t = np.where((tNear > tFar) | (tFar < 0), INF, t)
+    return t, np.where(entering, nearAxis, farAxis)
+
+def box_uv(point, boundsMin, size, axis):
+    # UVs de la cara con normal en axis, con los otros dos ejes
+    if axis == 0:
+        return ((point[1] - boundsMin[1]) / size[1], (point[2] - boundsMin[2]) / size[2])
+    if axis == 1:
+        return ((point[0] - boundsMin[0]) / size[0], (point[2] - boundsMin[2]) / size[2])
+    return ((point[0] - boundsMin[0]) / size[0], (point[1] - boundsMin[1]) / size[1])
+
+def box_uv_many(points, boundsMin, size, axis):
+    rows = np.arange(len(points))
+    uAxis = np.where(axis == 0, 1, 0)
+    vAxis = np.where(axis == 2, 1, 2)
+    u = (points[rows, uAxis] - boundsMin[uAxis]) / size[uAxis]
+    v = (points[rows, vAxis] - boundsMin[vAxis]) / size[vAxis]
+    return np.stack((u, v), axis=1)
 
 class AABB(Shape):
     def __init__(self, position, size, material):
         super().__init__(position, material)
-        self.planes = []
         self.size = size
 
-        # Sides
-        leftPlane = Plane(add(self.position, (-size[0] / 2, 0, 0)), (-1, 0, 0), material)
-        rightPlane = Plane(add(self.position, (size[0] / 2, 0, 0)), (1, 0, 0), material)
-        bottomPlane = Plane(add(self.position, (0, -size[1] / 2, 0)), (0, -1, 0), material)
-        topPlane = Plane(add(self.position, (0, size[1] / 2, 0)), (0, 1, 0), material)
-        backPlane = Plane(add(self.position, (0, 0, -size[2] / 2)), (0, 0, -1), material)
-        frontPlane = Plane(add(self.position, (0, 0, size[2] / 2)), (0, 0, 1), material)
-        
-        self.planes.append(leftPlane)
-        self.planes.append(rightPlane)
-        self.planes.append(bottomPlane)
-        self.planes.append(topPlane)
-        self.planes.append(backPlane)
-        self.planes.append(frontPlane)
+        # Caras de la caja para el slab test
+        self.faceMin = [self.position[i] - size[i] / 2 for i in range(3)]
+        self.faceMax = [self.position[i] + size[i] / 2 for i in range(3)]
 
         # Bounds
         bias = 0.001
         self.boundsMin = [self.position[i] - (bias + size[i] / 2) for i in range(3)]
         self.boundsMax = [self.position[i] + (bias + size[i] / 2) for i in range(3)]
 
-    def ray_intersect(self, orig, dir):
-        intersect = None
-        t = float("inf")
-        u = 0
-        v = 0
-
-        for plane in self.planes:
-            planeIntersect = plane.ray_intersect(orig, dir)
-            if planeIntersect is not None:
-                planePoint = planeIntersect.point
-                if self.boundsMin[0] <= planePoint[0] <= self.boundsMax[0] and \
-                   self.boundsMin[1] <= planePoint[1] <= self.boundsMax[1] and \
-                   self.boundsMin[2] <= planePoint[2] <= self.boundsMax[2]:
-                   
-                    if planeIntersect.distance < t:
-                        t = planeIntersect.distance
-                        intersect = planeIntersect
-                        
-                        # Generate the UVs
-                        if abs(plane.normal[0]) > 0:
-                            # It's a left or right plane
-                            u = (planePoint[1] - self.boundsMin[1]) / self.size[1]
-                            v = (planePoint[2] - self.boundsMin[2]) / self.size[2]
-                        elif abs(plane.normal[1]) > 0:
-                            u = (planePoint[0] - self.boundsMin[0]) / self.size[0]
-                            v = (planePoint[2] - self.boundsMin[2]) / self.size[2]
-                        elif abs(plane.normal[2]) > 0:
-                            u = (planePoint[0] - self.boundsMin[0]) / self.size[0]
-                            v = (planePoint[1] - self.boundsMin[1]) / self.size[1]
-
-        if intersect is None:
+    def bounds(self):
+        return (self.boundsMin, self.boundsMax)
+
+    def ray_distance(self, orig, dir):
+        hit = slab_hit(self.faceMin, self.faceMax, orig, inverse_direction(dir))
+        # surface casi siempre se pide justo despues para el mismo rayo
+        self.lastHit = (orig, dir, hit)
+        if hit is None:
             return None
+        return hit[0]
+
+    def surface(self, orig, dir, t):
+        # La cara del hit sale del mismo slab test que eligio t
+        lastHit = getattr(self, "lastHit", None)
+        if lastHit is not None and lastHit[0] is orig and lastHit[1] is dir and lastHit[2] is not None:
+            axis = lastHit[2][1]
+        else:
+            axis = slab_hit(self.faceMin, self.faceMax, orig, inverse_direction(dir))[1]
+        P = add(orig, multiply(dir, t))
+
+        normal = [0, 0, 0]
+        normal[axis] = 1 if P[axis] > self.position[axis] else -1
 
         return Intercept(distance=t,
-                         point=intersect.point,
-                         normal=intersect.normal,
-                         texcoords=(u, v),
+                         point=P,
+                         normal=normal,
+                         texcoords=box_uv(P, self.boundsMin, self.size, axis),
                          obj=self)
 
+    def ray_intersect_many(self, origins, dirs):
+        origins, dirs = ray_arrays(origins, dirs)
+        position = np.asarray(self.position, dtype=float)
+        t, axis = slab_hit_many(np.asarray(self.faceMin, dtype=float), np.asarray(self.faceMax, dtype=float),
+                                origins, inverse_many(dirs))
+        mask = t < INF
+
+        rows = np.arange(len(dirs))
+        points = origins + dirs * np.where(mask, t, 0)[:, None]
+        normals = np.zeros((len(dirs), 3))
+        normals[rows, axis] = np.where(points[rows, axis] > position[axis], 1, -1)
+        texcoords = box_uv_many(points, np.asarray(self.boundsMin, dtype=float), np.asarray(self.size, dtype=float), axis)
+        return t, points, normals, texcoords, mask
+
 class Ellipsoid(Sphere):
     def __init__(self, position, radii, material):
         # radii es una tupla (a, b, c) que representa los semiejes del elipsoide
         self.radii = radii
         super().__init__(position, 1, material)  # La esfera base tiene radio 1
-
-    def ray_intersect(self, orig, dir):
-        # Escalamos el origen y la dirección del rayo
+        # La distancia se mide en el espacio escalado: es la distancia real
+        # multiplicada por |dir/radii|, que nunca es menor que min(1/radii)
+        self.distanceScale = min(1 / r for r in radii)
+
+    def bounds(self):
+        # En espacio real el elipsoide queda centrado en position*radii
+        center = [self.position[i] * self.radii[i] for i in range(3)]
+        return ([center[i] - self.radii[i] for i in range(3)],
+                [center[i] + self.radii[i] for i in range(3)])
+
+    def scaled_ray(self, orig, dir):
+        # Rayo en el espacio donde el elipsoide es una esfera de radio 1, y el
+        # factor por el que se dividio la direccion para normalizarla
         scaled_orig = [orig[i] / self.radii[i] for i in range(3)]
         scaled_dir = [dir[i] / self.radii[i] for i in range(3)]
-        scaled_dir = normalize(scaled_dir)
+        scale = magnitude(scaled_dir)
+        return scaled_orig, [i / scale for i in scaled_dir], scale
 
-        # Realizamos la intersección con la esfera unitaria
-        intersect = super().ray_intersect(scaled_orig, scaled_dir)
-        if intersect is None:
-            return None
+    def ray_distance(self, orig, dir):
+        scaled_orig, scaled_dir, _ = self.scaled_ray(orig, dir)
+        return super().ray_distance(scaled_orig, scaled_dir)
+
+    def ray_hits(self, orig, dir, maxDist):
+        # La distancia escalada se pasa a distancia real antes de comparar
+        scaled_orig, scaled_dir, scale = self.scaled_ray(orig, dir)
+        t = super().ray_distance(scaled_orig, scaled_dir)
+        return t is not None and t / scale < maxDist
+
+    def surface(self, orig, dir, t):
+        # Hit con la esfera unitaria en el espacio escalado
+        scaled_orig, scaled_dir, _ = self.scaled_ray(orig, dir)
+        intersect = super().surface(scaled_orig, scaled_dir, t)
 
         # Desescalamos el punto de intersección y la normal
         real_point = [intersect.point[i] * self.radii[i] for i in range(3)]
@@ -208,12 +402,32 @@ class Ellipsoid(Sphere):
                          normal=real_normal,
                          texcoords=intersect.texcoords,
                          obj=self)
+
+    def ray_intersect_many(self, origins, dirs):
+        origins, dirs = ray_arrays(origins, dirs)
+        radii = np.asarray(self.radii, dtype=float)
+        scaled_dirs = dirs / radii
+        scale = np.sqrt(dot_many(scaled_dirs, scaled_dirs))
+
+        t, P, normals, texcoords, mask = super().ray_intersect_many(origins / radii, scaled_dirs / scale[:, None])
+
+        real_points = P * radii
+        real_normals = normalize_many(normals / radii)
+        return t, real_points, real_normals, texcoords, mask
 class OBB(Shape):
     def __init__(self, position, size, rotation_matrix, material):
         super().__init__(position, material)
         self.size = size
         self.rotation = rotation_matrix
         self.inverse_rotation = self.matrix_inverse(self.rotation)
+        # Caja en espacio local, centrada en el origen
+        self.faceMax = [size[i] / 2 for i in range(3)]
+        self.faceMin = [-size[i] / 2 for i in range(3)]
+
+    def bounds(self):
+        extent = [sum(abs(self.rotation[i][j]) * self.size[j] / 2 for j in range(3)) for i in range(3)]
+        return ([self.position[i] - extent[i] for i in range(3)],
+                [self.position[i] + extent[i] for i in range(3)])
 
     def matrix_vector_multiply(self, matrix, vector):
         result = [sum(matrix[i][j] * vector[j] for j in range(3)) for i in range(3)]
@@ -246,69 +460,81 @@ class OBB(Shape):
 
         return [[adjoint[i][j] * inv_det for j in range(3)] for i in range(3)]
 
-    def ray_intersect(self, orig, dir):
-        # Transformar el rayo al espacio del OBB usando la inversa de la rotación
-        transformed_orig = subtract(self.matrix_vector_multiply(self.inverse_rotation, subtract(orig, self.position)), self.position)
-        transformed_dir = self.matrix_vector_multiply(self.inverse_rotation, dir)
-
-        # Bounds de la AABB (en espacio local del OBB)
-        boundsMin = [-self.size[i] / 2 for i in range(3)]
-        boundsMax = [self.size[i] / 2 for i in range(3)]
-
-        # Comprobar intersección como si fuera un AABB en espacio local
-        epsilon = 1e-8
-        t_min = [(boundsMin[i] - transformed_orig[i]) / (transformed_dir[i] + epsilon) for i in range(3)]
-
-      #  t_min = [(boundsMin[i] - transformed_orig[i]) / transformed_dir[i] for i in range(3)]
-        epsilon = 1e-8
-        t_max = [(boundsMax[i] - transformed_orig[i]) / (transformed_dir[i] + epsilon) for i in range(3)]
-
-
-        t_near = max(min(t_min[0], t_max[0]), min(t_min[1], t_max[1]), min(t_min[2], t_max[2]))
-        t_far = min(max(t_min[0], t_max[0]), max(t_min[1], t_max[1]), max(t_min[2], t_max[2]))
-
-        if t_near > t_far or t_far < 0:
+    def local_ray(self, orig, dir):
+        # Transformar el rayo al espacio del OBB: R^-1 * (orig - position) y R^-1 * dir.
+        # La transformacion es lineal, asi que t es el mismo en los dos espacios
+        m0, m1, m2 = self.inverse_rotation
+        rx = orig[0] - self.position[0]
+        ry = orig[1] - self.position[1]
+        rz = orig[2] - self.position[2]
+        transformed_orig = (m0[0] * rx + m0[1] * ry + m0[2] * rz,
+                            m1[0] * rx + m1[1] * ry + m1[2] * rz,
+                            m2[0] * rx + m2[1] * ry + m2[2] * rz)
+        transformed_dir = (m0[0] * dir[0] + m0[1] * dir[1] + m0[2] * dir[2],
+                           m1[0] * dir[0] + m1[1] * dir[1] + m1[2] * dir[2],
+                           m2[0] * dir[0] + m2[1] * dir[1] + m2[2] * dir[2])
+        return transformed_orig, transformed_dir
+
+    def ray_distance(self, orig, dir):
+        transformed_orig, transformed_dir = self.local_ray(orig, dir)
+        hit = slab_hit(self.faceMin, self.faceMax, transformed_orig, inverse_direction(transformed_dir))
+        # surface casi siempre se pide justo despues para el mismo rayo
+        self.lastHit = (orig, dir, None if hit is None else (transformed_orig, transformed_dir, hit[1]))
+        if hit is None:
             return None
+        return hit[0]
 
-        t = t_near if t_near > 0 else t_far
+    def surface(self, orig, dir, t):
+        lastHit = getattr(self, "lastHit", None)
+        if lastHit is not None and lastHit[0] is orig and lastHit[1] is dir and lastHit[2] is not None:
+            transformed_orig, transformed_dir, axis = lastHit[2]
+        else:
+            transformed_orig, transformed_dir = self.local_ray(orig, dir)
+            axis = slab_hit(self.faceMin, self.faceMax, transformed_orig, inverse_direction(transformed_dir))[1]
         intersect_point = add(transformed_orig, multiply(transformed_dir, t))
+        sign = 1 if intersect_point[axis] > 0 else -1
 
-        # Determinar la normal y las coordenadas UV.
-        axis = max(enumerate([abs(intersect_point[0] - boundsMin[0]),
-                              abs(intersect_point[1] - boundsMin[1]),
-                              abs(intersect_point[2] - boundsMin[2])]), key=lambda x: x[1])[0]
+        # La normal de la cara pasa al mundo con la inversa transpuesta
+        # (para una rotacion es la misma rotacion): la fila axis de R^-1
+        row = self.inverse_rotation[axis]
+        real_normal = normalize([sign * row[0], sign * row[1], sign * row[2]])
 
-        normal = [0, 0, 0]
-        normal[axis] = 1 if intersect_point[axis] > 0 else -1
-
-        u, v = 0, 0
-        if axis == 0:
-            u = (intersect_point[1] - boundsMin[1]) / self.size[1]
-            v = (intersect_point[2] - boundsMin[2]) / self.size[2]
-        elif axis == 1:
-            u = (intersect_point[0] - boundsMin[0]) / self.size[0]
-            v = (intersect_point[2] - boundsMin[2]) / self.size[2]
-        elif axis == 2:
-            u = (intersect_point[0] - boundsMin[0]) / self.size[0]
-            v = (intersect_point[1] - boundsMin[1]) / self.size[1]
-
-        # Transformar el punto de intersección y la normal de vuelta al espacio del mundo
-        real_point = add(self.matrix_vector_multiply(self.rotation, intersect_point), self.position)
-        real_normal = self.matrix_vector_multiply(self.rotation, normal)
-
-        # Devolver el resultado
         return Intercept(distance=t,
-                         point=real_point,
+                         point=add(orig, multiply(dir, t)),
                          normal=real_normal,
-                         texcoords=(u, v),
+                         texcoords=box_uv(intersect_point, self.faceMin, self.size, axis),
                          obj=self)
+
+    def ray_intersect_many(self, origins, dirs):
+        origins, dirs = ray_arrays(origins, dirs)
+        transformed_orig = matrix_vector_many(self.inverse_rotation, origins - np.asarray(self.position, dtype=float))
+        transformed_dir = matrix_vector_many(self.inverse_rotation, dirs)
+
+        faceMin = np.asarray(self.faceMin, dtype=float)
+        t, axis = slab_hit_many(faceMin, np.asarray(self.faceMax, dtype=float),
+                                transformed_orig, inverse_many(transformed_dir))
+        mask = t < INF
+        t0 = np.where(mask, t, 0)[:, None]
+        intersect_point = transformed_orig + transformed_dir * t0
+
+        rows = np.arange(len(dirs))
+        sign = np.where(intersect_point[rows, axis] > 0, 1, -1)
+        real_normal = normalize_many(np.asarray(self.inverse_rotation, dtype=float)[axis] * sign[:, None])
+        texcoords = box_uv_many(intersect_point, faceMin, np.asarray(self.size, dtype=float), axis)
+        return t, origins + dirs * t0, real_normal, texcoords, mask
+
 class ThinCylinder(Shape):
     def __init__(self, position, height, radius, material):
         super().__init__(position, material)
         self.height = height
         self.radius = radius
 
-    def ray_intersect(self, orig, dir):
+    def bounds(self):
+        extent = (self.radius, self.height / 2, self.radius)
+        return ([self.position[i] - extent[i] for i in range(3)],
+                [self.position[i] + extent[i] for i in range(3)])
+
+    def ray_distance(self, orig, dir):
         # Transformamos el rayo al espacio del cilindro (centrado en el origen)
         transformed_orig = subtract(orig, self.position)
 
@@ -352,7 +578,9 @@ class ThinCylinder(Shape):
 
         if t < 0:
             return None
+        return t
 
+    def surface(self, orig, dir, t):
         P = add(orig, multiply(dir, t))
         normal = subtract(P, add(self.position, (0, P[1], 0)))
         normal = normalize(normal)
@@ -363,6 +591,57 @@ class ThinCylinder(Shape):
                          texcoords=None,
                          obj=self)
 
+    def ray_intersect_many(self, origins, dirs):
+        origins, dirs = ray_arrays(origins, dirs)
+        position = np.asarray(self.position, dtype=float)
+        transformed_orig = origins - position
+        ox, oy, oz = transformed_orig[:, 0], transformed_orig[:, 1], transformed_orig[:, 2]
+        dx, dy, dz = dirs[:, 0], dirs[:, 1], dirs[:, 2]
+
+        a = dx ** 2 + dz ** 2
+        b = 2 * (ox * dx + oz * dz)
+        c = ox ** 2 + oz ** 2 - self.radius ** 2
+
+        discriminant = b ** 2 - 4 * a * c
+        mask = discriminant >= 0
+
+        # Rayos paralelos al eje (a == 0)
+        flat = a == 0
+        mask &= ~(flat & (b == 0))
+        tFlat = -c / np.where(b == 0, 1, b)
+
+        root = np.sqrt(np.maximum(discriminant, 0))
+        safeA = np.where(flat, 1, a)
+        t0 = (-b - root) / (2 * safeA)
+        t1 = (-b + root) / (2 * safeA)
+        t0, t1 = np.minimum(t0, t1), np.maximum(t0, t1)
+        t0 = np.where(flat, tFlat, t0)
+        t1 = np.where(flat, tFlat, t1)
+
+        y0 = oy + t0 * dy
+        y1 = oy + t1 * dy
+
+        low = -self.height / 2
+        high = self.height / 2
+
+        clampLow = y0 < low
+        y0 = np.where(clampLow, low, y0)
+        t0 = np.where(clampLow, (low - oy) / dy, t0)
+
+        clampHigh = y1 > high
+        y1 = np.where(clampHigh, high, y1)
+        t1 = np.where(clampHigh, (high - oy) / dy, t1)
+
+        mask &= ~((y0 > high) | (y1 < low) | (t0 > t1))
+        t = np.where(y0 > low, t0, t1)
+        mask &= t >= 0
+
+        P = origins + dirs * t[:, None]
+        axisPoint = np.array(np.broadcast_to(position, P.shape))
+        axisPoint[:, 1] = position[1] + P[:, 1]
+        normals = normalize_many(P - axisPoint)
+        return np.where(mask, t, INF), P, normals, None, mask
+
 class Line(object):
     def __init__(self, point, direction):
         self.point = point
@@ -382,11 +661,21 @@ class Triangle(Shape):
         # Calculamos el centroide del triángulo para usarlo como posición
         position = [(v0[i] + v1[i] + v2[i]) / 3 for i in range(3)]
         super().__init__(position, material)
+        # Aristas y normal se calculan una sola vez
+        self.edge1 = subtract(v1, v0)
+        self.edge2 = subtract(v2, v0)
+        self.normal = cross(self.edge1, self.edge2)
+        if magnitude(self.normal) > 0:  # Un triangulo degenerado nunca reporta hit
+            self.normal = normalize(self.normal)
+
+    def bounds(self):
+        return ([min(self.v0[i], self.v1[i], self.v2[i]) for i in range(3)],
+                [max(self.v0[i], self.v1[i], self.v2[i]) for i in range(3)])
     
-    def ray_intersect(self, orig, dir):
+    def ray_distance(self, orig, dir):
         EPSILON = 1e-8
-        edge1 = subtract(self.v1, self.v0)
-        edge2 = subtract(self.v2, self.v0)
+        edge1 = self.edge1
+        edge2 = self.edge2
         h = cross(dir, edge2)
         a = dot(edge1, h)
         if -EPSILON < a < EPSILON:
@@ -402,19 +691,37 @@ class Triangle(Shape):
             return None
         t = f * dot(edge2, q)
         if t > EPSILON:
-            intersection_point = add(orig, multiply(dir, t))
-            normal = cross(edge1, edge2)  # La normal del triángulo
-            normal = normalize(normal)
-            return Intercept(distance=t,
-                             point=intersection_point,
-                             normal=normal,
-                             texcoords=None,  # Puedes agregar cálculo de UV si lo necesitas
-                             obj=self)
+            return t
         return None
 
-def cross(v1, v2):
-    return [
-        v1[1] * v2[2] - v1[2] * v2[1],
-        v1[2] * v2[0] - v1[0] * v2[2],
-        v1[0] * v2[1] - v1[1] * v2[0]
-    ]
+    def surface(self, orig, dir, t):
+        intersection_point = add(orig, multiply(dir, t))
+        return Intercept(distance=t,
+                         point=intersection_point,
+                         normal=self.normal,
+                         texcoords=None,  # Puedes agregar cálculo de UV si lo necesitas
+                         obj=self)
+
+    def ray_intersect_many(self, origins, dirs):
+        EPSILON = 1e-8
+        origins, dirs = ray_arrays(origins, dirs)
+        v0 = np.asarray(self.v0, dtype=float)
+        edge1 = np.asarray(self.edge1, dtype=float)
+        edge2 = np.asarray(self.edge2, dtype=float)
+
+        h = cross_many(dirs, edge2)
+        a = dot_many(h, edge1)
+        parallel = (-EPSILON < a) & (a < EPSILON)
+        f = 1.0 / np.where(parallel, 1, a)
+
+        s = origins - v0
+        u = f * dot_many(s, h)
+        q = cross_many(s, edge1)
+        v = f * dot_many(dirs, q)
+        t = f * dot_many(q, edge2)
+
+        mask = ~parallel & (u >= 0) & (u <= 1) & (v >= 0) & (u + v <= 1) & (t > EPSILON)
+
+        P = origins + dirs * t[:, None]
+        normal = np.asarray(self.normal, dtype=float)
+        return np.where(mask, t, INF), P, np.broadcast_to(normal, P.shape), None, mask
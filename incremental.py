@@ -0,0 +1,224 @@
+"""Re-render incremental despues de editar luces, materiales o figuras.
+
+IncrementalRender hace un render completo y guarda, por pixel, los rayos que
+trazo su arbol (primario, reflejados, refractados y de sombra) con sus
+resultados. Despues de una edicion update vuelve a calcular solo los pixeles
+afectados:
+
+    incremental = IncrementalRender(raytracer)
+    incremental.render()
+
+    light.intensity = 0.4
+    incremental.update(lights=True)          # solo sombreado, sin intersecciones
+
+    material.diffuse = (1, 0, 0)
+    incremental.update(materials=[material]) # pixeles que ven ese material
+
+    raytracer.scene[3] = Sphere(...)         # figura nueva, movida o quitada
+    incremental.update()
+
+Mientras la geometria no cambia, los rayos guardados se reutilizan tal cual:
+cambiar una luz o un material solo repite el sombreado (un rayo de sombra
+nuevo solo se traza si la luz cambio de lugar o de direccion). Cuando una
+figura cambia, se vuelven a trazar los pixeles con algun rayo que cruce su
+caja de antes o la de ahora. Las figuras agregadas o quitadas de
+raytracer.scene se detectan solas; las modificadas en su lugar se pasan en
+objects. Una figura sin limites (Plane) afecta a todos los pixeles.
+
+La camara, el viewport y el envMap no se siguen: despues de cambiarlos hay
+que llamar otra vez a render. El resultado es el mismo que el de un
+rtRender completo con la escena editada.
+"""
+from bvh import slab_enter, inverse_direction, BOUNDS_EPSILON, INF
+
+
+def box(obj):
+    # Caja de la figura como nodo de la BVH (con holgura), o INF si no tiene limites
+    bounds = obj.bounds()
+    if bounds is None:
+        return INF
+    boundsMin, boundsMax = bounds
+    return tuple([c - BOUNDS_EPSILON for c in boundsMin] + [c + BOUNDS_EPSILON for c in boundsMax])
+
+
+class PixelRecord(object):
+    """ Rayos trazados por un pixel: casts (argumentos de rtCastRay -> Intercept) y shadows (de rtOccluded -> bool). """
+    __slots__ = ("casts", "shadows")
+
+    def __init__(self):
+        self.casts = {}
+        self.shadows = {}
+
+
+class IncrementalRender(object):
+    def __init__(self, raytracer):
+        self.raytracer = raytracer
+        self.records = {}
+        # Figuras y luces del ultimo render, y la caja de cada figura en ese momento
+        self.scene = []
+        self.lights = []
+        self.bounds = {}
+        # Pixeles recalculados en el ultimo render o update
+        self.updated = 0
+
+    def pixels(self):
+        raytracer = self.raytracer
+        for j in range(raytracer.vpHeight):
+            for i in range(raytracer.vpWidth):
+                x = i + raytracer.vpX
+                y = j + raytracer.vpY
+                if 0 <= x < raytracer.width and 0 <= y < raytracer.height:
+                    yield x, y
+
+    def render(self):
+        """ Render completo que guarda los rayos de cada pixel. """
+        self.records = {}
+        self.raytracer.rtPrepare()
+        pixels = list(self.pixels())
+        self.trace(pixels, reuse=False)
+        self.updated = len(pixels)
+
+    def update(self, objects=(), materials=(), lights=False):
+        """ Recalcula los pixeles afectados por las ediciones y devuelve cuantos fueron.
+
+        objects: figuras modificadas en su lugar (las agregadas o quitadas de la
+        escena se detectan solas). materials: materiales modificados.
+        lights: True si cambio alguna luz (tambien se detecta si se agregaron o
+        quitaron luces).
+        """
+        raytracer = self.raytracer
+        changed = set(objects)
+        changed.update(obj for obj in self.scene if obj not in raytracer.scene)
+        changed.update(obj for obj in raytracer.scene if obj not in self.scene)
+        lights = lights or self.lights != list(raytracer.lights)
+        materials = list(materials)
+
+        retrace = set()
+        if changed:
+            raytracer.rtPrepare(rebuild=True)
+            boxes = []
+            for obj in changed:
+                # La caja de antes (si estaba en la escena) y la de ahora (si esta)
+                boxes.append(self.bounds.get(obj))
+                boxes.append(box(obj) if obj in raytracer.scene else None)
+            # Las figuras compiten por la distancia que reportan, que puede ser
+            # menor que la real (Ellipsoid): una figura editada le gana al hit
+            # guardado si su distancia real es menor que la reportada del hit
+            # dividida por su distanceScale
+            scale = min(obj.distanceScale for obj in changed)
+            retrace = {pixel for pixel, record in self.records.items()
+                       if self.crosses(record, changed, boxes, scale)}
+
+        reshade = set()
+        if lights or materials:
+            for pixel, record in self.records.items():
+                if pixel in retrace:
+                    continue
+                hits = [intercept.obj.material for intercept in record.casts.values() if intercept is not None]
+                # Sin ningun hit el pixel es solo envMap: no depende de luces ni materiales
+                if hits and (lights or any(material is m for material in materials for m in hits)):
+                    reshade.add(pixel)
+
+        self.trace(sorted(retrace), reuse=False)
+        self.trace(sorted(reshade), reuse=True)
+        self.updated = len(retrace) + len(reshade)
+        return self.updated
+
+    def crosses(self, record, changed, boxes, scale=1.0):
+        # Si algun rayo del pixel toco una figura editada o cruza una de sus
+        # cajas antes del punto en que una figura con ese distanceScale le
+        # ganaria al hit guardado
+        for intercept in record.casts.values():
+            if intercept is not None and intercept.obj in changed:
+                return True
+
+        nodes = []
+        for node in boxes:
+            if node is INF:
+                return True
+            if node is not None:
+                nodes.append(node)
+        if not nodes:
+            return False
+
+        for (orig, dir, _, _), intercept in record.casts.items():
+            length = INF if intercept is None else intercept.distance / scale
+            if self.segmentCrosses(orig, dir, length, nodes):
+                return True
+        for (orig, dir, maxDist, _) in record.shadows:
+            if self.segmentCrosses(orig, dir, maxDist, nodes):
+                return True
+        return False
+
+    def segmentCrosses(self, orig, dir, length, nodes):
+        inv = inverse_direction(dir)
+        for node in nodes:
+            enter = slab_enter(node, orig, inv)
+            if enter is not None and enter <= length:
+                return True
+        return False
+
+    def remember(self):
+        # Figuras, luces y cajas (con holgura) del estado que queda en los registros
+        raytracer = self.raytracer
+        self.scene = list(raytracer.scene)
+        self.lights = list(raytracer.lights)
+        self.bounds = {obj: box(obj) for obj in self.scene}
+
+    def trace(self, pixels, reuse):
+        # Calcula los pixeles con rtCastRay y rtOccluded envueltos en esta
+        # instancia del raytracer: cada rayo se busca primero en el registro
+        # anterior del pixel (si reuse) y se guarda en uno nuevo
+        raytracer = self.raytracer
+        castRay = raytracer.rtCastRay
+        occluded = raytracer.rtOccluded
+        previous = None
+        current = None
+
+        def rtCastRay(orig, dir, sceneObj=None, recursion=0):
+            key = (tuple(orig), tuple(dir), sceneObj, recursion)
+            if previous is not None and key in previous.casts:
+                intercept = previous.casts[key]
+            else:
+                intercept = castRay(orig, dir, sceneObj, recursion)
+            current.casts[key] = intercept
+            return intercept
+
+        def rtOccluded(orig, dir, maxDist=INF, ignore=None):
+            key = (tuple(orig), tuple(dir), maxDist, ignore)
+            if previous is not None and key in previous.shadows:
+                blocked = previous.shadows[key]
+            else:
+                blocked = occluded(orig, dir, maxDist, ignore)
+            current.shadows[key] = blocked
+            return blocked
+
+        # La estructura de aceleracion ya esta armada para la escena actual
+        # (en render o, si cambio alguna figura, en update)
+        raytracer.rtPrepare(rebuild=False)
+        saved = {name: raytracer.__dict__.get(name) for name in ("rtCastRay", "rtOccluded")}
+        raytracer.rtCastRay = rtCastRay
+        raytracer.rtOccluded = rtOccluded
+        try:
+            for x, y in pixels:
+                previous = self.records.get((x, y)) if reuse else None
+                current = PixelRecord()
+                rayColor = raytracer.rtPixelColor(x, y)
+                self.records[(x, y)] = current
+
+                rect = raytracer.rtBlockRect(x, y, 1, 1)
+                if rect is None:
+                    continue
+                if rayColor != None:
+                    raytracer.screen.fill((int(rayColor[0] * 255),
+                                           int(rayColor[1] * 255),
+                                           int(rayColor[2] * 255)), rect)
+                else:
+                    raytracer.screen.fill(raytracer.clearColor, rect)
+        finally:
+            for name, method in saved.items():
+                if method is None:
+                    del raytracer.__dict__[name]
+                else:
+                    raytracer.__dict__[name] = method
+        self.remember()
@@ -0,0 +1,123 @@
+"""Instancias: una misma figura colocada muchas veces con transformaciones distintas.
+
+Una Instance envuelve cualquier figura (tambien una Mesh) con una matriz
+afin de 4 x 4 que lleva del espacio de la figura al mundo. La matriz, su
+inversa y la matriz de normales (la transpuesta de la inversa) se calculan
+una sola vez al crearla. Para intersectar, el rayo se lleva una vez al
+espacio de la figura, se usan los metodos de la figura y el punto y la
+normal vuelven al mundo. Varias instancias comparten la misma figura, asi
+que la memoria y el tiempo de armado (por ejemplo la BVH de una malla) no
+crecen con la cantidad de copias:
+
+    caja = load_obj("caja.obj", material=carton)
+    for i in range(100):
+        raytracer.scene.append(Instance(caja, transform(position=(i % 10, 0, -8 - i // 10),
+                                                        rotation=(0, 15 * i, 0), scale=0.5)))
+
+Cada instancia puede tener su propio material; sin material usa el de la
+figura. La figura compartida no se agrega a raytracer.scene.
+"""
+from math import sqrt, sin, cos, radians
+
+import numpy as np
+
+from figures import Shape, Intercept, INF, ray_arrays
+from mt import (matriz_inversa, matriz_transpuesta, multiplicar_matrices, transformar_punto,
+                transformar_vector, transformar_puntos, transformar_vectores)
+from vec3 import normalize, dot_many, normalize_many
+
+
+def transform(position=(0, 0, 0), rotation=(0, 0, 0), scale=1):
+    """ Matriz de 4 x 4 que escala, rota (angulos en grados sobre x, y, z, en ese orden) y traslada a position. """
+    if isinstance(scale, (int, float)):
+        scale = (scale, scale, scale)
+    a, b, c = [radians(angle) for angle in rotation]
+
+    rx = [[1, 0, 0, 0], [0, cos(a), -sin(a), 0], [0, sin(a), cos(a), 0], [0, 0, 0, 1]]
+    ry = [[cos(b), 0, sin(b), 0], [0, 1, 0, 0], [-sin(b), 0, cos(b), 0], [0, 0, 0, 1]]
+    rz = [[cos(c), -sin(c), 0, 0], [sin(c), cos(c), 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
+    s = [[scale[0], 0, 0, 0], [0, scale[1], 0, 0], [0, 0, scale[2], 0], [0, 0, 0, 1]]
+    t = [[1, 0, 0, position[0]], [0, 1, 0, position[1]], [0, 0, 1, position[2]], [0, 0, 0, 1]]
+
+    matrix = s
+    for m in (rx, ry, rz, t):
+        matrix = multiplicar_matrices(m, matrix)
+    return matrix
+
+
+class Instance(Shape):
+    def __init__(self, shape, matrix, material=None):
+        if list(matrix[3]) != [0, 0, 0, 1]:
+            raise ValueError("La transformacion debe ser afin (ultima fila 0, 0, 0, 1)")
+
+        self.shape = shape
+        self.matrix = [[float(c) for c in row] for row in matrix]
+        self.inverse = matriz_inversa(self.matrix)
+        # Las normales pasan al mundo con la transpuesta de la inversa (parte de 3 x 3)
+        self.normalMatrix = [row[:3] for row in matriz_transpuesta(self.inverse)[:3]]
+        super().__init__([self.matrix[i][3] for i in range(3)], shape.material if material is None else material)
+        # ray_distance es la de la figura dividida por scale, asi que la
+        # relacion con la distancia real es la misma que la de la figura
+        self.distanceScale = shape.distanceScale
+        self.lastRay = None
+
+    def bounds(self):
+        # Caja de las ocho esquinas de la caja de la figura ya transformadas
+        bounds = self.shape.bounds()
+        if bounds is None:
+            return None
+        corners = [transformar_punto(self.matrix, (x, y, z)) for x in (bounds[0][0], bounds[1][0])
+                                                             for y in (bounds[0][1], bounds[1][1])
+                                                             for z in (bounds[0][2], bounds[1][2])]
+        return ([min(c[i] for c in corners) for i in range(3)],
+                [max(c[i] for c in corners) for i in range(3)])
+
+    def local_ray(self, orig, dir):
+        # Rayo en el espacio de la figura, con la direccion normalizada, y
+        # cuanto se estira la direccion (distancia local = distancia * scale)
+        m0, m1, m2, _ = self.inverse
+        localOrig = [m0[0] * orig[0] + m0[1] * orig[1] + m0[2] * orig[2] + m0[3],
+                     m1[0] * orig[0] + m1[1] * orig[1] + m1[2] * orig[2] + m1[3],
+                     m2[0] * orig[0] + m2[1] * orig[1] + m2[2] * orig[2] + m2[3]]
+        dx = m0[0] * dir[0] + m0[1] * dir[1] + m0[2] * dir[2]
+        dy = m1[0] * dir[0] + m1[1] * dir[1] + m1[2] * dir[2]
+        dz = m2[0] * dir[0] + m2[1] * dir[1] + m2[2] * dir[2]
+        scale = sqrt(dx * dx + dy * dy + dz * dz)
+        return localOrig, [dx / scale, dy / scale, dz / scale], scale
+
+    def ray_distance(self, orig, dir):
+        local = self.local_ray(orig, dir)
+        # surface casi siempre se pide justo despues para el mismo rayo
+        self.lastRay = (orig, dir, local)
+        t = self.shape.ray_distance(local[0], local[1])
+        return None if t is None else t / local[2]
+
+    def surface(self, orig, dir, t):
+        lastRay = self.lastRay
+        if lastRay is not None and lastRay[0] is orig and lastRay[1] is dir:
+            localOrig, localDir, scale = lastRay[2]
+        else:
+            localOrig, localDir, scale = self.local_ray(orig, dir)
+
+        intercept = self.shape.surface(localOrig, localDir, t * scale)
+        return Intercept(distance=t,
+                         point=transformar_punto(self.matrix, intercept.point),
+                         normal=normalize(transformar_vector(self.normalMatrix, intercept.normal)),
+                         texcoords=intercept.texcoords,
+                         obj=self)
+
+    def ray_hits(self, orig, dir, maxDist):
+        localOrig, localDir, scale = self.local_ray(orig, dir)
+        return self.shape.ray_hits(localOrig, localDir, maxDist * scale)
+
+    def ray_intersect_many(self, origins, dirs):
+        origins, dirs = ray_arrays(origins, dirs)
+        localOrigins = transformar_puntos(self.inverse, origins)
+        localDirs = transformar_vectores(self.inverse, dirs)
+        scale = np.sqrt(dot_many(localDirs, localDirs))
+        t, P, normals, texcoords, mask = self.shape.ray_intersect_many(localOrigins, localDirs / scale[:, None])
+
+        points = transformar_puntos(self.matrix, P)
+        with np.errstate(invalid="ignore"):
+            normals = normalize_many(transformar_vectores(self.normalMatrix, normals))
+        return np.where(mask, t / scale, INF), points, normals, texcoords, mask
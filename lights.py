@@ -1,27 +1,15 @@
-from math import acos, asin, sqrt
-import mt
-# Funciones de operación con vectores
-def dot(v1, v2):
-    return sum(a*b for a, b in zip(v1, v2))
+from math import acos, asin
+import numpy as np
 
-def subtract(v1, v2):
-    return [a-b for a, b in zip(v1, v2)]
-
-def multiply_scalar(scalar, v):
-    return [scalar * i for i in v]
-
-def norm(v):
-    return sqrt(sum(i**2 for i in v))
-
-def normalize(v):
-    magnitude = norm(v)
-    return [i/magnitude for i in v]
+from vec3 import subtract, multiply, divide, negate, dot, magnitude, normalize, reflect, dot_many, normalize_many
 
 def reflectVector(normal, direction):
-    reflect = multiply_scalar(2 * dot(normal, direction), normal)
-    reflect = subtract(reflect, direction)
-    reflect = normalize(reflect)
-    return reflect
+    return reflect(normal, direction)
+
+def reflectVectors(normals, directions):
+    # reflectVector para arreglos N x 3 (directions puede ser un solo vector)
+    d = 2 * dot_many(normals, directions)[:, None]
+    return normalize_many(d * normals - directions)
 
 def refractVector(normal, incident, n1, n2):
     c1 = dot(normal, incident)
@@ -29,11 +17,12 @@ def refractVector(normal, incident, n1, n2):
     if c1 < 0:
         c1 = -c1
     else:
-        normal = [-i for i in normal]
+        normal = negate(normal)
         n1, n2 = n2, n1
 
     n = n1 / n2
-    T = [n * incident[i] + n * c1 * normal[i] - normal[i] * (1 - n**2 * (1 - c1**2))**0.5 for i in range(3)]
+    root = (1 - n**2 * (1 - c1**2))**0.5
+    T = [n * incident[i] + n * c1 * normal[i] - normal[i] * root for i in range(3)]
     T = normalize(T)
     return T
 
@@ -86,52 +75,86 @@ class Light(object):
     def getSpecularColor(self,intercept,viewPos):
         return None
     
+    #Versiones por arreglos: points y normals son N x 3, Ks y spec arreglos
+    #de largo N con los parametros del material de cada punto y viewDirs
+    #(N x 3, normalizadas) las direcciones hacia la camara. Devuelven N x 3.
+    def getDirections(self,points):
+        #Direcciones normalizadas hacia la luz (N x 3) y distancias (N)
+        return None
+    
+    def getDiffuseColors(self,points,normals,Ks):
+        return None
+    
+    def getSpecularColors(self,points,normals,viewDirs,spec,Ks):
+        return None
+    
 class AmbientLight(Light):
     def __init__(self,intensity=1,color=(1,1,1)):
         super().__init__(intensity,color,"Ambient")
         
 class DirectionalLight(Light):
     def __init__(self, direction=(0,-1,0),intensity=1, color=(1, 1, 1)):
-        self.direction=mt.normalizar_vector(direction)
+        self.direction=direction
         super().__init__(intensity, color,"Directional")
+    
+    @property
+    def direction(self):
+        return self._direction
+    
+    @direction.setter
+    def direction(self,direction):
+        #Se guarda normalizada, junto con la direccion hacia la luz
+        self._direction = normalize(direction)
+        self.toLight = negate(self._direction)
+        self.toLightArray = np.array(self.toLight)
         
     def getDiffuseColor(self,intercept):
-        dir = [(i*-1) for i in self.direction]
-        
-        intensity = mt.producto_punto(intercept.normal,dir)*self.intensity
+        intensity = dot(intercept.normal,self.toLight)*self.intensity
         intensity = max(0,min(1,intensity))
         intensity *= 1-intercept.obj.material.Ks
-        diffuseColor = [(i*intensity) for i in self.color]
+        diffuseColor = multiply(self.color,intensity)
         
         return diffuseColor
     
     def getSpecularColor(self, intercept, viewPos):
-        dir = [(i*-1) for i in self.direction]
-        
-        reflect = reflectVector(intercept.normal,dir)
+        reflect = reflectVector(intercept.normal,self.toLight)
         
-        viewDir = mt.subtract_arrays(viewPos,intercept.point)
-        viewDir = mt.normalizar_vector(viewDir)
+        viewDir = subtract(viewPos,intercept.point)
+        viewDir = normalize(viewDir)
         
-        specIntensity = max(0,mt.producto_punto(viewDir,reflect))**intercept.obj.material.spec
+        specIntensity = max(0,dot(viewDir,reflect))**intercept.obj.material.spec
         specIntensity *= intercept.obj.material.Ks
         specIntensity *= self.intensity
         
-        specColor = [(i*specIntensity) for i in self.color]
+        specColor = multiply(self.color,specIntensity)
         
         return specColor
     
+    def getDirections(self,points):
+        n = len(points)
+        return np.broadcast_to(self.toLightArray,(n,3)), np.full(n,np.inf)
+    
+    def getDiffuseColors(self,points,normals,Ks):
+        intensity = dot_many(normals,self.toLightArray)*self.intensity
+        intensity = np.clip(intensity,0,1)*(1-Ks)
+        return intensity[:,None]*np.asarray(self.color,dtype=float)
+    
+    def getSpecularColors(self,points,normals,viewDirs,spec,Ks):
+        reflect = reflectVectors(normals,self.toLightArray)
+        specIntensity = np.maximum(0,dot_many(viewDirs,reflect))**spec*Ks*self.intensity
+        return specIntensity[:,None]*np.asarray(self.color,dtype=float)
+    
 class PointLight(Light):
     def __init__(self, point=(0,0,0),intensity=1, color=(1, 1, 1)):
         self.point = point
         super().__init__(intensity, color, "Point")
         
     def getDiffuseColor(self, intercept):
-        dir = mt.subtract_arrays(self.point,intercept.point)
-        R = mt.calcular_norma(dir)
-        dir = mt.divide_array_scalar(dir,R)
+        dir = subtract(self.point,intercept.point)
+        R = magnitude(dir)
+        dir = divide(dir,R)
         
-        intensity = mt.producto_punto(intercept.normal,dir)*self.intensity
+        intensity = dot(intercept.normal,dir)*self.intensity
         intensity *= 1-intercept.obj.material.Ks
         
         if R!=0:
@@ -139,21 +162,21 @@ class PointLight(Light):
         
         intensity = max(0,min(1,intensity))
 
-        diffuseColor = [(i*intensity) for i in self.color]
+        diffuseColor = multiply(self.color,intensity)
         
         return diffuseColor
     
     def getSpecularColor(self, intercept, viewPos):
-        dir = mt.subtract_arrays(self.point,intercept.point)
-        R = mt.calcular_norma(dir)
-        dir = mt.divide_array_scalar(dir,R)
+        dir = subtract(self.point,intercept.point)
+        R = magnitude(dir)
+        dir = divide(dir,R)
         
         reflect = reflectVector(intercept.normal,dir)
         
-        viewDir = mt.subtract_arrays(viewPos,intercept.point)
-        viewDir = mt.normalizar_vector(viewDir)
+        viewDir = subtract(viewPos,intercept.point)
+        viewDir = normalize(viewDir)
         
-        specIntensity = max(0,mt.producto_punto(viewDir,reflect))**intercept.obj.material.spec
+        specIntensity = max(0,dot(viewDir,reflect))**intercept.obj.material.spec
         specIntensity *= intercept.obj.material.Ks
         specIntensity *= self.intensity
         
@@ -162,6 +185,29 @@ class PointLight(Light):
         
         specIntensity = max(0,min(1,specIntensity))
         
-        specColor = [(i*specIntensity) for i in self.color]
+        specColor = multiply(self.color,specIntensity)
         
-        return specColor
\ No newline at end of file
+        return specColor
+    
+    def getDirections(self,points):
+        dirs = np.asarray(self.point,dtype=float)-points
+        R = np.sqrt(dot_many(dirs,dirs))
+        return dirs/R[:,None], R
+    
+    def getDiffuseColors(self,points,normals,Ks):
+        dirs, R = self.getDirections(points)
+        intensity = dot_many(normals,dirs)*self.intensity*(1-Ks)
+        intensity = np.clip(attenuate(intensity,R),0,1)
+        return intensity[:,None]*np.asarray(self.color,dtype=float)
+    
+    def getSpecularColors(self,points,normals,viewDirs,spec,Ks):
+        dirs, R = self.getDirections(points)
+        reflect = reflectVectors(normals,dirs)
+        specIntensity = np.maximum(0,dot_many(viewDirs,reflect))**spec*Ks*self.intensity
+        specIntensity = np.clip(attenuate(specIntensity,R),0,1)
+        return specIntensity[:,None]*np.asarray(self.color,dtype=float)
+
+def attenuate(intensity,R):
+    #intensity / R**2, salvo donde R es 0 (como en las versiones por Intercept)
+    near = R != 0
+    return np.where(near,intensity/np.where(near,R**2,1),intensity)
@@ -1,3 +1,5 @@
+from textures import Texture
+
 OPAQUE = 0
 REFLECTIVE = 1
 TRANSPARENT = 2
@@ -9,4 +11,7 @@ class Material(object):
         self.Ks =Ks
         self.ior = ior
         self.matType = matType
-        self.texture = texture
\ No newline at end of file
+        # Las Surfaces de pygame se convierten una sola vez a arreglos
+        if texture is not None and not isinstance(texture, Texture):
+            texture = Texture(texture)
+        self.texture = texture
@@ -0,0 +1,271 @@
+"""Mallas de triangulos cargadas desde archivos Wavefront OBJ.
+
+Una Mesh guarda los vertices y los indices de sus caras en arreglos de NumPy
+y calcula una sola vez el vertice base, las aristas y la normal de cada
+triangulo. Tiene su propia BVH sobre los triangulos, asi que en la escena
+ocupa una sola entrada sin importar cuantas caras tenga:
+
+    oso = load_obj("oso.obj", material=piel, position=(0, -1, -4), scale=0.5)
+    raytracer.scene.append(oso)
+"""
+import numpy as np
+
+from figures import Shape, Intercept
+from bvh import slab_enter, inverse_direction, BOUNDS_EPSILON
+
+INF = float("inf")
+EPSILON = 1e-8
+
+
+def load_obj(filename, material, position=(0, 0, 0), scale=1):
+    """ Lee vertices (v), coordenadas de textura (vt), normales (vn) y caras (f) de un OBJ.
+
+    Los poligonos de mas de tres vertices se dividen en abanico. Los vertices
+    se escalan por scale y se desplazan a position.
+    """
+    vertices = []
+    texcoords = []
+    normals = []
+    faces = []
+    faceTexcoords = []
+    faceNormals = []
+
+    def index(value, count):
+        # Los indices de OBJ empiezan en 1; los negativos cuentan desde el final
+        i = int(value)
+        return i - 1 if i > 0 else count + i
+
+    with open(filename) as file:
+        for line in file:
+            parts = line.split()
+            if not parts:
+                continue
+
+            if parts[0] == "v":
+                vertices.append([float(c) for c in parts[1:4]])
+            elif parts[0] == "vt":
+                # En el OBJ v crece hacia arriba; en las texturas crece hacia abajo
+                u, v = float(parts[1]), float(parts[2]) if len(parts) > 2 else 0.0
+                texcoords.append([u, 1 - v])
+            elif parts[0] == "vn":
+                normals.append([float(c) for c in parts[1:4]])
+            elif parts[0] == "f":
+                corners = [(corner + "//").split("/")[:3] for corner in parts[1:]]
+                for i in range(1, len(corners) - 1):
+                    triangle = (corners[0], corners[i], corners[i + 1])
+                    faces.append([index(c[0], len(vertices)) for c in triangle])
+                    if all(c[1] for c in triangle):
+                        faceTexcoords.append([index(c[1], len(texcoords)) for c in triangle])
+                    if all(c[2] for c in triangle):
+                        faceNormals.append([index(c[2], len(normals)) for c in triangle])
+
+    vertices = np.array(vertices, dtype=float).reshape(-1, 3) * scale + np.asarray(position, dtype=float)
+
+    # Solo se usan texcoords/normales si todas las caras las traen
+    hasTexcoords = faceTexcoords and len(faceTexcoords) == len(faces)
+    hasNormals = faceNormals and len(faceNormals) == len(faces)
+
+    return Mesh(vertices, faces, material,
+                texcoords=texcoords if hasTexcoords else None,
+                faceTexcoords=faceTexcoords if hasTexcoords else None,
+                normals=normals if hasNormals else None,
+                faceNormals=faceNormals if hasNormals else None)
+
+
+class Mesh(Shape):
+    def __init__(self, vertices, faces, material, texcoords=None, faceTexcoords=None,
+                 normals=None, faceNormals=None, leafSize=8):
+        self.vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+        self.faces = np.asarray(faces, dtype=np.int32).reshape(-1, 3)
+        super().__init__(self.vertices.mean(axis=0).tolist(), material)
+
+        # Datos por vertice de cada cara (opcionales), ya indexados
+        self.texcoords = None
+        if texcoords is not None:
+            self.texcoords = np.asarray(texcoords, dtype=float)[np.asarray(faceTexcoords)]
+        self.normals = None
+        if normals is not None:
+            self.normals = np.asarray(normals, dtype=float)[np.asarray(faceNormals)]
+
+        corners = self.vertices[self.faces]
+        self.leafSize = leafSize
+        self.build(corners)
+
+        # Datos precalculados por triangulo, en el orden de las hojas de la BVH
+        order = self.order
+        corners = corners[order]
+        # Contiguos para que un snapshot los pueda guardar fuera de banda
+        self.v0 = np.ascontiguousarray(corners[:, 0])
+        self.edge1 = corners[:, 1] - corners[:, 0]
+        self.edge2 = corners[:, 2] - corners[:, 0]
+        faceNormal = np.cross(self.edge1, self.edge2)
+        length = np.linalg.norm(faceNormal, axis=1)
+        # Los triangulos degenerados nunca reportan hit; solo se evita dividir entre cero
+        self.faceNormal = faceNormal / np.where(length > 0, length, 1)[:, None]
+        if self.texcoords is not None:
+            self.texcoords = self.texcoords[order]
+        if self.normals is not None:
+            self.normals = self.normals[order]
+
+    def build(self, corners):
+        # BVH sobre los centroides de los triangulos, partiendo por la mediana.
+        # Los triangulos de cada hoja quedan contiguos en self.order.
+        triMin = corners.min(axis=1)
+        triMax = corners.max(axis=1)
+        centroids = corners.mean(axis=1)
+
+        order = np.arange(len(corners))
+        # Cada nodo: [minX, minY, minZ, maxX, maxY, maxZ, left, right, start, end]
+        nodes = [None]
+        stack = [(0, 0, len(corners))]
+        while stack:
+            index, start, end = stack.pop()
+            ids = order[start:end]
+            boundsMin = (triMin[ids].min(axis=0) - BOUNDS_EPSILON).tolist()
+            boundsMax = (triMax[ids].max(axis=0) + BOUNDS_EPSILON).tolist()
+
+            if end - start <= self.leafSize:
+                nodes[index] = (*boundsMin, *boundsMax, -1, -1, start, end)
+                continue
+
+            c = centroids[ids]
+            axis = int((c.max(axis=0) - c.min(axis=0)).argmax())
+            mid = (end - start) // 2
+            order[start:end] = ids[np.argpartition(c[:, axis], mid)]
+
+            left = len(nodes)
+            nodes.extend((None, None))
+            nodes[index] = (*boundsMin, *boundsMax, left, left + 1, start, end)
+            stack.append((left, start, start + mid))
+            stack.append((left + 1, start + mid, end))
+
+        self.nodes = nodes
+        self.order = order
+
+    def bounds(self):
+        root = self.nodes[0]
+        return (list(root[0:3]), list(root[3:6]))
+
+    def leaf_hits(self, start, end, orig, dir):
+        # Moller-Trumbore sobre todos los triangulos de una hoja a la vez.
+        # Devuelve (t, u, v) con t = inf donde no hay hit.
+        edge1 = self.edge1[start:end]
+        edge2 = self.edge2[start:end]
+        h = np.cross(dir, edge2)
+        a = (edge1 * h).sum(axis=1)
+        parallel = np.abs(a) < EPSILON
+        f = 1.0 / np.where(parallel, 1, a)
+
+        s = orig - self.v0[start:end]
+        u = f * (s * h).sum(axis=1)
+        q = np.cross(s, edge1)
+        v = f * (q @ dir)
+        t = f * (edge2 * q).sum(axis=1)
+
+        hit = ~parallel & (u >= 0) & (u <= 1) & (v >= 0) & (u + v <= 1) & (t > EPSILON)
+        return np.where(hit, t, INF), u, v
+
+    def nearest(self, orig, dir):
+        """ (t, triangulo, u, v) del hit mas cercano, o None. """
+        nodes = self.nodes
+        inv = inverse_direction(dir)
+        origArray = np.asarray(orig, dtype=float)
+        dirArray = np.asarray(dir, dtype=float)
+
+        best = None
+        depth = INF
+        stack = [0]
+        while stack:
+            node = nodes[stack.pop()]
+            enter = slab_enter(node, orig, inv)
+            if enter is None or enter >= depth:
+                continue
+
+            if node[6] < 0:
+                start, end = node[8], node[9]
+                t, u, v = self.leaf_hits(start, end, origArray, dirArray)
+                i = int(t.argmin())
+                if t[i] < depth:
+                    depth = float(t[i])
+                    best = (depth, start + i, float(u[i]), float(v[i]))
+            else:
+                left = nodes[node[6]]
+                right = nodes[node[7]]
+                # Visitar primero el hijo cuya caja empieza mas cerca
+                leftEnter = slab_enter(left, orig, inv)
+                rightEnter = slab_enter(right, orig, inv)
+                if leftEnter is None or (rightEnter is not None and rightEnter < leftEnter):
+                    stack.append(node[6])
+                    stack.append(node[7])
+                else:
+                    stack.append(node[7])
+                    stack.append(node[6])
+
+        return best
+
+    def ray_distance(self, orig, dir):
+        hit = self.nearest(orig, dir)
+        # surface casi siempre se pide justo despues para el mismo rayo
+        self.lastHit = (orig, dir, hit)
+        return None if hit is None else hit[0]
+
+    def surface(self, orig, dir, t):
+        lastHit = getattr(self, "lastHit", None)
+        if lastHit is not None and lastHit[0] is orig and lastHit[1] is dir:
+            hit = lastHit[2]
+        else:
+            hit = self.nearest(orig, dir)
+        return self.hit_intercept(orig, dir, hit)
+
+    def ray_hits(self, orig, dir, maxDist):
+        nodes = self.nodes
+        inv = inverse_direction(dir)
+        origArray = np.asarray(orig, dtype=float)
+        dirArray = np.asarray(dir, dtype=float)
+
+        stack = [0]
+        while stack:
+            node = nodes[stack.pop()]
+            enter = slab_enter(node, orig, inv)
+            if enter is None or enter >= maxDist:
+                continue
+
+            if node[6] < 0:
+                t, _, _ = self.leaf_hits(node[8], node[9], origArray, dirArray)
+                if (t < maxDist).any():
+                    return True
+            else:
+                stack.append(node[7])
+                stack.append(node[6])
+        return False
+
+    def ray_intersect(self, orig, dir):
+        return self.hit_intercept(orig, dir, self.nearest(orig, dir))
+
+    def hit_intercept(self, orig, dir, hit):
+        # Intercept de un resultado de nearest
+        if hit is None:
+            return None
+
+        t, i, u, v = hit
+        w = 1 - u - v
+        point = [orig[k] + dir[k] * t for k in range(3)]
+
+        # Normal interpolada si el OBJ trae normales, si no la de la cara
+        if self.normals is not None:
+            n = self.normals[i]
+            normal = w * n[0] + u * n[1] + v * n[2]
+            normal = (normal / np.linalg.norm(normal)).tolist()
+        else:
+            normal = self.faceNormal[i].tolist()
+
+        texcoords = None
+        if self.texcoords is not None:
+            uv = self.texcoords[i]
+            texcoords = tuple((w * uv[0] + u * uv[1] + v * uv[2]).tolist())
+
+        return Intercept(distance=t,
+                         point=point,
+                         normal=normal,
+                         texcoords=texcoords,
+                         obj=self)
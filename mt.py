@@ -1,3 +1,20 @@
+"""Operaciones con matrices y vectores sobre listas.
+
+Las matrices de 3 x 3 y 4 x 4 (las de las transformaciones de la escena)
+tienen caminos desenrollados para multiplicar, invertir, transponer y
+transformar puntos y vectores. Los demas tamanos usan eliminacion gaussiana
+(descomposicion LU con pivoteo parcial) para el determinante y la inversa.
+transformar_puntos y transformar_vectores aplican una matriz a un arreglo
+N x 3 de NumPy de una sola vez.
+"""
+from operator import mul
+
+import numpy as np
+
+# Un pivote menor que esto (relativo al mayor elemento) cuenta como cero
+SINGULAR_TOLERANCE = 1e-12
+
+
 def multiplicar_matrices(matriz1, matriz2):
     filas_matriz1 = len(matriz1)
     columnas_matriz1 = len(matriz1[0])
@@ -9,16 +26,27 @@ def multiplicar_matrices(matriz1, matriz2):
         print("No se pueden multiplicar las matrices.")
         return None
 
- 
-    matriz_resultado = [[0 for y in range(columnas_matriz2)] for x in range(filas_matriz1)]
+    if filas_matriz1 == columnas_matriz1 == columnas_matriz2:
+        if filas_matriz1 == 4:
+            return multiplicar_4x4(matriz1, matriz2)
+        if filas_matriz1 == 3:
+            return multiplicar_3x3(matriz1, matriz2)
 
+    columnas = list(zip(*matriz2))
+    return [[sum(map(mul, fila, columna)) for columna in columnas] for fila in matriz1]
 
-    for i in range(filas_matriz1):
-        for j in range(columnas_matriz2):
-            for k in range(columnas_matriz1):
-                matriz_resultado[i][j] += matriz1[i][k] * matriz2[k][j]
+def multiplicar_3x3(a, b):
+    (b00, b01, b02), (b10, b11, b12), (b20, b21, b22) = b
+    return [[a0 * b00 + a1 * b10 + a2 * b20,
+             a0 * b01 + a1 * b11 + a2 * b21,
+             a0 * b02 + a1 * b12 + a2 * b22] for a0, a1, a2 in a]
 
-    return matriz_resultado
+def multiplicar_4x4(a, b):
+    (b00, b01, b02, b03), (b10, b11, b12, b13), (b20, b21, b22, b23), (b30, b31, b32, b33) = b
+    return [[a0 * b00 + a1 * b10 + a2 * b20 + a3 * b30,
+             a0 * b01 + a1 * b11 + a2 * b21 + a3 * b31,
+             a0 * b02 + a1 * b12 + a2 * b22 + a3 * b32,
+             a0 * b03 + a1 * b13 + a2 * b23 + a3 * b33] for a0, a1, a2, a3 in a]
 
 def multiplicar_matriz_vector(matriz,vector):
     filas_matriz = len(matriz)
@@ -30,18 +58,58 @@ def multiplicar_matriz_vector(matriz,vector):
         print("No se puede multiplicar la matriz por el vector.")
         return None
 
-
-    vector_resultado = [0 for x in range(filas_matriz)]
-
- 
-    for i in range(filas_matriz):
-        for k in range(columnas_matriz):
-            vector_resultado[i] += matriz[i][k] * vector[k]
-
-    return vector_resultado
+    if columnas_matriz == 3:
+        x, y, z = vector
+        return [fila[0] * x + fila[1] * y + fila[2] * z for fila in matriz]
+    if columnas_matriz == 4:
+        x, y, z, w = vector
+        return [fila[0] * x + fila[1] * y + fila[2] * z + fila[3] * w for fila in matriz]
+
+    return [sum(map(mul, fila, vector)) for fila in matriz]
+
+def transformar_punto(matriz, punto):
+    # Punto de 3 componentes por una matriz de 3 x 3 o una afin de 4 x 4 (w = 1)
+    m0, m1, m2 = matriz[0], matriz[1], matriz[2]
+    x, y, z = punto
+    if len(m0) == 4:
+        return [m0[0] * x + m0[1] * y + m0[2] * z + m0[3],
+                m1[0] * x + m1[1] * y + m1[2] * z + m1[3],
+                m2[0] * x + m2[1] * y + m2[2] * z + m2[3]]
+    return [m0[0] * x + m0[1] * y + m0[2] * z,
+            m1[0] * x + m1[1] * y + m1[2] * z,
+            m2[0] * x + m2[1] * y + m2[2] * z]
+
+def transformar_vector(matriz, vector):
+    # Direccion de 3 componentes: solo la parte de 3 x 3, sin traslacion (w = 0)
+    m0, m1, m2 = matriz[0], matriz[1], matriz[2]
+    x, y, z = vector
+    return [m0[0] * x + m0[1] * y + m0[2] * z,
+            m1[0] * x + m1[1] * y + m1[2] * z,
+            m2[0] * x + m2[1] * y + m2[2] * z]
+
+def transformar_vectores(matriz, vectores):
+    # transformar_vector para cada fila de un arreglo N x 3
+    m = np.asarray(matriz, dtype=float)
+    vectores = np.asarray(vectores, dtype=float).reshape(-1, 3)
+    x, y, z = vectores[:, 0], vectores[:, 1], vectores[:, 2]
+    return np.stack([m[i, 0] * x + m[i, 1] * y + m[i, 2] * z for i in range(3)], axis=1)
+
+def transformar_puntos(matriz, puntos):
+    # transformar_punto para cada fila de un arreglo N x 3
+    m = np.asarray(matriz, dtype=float)
+    resultado = transformar_vectores(m, puntos)
+    if m.shape[1] == 4:
+        resultado += m[:3, 3]
+    return resultado
 
 def matriz_transpuesta(matriz):
-    return [[matriz[j][i] for j in range(len(matriz))] for i in range(len(matriz[0]))]
+    if len(matriz) == len(matriz[0]) == 3:
+        (a, b, c), (d, e, f), (g, h, i) = matriz
+        return [[a, d, g], [b, e, h], [c, f, i]]
+    if len(matriz) == len(matriz[0]) == 4:
+        (a, b, c, d), (e, f, g, h), (i, j, k, l), (m, n, o, p) = matriz
+        return [[a, e, i, m], [b, f, j, n], [c, g, k, o], [d, h, l, p]]
+    return [list(columna) for columna in zip(*matriz)]
 
 def matriz_adjunta(matriz):
     adjunta = []
@@ -54,22 +122,129 @@ def matriz_adjunta(matriz):
         adjunta.append(fila_adjunta)
     return matriz_transpuesta(adjunta)
 
+def descomposicion_lu(matriz):
+    # Eliminacion gaussiana con pivoteo parcial. Devuelve (lu, permutacion,
+    # signo): U sobre la diagonal de lu y L (con unos en la diagonal) debajo,
+    # las filas de la matriz en el orden de permutacion y el signo de esa
+    # permutacion. None si la matriz es singular.
+    n = len(matriz)
+    lu = [[float(x) for x in fila] for fila in matriz]
+    permutacion = list(range(n))
+    signo = 1
+    tolerancia = SINGULAR_TOLERANCE * max([abs(x) for fila in lu for x in fila] or [0])
+
+    for k in range(n):
+        p = max(range(k, n), key=lambda i: abs(lu[i][k]))
+        if abs(lu[p][k]) <= tolerancia:
+            return None
+        if p != k:
+            lu[k], lu[p] = lu[p], lu[k]
+            permutacion[k], permutacion[p] = permutacion[p], permutacion[k]
+            signo = -signo
+
+        pivote = lu[k]
+        for fila in lu[k + 1:]:
+            factor = fila[k] / pivote[k]
+            fila[k] = factor
+            for j in range(k + 1, n):
+                fila[j] -= factor * pivote[j]
+    return lu, permutacion, signo
+
+def resolver_lu(descomposicion, b):
+    # x tal que matriz * x = b, con la descomposicion de descomposicion_lu
+    lu, permutacion, _ = descomposicion
+    n = len(lu)
+    x = [b[i] for i in permutacion]
+    for i in range(n):
+        fila = lu[i]
+        x[i] -= sum(fila[j] * x[j] for j in range(i))
+    for i in reversed(range(n)):
+        fila = lu[i]
+        x[i] = (x[i] - sum(fila[j] * x[j] for j in range(i + 1, n))) / fila[i]
+    return x
+
 def determinante(matriz):
-    if len(matriz) == 2:
+    n = len(matriz)
+    if n == 2:
         return matriz[0][0] * matriz[1][1] - matriz[0][1] * matriz[1][0]
-    det = 0
-    for i in range(len(matriz)):
-        submatriz = [fila[1:] for fila in matriz[:i] + matriz[i+1:]]
-        det += ((-1)**i) * matriz[i][0] * determinante(submatriz)
+    if n == 3:
+        (a, b, c), (d, e, f), (g, h, i) = matriz
+        return a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+    if n == 4:
+        return determinante_4x4(matriz)
+    if n == 1:
+        return matriz[0][0]
+
+    descomposicion = descomposicion_lu(matriz)
+    if descomposicion is None:
+        return 0.0
+    lu, _, det = descomposicion
+    for k in range(n):
+        det *= lu[k][k]
     return det
 
+def menores_4x4(matriz):
+    # Determinantes de 2 x 2 de las dos filas de arriba (s) y las dos de abajo (c)
+    (a00, a01, a02, a03), (a10, a11, a12, a13), (a20, a21, a22, a23), (a30, a31, a32, a33) = matriz
+    s = (a00 * a11 - a10 * a01, a00 * a12 - a10 * a02, a00 * a13 - a10 * a03,
+         a01 * a12 - a11 * a02, a01 * a13 - a11 * a03, a02 * a13 - a12 * a03)
+    c = (a20 * a31 - a30 * a21, a20 * a32 - a30 * a22, a20 * a33 - a30 * a23,
+         a21 * a32 - a31 * a22, a21 * a33 - a31 * a23, a22 * a33 - a32 * a23)
+    return s, c
+
+def determinante_4x4(matriz):
+    s, c = menores_4x4(matriz)
+    return s[0] * c[5] - s[1] * c[4] + s[2] * c[3] + s[3] * c[2] - s[4] * c[1] + s[5] * c[0]
+
 def matriz_inversa(matriz):
-    det = determinante(matriz)
+    n = len(matriz)
+    if n == 3:
+        return inversa_3x3(matriz)
+    if n == 4:
+        return inversa_4x4(matriz)
+
+    descomposicion = descomposicion_lu(matriz)
+    if descomposicion is None:
+        raise ValueError("La matriz no tiene inversa.")
+    columnas = [resolver_lu(descomposicion, [1.0 if i == j else 0.0 for i in range(n)]) for j in range(n)]
+    return matriz_transpuesta(columnas)
+
+def inversa_3x3(matriz):
+    (a, b, c), (d, e, f), (g, h, i) = matriz
+    c00 = e * i - f * h
+    c01 = f * g - d * i
+    c02 = d * h - e * g
+    det = a * c00 + b * c01 + c * c02
+    if det == 0:
+        raise ValueError("La matriz no tiene inversa.")
+    inv = 1.0 / det
+    return [[c00 * inv, (c * h - b * i) * inv, (b * f - c * e) * inv],
+            [c01 * inv, (a * i - c * g) * inv, (c * d - a * f) * inv],
+            [c02 * inv, (b * g - a * h) * inv, (a * e - b * d) * inv]]
+
+def inversa_4x4(matriz):
+    (a00, a01, a02, a03), (a10, a11, a12, a13), (a20, a21, a22, a23), (a30, a31, a32, a33) = matriz
+    s, c = menores_4x4(matriz)
+    det = s[0] * c[5] - s[1] * c[4] + s[2] * c[3] + s[3] * c[2] - s[4] * c[1] + s[5] * c[0]
     if det == 0:
         raise ValueError("La matriz no tiene inversa.")
-    adjunta = matriz_adjunta(matriz)
-    inversa = [[adjunta[i][j] / det for j in range(len(adjunta))] for i in range(len(adjunta))]
-    return inversa
+    inv = 1.0 / det
+    return [[( a11 * c[5] - a12 * c[4] + a13 * c[3]) * inv,
+             (-a01 * c[5] + a02 * c[4] - a03 * c[3]) * inv,
+             ( a31 * s[5] - a32 * s[4] + a33 * s[3]) * inv,
+             (-a21 * s[5] + a22 * s[4] - a23 * s[3]) * inv],
+            [(-a10 * c[5] + a12 * c[2] - a13 * c[1]) * inv,
+             ( a00 * c[5] - a02 * c[2] + a03 * c[1]) * inv,
+             (-a30 * s[5] + a32 * s[2] - a33 * s[1]) * inv,
+             ( a20 * s[5] - a22 * s[2] + a23 * s[1]) * inv],
+            [( a10 * c[4] - a11 * c[2] + a13 * c[0]) * inv,
+             (-a00 * c[4] + a01 * c[2] - a03 * c[0]) * inv,
+             ( a30 * s[4] - a31 * s[2] + a33 * s[0]) * inv,
+             (-a20 * s[4] + a21 * s[2] - a23 * s[0]) * inv],
+            [(-a10 * c[3] + a11 * c[1] - a12 * c[0]) * inv,
+             ( a00 * c[3] - a01 * c[1] + a02 * c[0]) * inv,
+             (-a30 * s[3] + a31 * s[1] - a32 * s[0]) * inv,
+             ( a20 * s[3] - a21 * s[1] + a22 * s[0]) * inv]]
 
 
 def producto_cruz(vector1, vector2):
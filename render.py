@@ -0,0 +1,149 @@
+"""Render por lotes sin ventana.
+
+Renderiza la escena a una superficie fuera de pantalla y la guarda como
+imagen, sin abrir nunca una ventana de pygame:
+
+    python render.py -o osito.png --width 750 --height 325
+    python render.py -o osito.ppm --seed 0
+    python render.py -o osito.png --workers 0 --tile 32
+    python render.py -o osito.png --scene scenes/osito.json
+    python render.py -o osito.png --aa 16
+    python render.py -o osito.png --deferred
+    python render.py -o osito.png --fresnel --max-depth 8 --min-throughput 0.05
+"""
+import argparse
+import os
+import random
+import time
+
+import pygame
+
+from rt import RayTracer
+from stats import RenderStats
+from scenefile import load_scene
+from snapshot import load_scene_cached
+import RayTracer as escena
+
+
+def save_ppm(surface, path):
+    """ Guarda una superficie como PPM binario (P6). """
+    width, height = surface.get_size()
+    data = pygame.image.tostring(surface, "RGB")
+    with open(path, "wb") as f:
+        f.write(b"P6\n%d %d\n255\n" % (width, height))
+        f.write(data)
+
+
+def save_image(surface, path):
+    """ Guarda la superficie segun la extension del archivo (.ppm o lo que soporte pygame). """
+    if os.path.splitext(path)[1].lower() == ".ppm":
+        save_ppm(surface, path)
+    else:
+        pygame.image.save(surface, path)
+
+
+def render(width, height, seed=None, workers=1, tileSize=32, accel="bvh", packets=False, textureFilter=None,
+           stats=None, scene=None, snapshot=False, aa=0, aaThreshold=0.1, deferred=False,
+           fresnel=False, maxDepth=None, minThroughput=0.0, roulette=False):
+    """ Construye la escena sobre una superficie fuera de pantalla y la renderiza.
+
+    Con workers distinto de 1 se renderiza por tiles en un pool de procesos
+    (workers=0 usa todos los nucleos). accel elige la estructura de
+    aceleracion: "bvh", "compiled" o None. Con packets los rayos primarios
+    de cada tile se trazan juntos como un paquete de NumPy. textureFilter es
+    "nearest", "bilinear" o "trilinear" (None deja el de la escena). stats (un stats.RenderStats) se
+    llena con los contadores del render serial por pixeles (no con packets
+    ni deferred). scene es la ruta de un
+    archivo de escena JSON (ver scenefile); sin scene se usa la del osito.
+    Con snapshot la escena se carga desde su snapshot preparado (ver
+    snapshot.py), que se rehace solo si la escena cambio. Con aa > 0 se
+    usa el antialiasing adaptivo con hasta aa muestras por pixel. Con
+    deferred se sombrea todo el G-buffer junto (ver deferred.py). fresnel,
+    maxDepth, minThroughput y roulette controlan los rayos secundarios (ver
+    RayTracer.__init__); maxDepth None deja MAX_RECURSION_DEPTH.
+    """
+    if seed is not None:
+        random.seed(seed)
+
+    surface = pygame.Surface((width, height))
+    if scene is not None and snapshot:
+        raytracer = load_scene_cached(scene, screen=surface, accelType=accel)
+    elif scene is not None:
+        raytracer = load_scene(scene, surface)
+    else:
+        raytracer = RayTracer(surface)
+        escena.build_scene(raytracer)
+    raytracer.accelType = accel
+    if textureFilter is not None:
+        raytracer.textureFilter = textureFilter
+    raytracer.stats = stats
+    raytracer.fresnel = fresnel
+    if maxDepth is not None:
+        raytracer.maxDepth = maxDepth
+    raytracer.minThroughput = minThroughput
+    raytracer.russianRoulette = roulette
+
+    raytracer.rtClear()
+    if deferred:
+        raytracer.rtRenderDeferred()
+    elif aa:
+        raytracer.rtRenderAdaptive(threshold=aaThreshold, maxSamples=aa, seed=seed or 0)
+    elif workers != 1:
+        raytracer.rtRenderParallel(workers=workers or None, tileSize=tileSize, packets=packets)
+    elif packets:
+        raytracer.rtRenderPackets(packetSize=tileSize)
+    else:
+        raytracer.rtRender()
+    return surface
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renderiza la escena a un archivo sin abrir ventana.")
+    parser.add_argument("-o", "--output", default="render.png", help="archivo de salida (.png, .ppm, .bmp, .jpg, .tga)")
+    parser.add_argument("--width", type=int, default=escena.width)
+    parser.add_argument("--height", type=int, default=escena.height)
+    parser.add_argument("--seed", type=int, default=None, help="semilla para el orden aleatorio de pixeles")
+    parser.add_argument("--workers", type=int, default=1, help="procesos para el render por tiles (0 = todos los nucleos)")
+    parser.add_argument("--tile", type=int, default=32, help="tamano de tile en pixeles (render paralelo o por paquetes)")
+    parser.add_argument("--accel", choices=["bvh", "compiled", "none"], default="bvh",
+                        help="estructura de aceleracion: BVH, escena compilada en arreglos por tipo, o recorrido lineal")
+    parser.add_argument("--packets", action="store_true",
+                        help="trazar los rayos primarios por bloques de --tile x --tile pixeles")
+    parser.add_argument("--filter", choices=["nearest", "bilinear", "trilinear"], default=None,
+                        help="filtrado de texturas (trilinear usa mipmaps); por defecto nearest o el de la escena")
+    parser.add_argument("--stats", action="store_true",
+                        help="contar rayos, intersecciones y tiempos por etapa (solo el render serial por pixeles, sin --packets ni --deferred)")
+    parser.add_argument("--scene", help="archivo de escena JSON (por defecto la escena de RayTracer.py)")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="con --scene, cargar la escena preparada desde un snapshot junto al archivo")
+    parser.add_argument("--aa", type=int, default=0,
+                        help="antialiasing adaptivo con hasta N muestras por pixel (0 = un rayo por pixel, con menos de 4 no se refina)")
+    parser.add_argument("--aa-threshold", type=float, default=0.1,
+                        help="diferencia de color (0 a 1) con un vecino a partir de la cual se refina un pixel")
+    parser.add_argument("--deferred", action="store_true",
+                        help="hits primarios en un G-buffer y sombreado de todos los pixeles con arreglos de NumPy")
+    parser.add_argument("--fresnel", action="store_true",
+                        help="pesar reflejo y refraccion de los materiales transparentes con Fresnel (Kr, Kt)")
+    parser.add_argument("--max-depth", type=int, default=None, help="profundidad maxima de rebotes (por defecto 3)")
+    parser.add_argument("--min-throughput", type=float, default=0.0,
+                        help="no trazar rayos secundarios que aporten menos que esto al pixel")
+    parser.add_argument("--roulette", action="store_true",
+                        help="cortar al azar las ramas secundarias debiles (ruleta rusa) desde el segundo rebote")
+    args = parser.parse_args(argv)
+
+    stats = RenderStats() if args.stats else None
+
+    start = time.perf_counter()
+    surface = render(args.width, args.height, args.seed, args.workers, args.tile,
+                     None if args.accel == "none" else args.accel, args.packets, args.filter, stats, args.scene, args.snapshot,
+                     args.aa, args.aa_threshold, args.deferred,
+                     args.fresnel, args.max_depth, args.min_throughput, args.roulette)
+    save_image(surface, args.output)
+
+    print("Render Time:", round(time.perf_counter() - start, 3), "secs ->", args.output)
+    if stats is not None and args.workers == 1 and not args.packets and not args.deferred:
+        print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,26 @@
-from math import tan,pi,atan2,acos,sqrt
-import mt
-#import numpy as np
+from math import tan,pi,isqrt
+import numpy as np
 import pygame
 import random
+import time
+import copyreg
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from materials import *
+from figures import Intercept
+from vec3 import add, subtract, multiply, divide, negate, dot, magnitude, normalize, normalize_many
+from bvh import BVH
+from compiled import CompiledScene
+from textures import EnvironmentMap
+from deferred import build_gbuffer, shade_gbuffer
+from shading import compile_lighting, compile_shading
 from lights import reflectVector, refractVector, totalInternalReflection, fresnel
 
 MAX_RECURSION_DEPTH = 3
 
-def dot(v1, v2):
-    return sum(a*b for a, b in zip(v1, v2))
-def add_arrays(v1, v2):
-    return [a+b for a, b in zip(v1, v2)]
-
-def subtract_arrays(v1, v2):
-    return [a-b for a, b in zip(v1, v2)]
-
-def multiply_arrays(v1, v2):
-    return [a*b for a, b in zip(v1, v2)]
-
-def deny_array(v):
-    return [-i for i in v]
-
-def normalizar_vector(v):
-    magnitude = sqrt(sum(i**2 for i in v))
-    return [i/magnitude for i in v]
+#Estructuras de aceleracion disponibles para rtCastRay y rtOccluded
+ACCELERATORS = {"bvh": BVH,
+                "compiled": CompiledScene}
 
 class RayTracer(object):
     def __init__(self,screen):
@@ -44,8 +39,61 @@ class RayTracer(object):
         self.rtClearColor(0,0,0)
         self.rtClear()
         
+        #El envMap se convierte a EnvironmentMap al asignarlo (ver la propiedad)
         self.envMap = None
+        #Filtro del envMap ("nearest" o "bilinear") y si los rayos secundarios
+        #que escapan usan la copia difuminada (reflejos asperos)
+        self.envFilter = "nearest"
+        self.envBlurReflections = False
+        
+        #Estructura de aceleracion ("bvh", "compiled" o None para recorrer
+        #la escena linealmente), se construye en rtPrepare antes de renderizar
+        self.accelType = "bvh"
+        self.accel = None
+        self.accelFor = None
+        #True si la estructura viene de un snapshot y ningun render la uso
+        self.accelLoaded = False
+        
+        #Filtro de texturas: "nearest", "bilinear" o "trilinear" (con mipmaps)
+        self.textureFilter = "nearest"
+        self.objExtents = {}
+        
+        #Sombreado compilado para las luces y materiales actuales (ver
+        #shading.py); se arma en el primer hit despues de rtPrepare. Con
+        #compiledShading = False se usan las ramas de rtRayColor y el
+        #recorrido de luces de rtLighting.
+        self.compiledShading = True
+        self.lightingKernel = None
+        self.shadingKernel = None
+        
+        #Rayos secundarios. maxDepth: profundidad maxima de rebotes. Cada rama
+        #lleva un throughput (cuanto aporta al pixel): con fresnel los
+        #materiales TRANSPARENT reparten el peso entre reflejo y refraccion
+        #segun Kr y Kt; las ramas con throughput menor que minThroughput no
+        #se trazan y con russianRoulette, desde rouletteDepth, las ramas
+        #debiles se cortan al azar (las que siguen se pesan para compensar).
+        #Con los valores por defecto el resultado es el de siempre.
+        self.maxDepth = MAX_RECURSION_DEPTH
+        self.fresnel = False
+        self.minThroughput = 0.0
+        self.russianRoulette = False
+        self.rouletteDepth = 2
         
+        #Instrumentacion opcional (stats.RenderStats); el reporte de cada
+        #rtRender queda en statsReport
+        self.stats = None
+        self.statsReport = None
+        
+    @property
+    def envMap(self):
+        return self._envMap
+
+    @envMap.setter
+    def envMap(self,envMap):
+        if envMap is not None and not isinstance(envMap,EnvironmentMap):
+            envMap = EnvironmentMap(envMap)
+        self._envMap = envMap
+
     def rtViewport(self,posX,posY,width,height):
         self.vpX = posX
         self.vpY = posY
@@ -57,6 +105,8 @@ class RayTracer(object):
         self.nearPlane = n
         self.topEdge = tan((fov*pi/180)/2)*self.nearPlane
         self.rightEdge = self.topEdge*aspectRatio
+        #Angulo aproximado que cubre un pixel, para elegir el nivel de mipmap
+        self.pixelAngle = 2*self.topEdge/self.nearPlane/self.vpHeight
     
     def rtClearColor(self,r,g,b):
         #Recibe valores de 0 a 1
@@ -80,35 +130,140 @@ class RayTracer(object):
             else:
                 self.screen.set_at((x,y),self.currColor)
     
+    def rtPrepare(self,rebuild=None):
+        #Preprocesa la escena antes de renderizar. La estructura de aceleracion
+        #se reconstruye en cada render, porque una figura se puede mover o
+        #modificar sin que cambie la lista de figuras. Solo se reutiliza,
+        #mientras la lista y accelType no cambien, la recien cargada de un
+        #snapshot (accelLoaded, en el primer render) o con rebuild=False, para
+        #quien ya sabe que la geometria no cambio (incremental.py). Con
+        #rebuild=True se reconstruye siempre.
+        self.objExtents = {}
+        self.lightingKernel = None
+        self.shadingKernel = None
+        if rebuild is None:
+            rebuild = not self.accelLoaded
+        self.accelLoaded = False
+        
+        key = (self.accelType, tuple(self.scene))
+        if rebuild or key != self.accelFor:
+            if self.accelType:
+                self.accel = ACCELERATORS[self.accelType](self.scene)
+            else:
+                self.accel = None
+            self.accelFor = key
+
     def rtCastRay(self,orig,dir,sceneObj=None,recursion=0):
-        if recursion >= MAX_RECURSION_DEPTH:
+        if recursion >= self.maxDepth:
             return None
         
+        if self.accel:
+            return self.accel.ray_intersect(orig,dir,sceneObj)
+        
         depth = float('inf')
-        intercept=None
         hit = None
       
-
+        #Solo la distancia de cada figura; el Intercept completo se arma
+        #una vez para la mas cercana
         for obj in self.scene:
             if sceneObj != obj:
-                intercept = obj.ray_intersect(orig,dir)
-                if intercept!=None:
-                    if intercept.distance<depth:
-                        hit = intercept
-                        depth = intercept.distance
+                t = obj.ray_distance(orig,dir)
+                if t!=None:
+                    if t<depth:
+                        hit = obj
+                        depth = t
+        
+        if hit is None:
+            return None
+        return hit.surface(orig,dir,depth)
+
+    def rtOccluded(self,orig,dir,maxDist=float('inf'),ignore=None):
+        #Rayo de sombra: solo importa si algo lo bloquea antes de maxDist,
+        #asi que se detiene en el primer bloqueo y no calcula normales ni texcoords
+        if self.accel:
+            return self.accel.occluded(orig,dir,maxDist,ignore)
         
-        return hit
+        for obj in self.scene:
+            if obj is not ignore and obj.ray_hits(orig,dir,maxDist):
+                return True
+        return False
+
+    def rtFootprint(self,intercept):
+        #Tamano aproximado de un pixel sobre la figura, en unidades de uv:
+        #ancho del cono del pixel a esa distancia entre el tamano de la figura
+        obj = intercept.obj
+        extent = self.objExtents.get(id(obj))
+        if extent is None:
+            bounds = obj.bounds()
+            extent = max(bounds[1][i]-bounds[0][i] for i in range(3)) if bounds else 1
+            self.objExtents[id(obj)] = extent
+        return intercept.distance*self.pixelAngle/extent
 
-    def rtRayColor(self,intercept,rayDirection,recursion=0):
+    def rtLighting(self,intercept,diffuse=True):
+        #Color ambiental, difuso y especular de las luces en el punto, con
+        #rayos de sombra. Sin diffuse solo se calcula el especular.
+        if self.compiledShading:
+            if self.lightingKernel is None:
+                self.lightingKernel = compile_lighting(self)
+            return self.lightingKernel(intercept,diffuse)
+        
+        ambientColor = [0,0,0]
+        diffuseColor = [0,0,0]
+        specularColor = [0,0,0]
+        
+        for light in self.lights:
+            if light.lightType=="Ambient":
+                if diffuse:
+                    lightColor = light.getLightColor()
+                    ambientColor = [(ambientColor[i]+lightColor[i]) for i in range(3)]
+                continue
+            
+            lightDir = None
+            lightDistance = float('inf')
+            if light.lightType=="Directional":
+                lightDir = light.toLight
+            elif light.lightType=="Point":
+                lightDir = subtract(light.point,intercept.point)
+                lightDistance = magnitude(lightDir)
+                lightDir = divide(lightDir,lightDistance)
+                            
+            if not self.rtOccluded(intercept.point,lightDir,lightDistance,intercept.obj):
+                if diffuse:
+                    diffuseColor = [(diffuseColor[i]+light.getDiffuseColor(intercept)[i]) for i in range(3)]
+                specularColor = [(specularColor[i]+light.getSpecularColor(intercept,self.camPosition)[i]) for i in range(3)]
+        
+        return ambientColor, diffuseColor, specularColor
+
+    def rtReflect(self,intercept,rayDirection,orig,sceneObj,recursion,throughput=1.0):
+        #Color que llega por el rayo reflejado desde orig
+        reflect = reflectVector(intercept.normal,negate(rayDirection))
+        reflectIntercept = self.rtCastRay(orig,reflect,sceneObj,recursion+1)
+        return self.rtRayColor(reflectIntercept,reflect,recursion+1,throughput=throughput)
+
+    def rtRefract(self,intercept,rayDirection,orig,recursion,throughput=1.0):
+        #Color que llega por el rayo refractado desde orig
+        refract = refractVector(intercept.normal,rayDirection,1.0,intercept.obj.material.ior)
+        refractIntercept = self.rtCastRay(orig,refract,None,recursion+1)
+        return self.rtRayColor(refractIntercept,refract,recursion+1,throughput=throughput)
+
+    def rtBranchWeight(self,throughput,recursion):
+        #Factor por el que se multiplica una rama secundaria con ese throughput,
+        #o 0 si no se traza (ver minThroughput y russianRoulette)
+        if throughput < self.minThroughput:
+            return 0
+        if self.russianRoulette and recursion+1 >= self.rouletteDepth and throughput < 1:
+            survive = max(throughput,0.05)
+            if random.random() >= survive:
+                return 0
+            return 1/survive
+        return 1
+
+    def rtRayColor(self,intercept,rayDirection,recursion=0,throughput=1.0):
+        #throughput: peso de este rayo en el color del pixel
         
         if intercept == None:
             if self.envMap:
-                x = (atan2(rayDirection[2],rayDirection[0])/(2*pi)+0.5)*self.envMap.get_width()
-                y = acos(rayDirection[1])/pi*self.envMap.get_height()
-                
-                envcolor = self.envMap.get_at((int(x),int(y)))
-                
-                return [i/255 for i in envcolor]
+                return self.envMap.lookup(rayDirection,self.envFilter,recursion>0 and self.envBlurReflections)
             else:
                 return None
         
@@ -120,119 +275,452 @@ class RayTracer(object):
         surfaceColor = material.diffuse
         
         if material.texture and intercept.texcoords:
-            tX= intercept.texcoords[0] * material.texture.get_width()
-            tY = intercept.texcoords[1] * material.texture.get_height()
-            texcolor = material.texture.get_at((int(tX),int(tY)))
-            texcolor = [i/255 for i in texcolor]
+            lod = 0
+            if self.textureFilter == "trilinear":
+                lod = material.texture.lod(self.rtFootprint(intercept))
+            texcolor = material.texture.sample(intercept.texcoords[0],intercept.texcoords[1],self.textureFilter,lod)
             surfaceColor = [surfaceColor[i]*texcolor[i] for i in range(3)]
 
-        reflectColor = [0,0,0]
-        refractColor = [0,0,0]
-        ambientColor = [0,0,0]
-        diffuseColor = [0,0,0]
-        specularColor = [0,0,0]
-        finalColor = [0,0,0]
+        shade = None
+        if self.compiledShading:
+            if self.shadingKernel is None:
+                self.shadingKernel = compile_shading(self)
+            shade = self.shadingKernel(material)
         
-        if material.matType == OPAQUE:  
-            for light in self.lights:
-                if light.lightType=="Ambient":
-                    ambientColor = [(ambientColor[i]+light.getLightColor()[i]) for i in range(3)]
-                                
-                else:
-                    lightDir = None
-                    if light.lightType=="Directional":
-                        lightDir = [(i*-1) for i in light.direction]
-                    elif light.lightType=="Point":
-                        lightDir = mt.subtract_arrays(light.point,intercept.point)
-                        lightDir = mt.normalizar_vector(lightDir)
-                                    
-                    shadowIntersect = self.rtCastRay(intercept.point,lightDir,intercept.obj)
-
-                    if shadowIntersect == None:
-                        diffuseColor = [(diffuseColor[i]+light.getDiffuseColor(intercept)[i]) for i in range(3)]
-                        specularColor = [(specularColor[i]+light.getSpecularColor(intercept,self.camPosition)[i]) for i in range(3)]                                
-                        
-        elif material.matType == REFLECTIVE:
-            reflect = reflectVector(intercept.normal,mt.deny_array(rayDirection))
-            reflectIntercept = self.rtCastRay(intercept.point,reflect,intercept.obj,recursion+1)
-            reflectColor = self.rtRayColor(reflectIntercept,reflect,recursion+1)
-            
-            for light in self.lights:
-                if light.lightType!="Ambient":
-
-                    lightDir = None
-                    if light.lightType == "Directional":
-                        lightDir = [(i*-1) for i in light.direction]
-                    elif light.lightType == "Point":
-                        lightDir = mt.subtract_arrays(light.point,intercept.point)
-                        lightDir = mt.normalizar_vector(lightDir)
+        if shade is not None:
+            lightColor = shade(intercept,rayDirection,surfaceColor,recursion,throughput)
+        else:
+            reflectColor = [0,0,0]
+            refractColor = [0,0,0]
+            finalColor = [0,0,0]
+        
+            if material.matType == OPAQUE:  
+                ambientColor, diffuseColor, specularColor = self.rtLighting(intercept)
                         
-                    shadowIntersect = self.rtCastRay(intercept.point,lightDir,intercept.obj)
-
-                    if shadowIntersect == None:
-                        specularColor = [(specularColor[i]+light.getSpecularColor(intercept,self.camPosition)[i]) for i in range(3)]
+            elif material.matType == REFLECTIVE:
+                childThroughput = throughput*max(surfaceColor)
+                weight = self.rtBranchWeight(childThroughput,recursion)
+                if weight:
+                    reflectColor = self.rtReflect(intercept,rayDirection,intercept.point,intercept.obj,recursion,throughput=childThroughput)
+                    if weight != 1 and reflectColor != None:
+                        reflectColor = multiply(reflectColor,weight)
+                ambientColor, diffuseColor, specularColor = self.rtLighting(intercept,False)
         
-        elif material.matType == TRANSPARENT:
-            outside = dot(rayDirection,intercept.normal) < 0
-            bias = multiply_arrays(intercept.normal, [0.001, 0.001, 0.001])
+            elif material.matType == TRANSPARENT and self.fresnel:
+                #Reflejo y refraccion pesados por Kr y Kt
+                outside = dot(rayDirection,intercept.normal) < 0
+                bias = multiply(intercept.normal, 0.001)
+                ambientColor, diffuseColor, specularColor = self.rtLighting(intercept,False)
+            
+                if totalInternalReflection(intercept.normal,rayDirection,1.0,material.ior):
+                    Kr, Kt = 1.0, 0.0
+                else:
+                    Kr, Kt = fresnel(intercept.normal,rayDirection,1.0,material.ior)
+                childThroughput = throughput*max(surfaceColor)
+            
+                weight = self.rtBranchWeight(childThroughput*Kr,recursion)
+                if weight:
+                    reflectOrig = add(intercept.point, bias) if outside else subtract(intercept.point, bias)
+                    color = self.rtReflect(intercept,rayDirection,reflectOrig,None,recursion,throughput=childThroughput*Kr)
+                    if color != None:
+                        reflectColor = multiply(color,Kr*weight)
+            
+                weight = self.rtBranchWeight(childThroughput*Kt,recursion) if Kt > 0 else 0
+                if weight:
+                    refractOrig = subtract(intercept.point, bias) if outside else add(intercept.point, bias)
+                    color = self.rtRefract(intercept,rayDirection,refractOrig,recursion,throughput=childThroughput*Kt)
+                    if color != None:
+                        refractColor = multiply(color,Kt*weight)
+        
+            elif material.matType == TRANSPARENT:
+                outside = dot(rayDirection,intercept.normal) < 0
+                bias = multiply(intercept.normal, 0.001)
+                childThroughput = throughput*max(surfaceColor)
+                weight = self.rtBranchWeight(childThroughput,recursion)
          
- 
-            reflect = reflectVector(intercept.normal, deny_array(rayDirection))
-            reflectOrig = add_arrays(intercept.point, bias) if outside else subtract_arrays(intercept.point, bias)
-            reflectIntercept = self.rtCastRay(reflectOrig,reflect,None,recursion+1)
-            reflectColor = self.rtRayColor(reflectIntercept,reflect,recursion+1)
-            for light in self.lights:
-                if light.lightType!="Ambient":
-
-                    lightDir = None
-                    if light.lightType == "Directional":
-                        lightDir = [(i*-1) for i in light.direction]
-                    elif light.lightType == "Point":
-                        lightDir = mt.subtract_arrays(light.point,intercept.point)
-                        lightDir = mt.normalizar_vector(lightDir)
-                        
-                    shadowIntersect = self.rtCastRay(intercept.point,lightDir,intercept.obj)
-
-                    if shadowIntersect == None:
-                        specularColor = [(specularColor[i]+light.getSpecularColor(intercept,self.camPosition)[i]) for i in range(3)]
-            if not totalInternalReflection(intercept.normal,rayDirection,1.0,material.ior):
-                refract = refractVector(intercept.normal,rayDirection,1.0,material.ior)
-                refractOrig = subtract_arrays(intercept.point, bias) if outside else add_arrays(intercept.point, bias)
-                refractIntercept = self.rtCastRay(refractOrig,refract,None,recursion+1)
-                reflectColor = self.rtRayColor(refractIntercept,refract,recursion+1)   
-      
-          
+                if weight:
+                    reflectOrig = add(intercept.point, bias) if outside else subtract(intercept.point, bias)
+                    reflectColor = self.rtReflect(intercept,rayDirection,reflectOrig,None,recursion,throughput=childThroughput)
+                ambientColor, diffuseColor, specularColor = self.rtLighting(intercept,False)
+            
+                if weight and not totalInternalReflection(intercept.normal,rayDirection,1.0,material.ior):
+                    refractOrig = subtract(intercept.point, bias) if outside else add(intercept.point, bias)
+                    reflectColor = self.rtRefract(intercept,rayDirection,refractOrig,recursion,throughput=childThroughput)
+                if weight != 1 and reflectColor != None:
+                    reflectColor = multiply(reflectColor,weight)
         
-        lightColor = [(ambientColor[i]+diffuseColor[i]+specularColor[i]+reflectColor[i]+refractColor[i]) for i in range(3)]
+            lightColor = [(ambientColor[i]+diffuseColor[i]+specularColor[i]+reflectColor[i]+refractColor[i]) for i in range(3)]
         finalColor = [min(1,surfaceColor[i]*lightColor[i]) for i in range(3)]
             
         return finalColor
 
-    def rtRender(self):
+    def rtPixelColor(self,x,y,dx=0.5,dy=0.5):
+        #dx, dy: punto dentro del pixel por donde pasa el rayo (0 a 1)
+        #Pasar de coordenadas de ventana a 
+        #coordenadas NDC (-1 a 1)
+        Px = ((x+dx - self.vpX)/self.vpWidth)*2-1
+        Py = ((y+dy - self.vpY)/self.vpHeight)*2-1
+            
+        Px *= self.rightEdge
+        Py *= self.topEdge
+            
+        #Crear un rayo
+        direction = (Px,Py,-self.nearPlane)
+        direction = normalize(direction)
+            
+        intercept = self.rtCastRay(self.camPosition,direction)
+            
+        return self.rtRayColor(intercept,direction)
+
+    def rtRender(self,flipEvery=0):
+        #flipEvery: cada cuantos pixeles refrescar la ventana (0 = nunca,
+        #util para renderizar sin pantalla)
+        self.rtPrepare()
+        
         indeces = [(i,j) for i in range(self.vpWidth) for j in range(self.vpHeight)]
         random.shuffle(indeces)        
 
-        for i, j in indeces:
-            x = i + self.vpX
-            y = j + self.vpY
-            
-            if 0<=x<self.width and 0<=y<self.height:
-                #Pasar de coordenadas de ventana a 
-                #coordenadas NDC (-1 a 1)
-                Px = ((x+0.5 - self.vpX)/self.vpWidth)*2-1
-                Py = ((y+0.5 - self.vpY)/self.vpHeight)*2-1
-                    
-                Px *= self.rightEdge
-                Py *= self.topEdge
-                    
-                #Crear un rayo
-                direction = (Px,Py,-self.nearPlane)
-                direction = mt.normalizar_vector(direction)
-                    
-                intercept = self.rtCastRay(self.camPosition,direction)
-                    
-                rayColor = self.rtRayColor(intercept,direction)
+        def render():
+            for count, (i, j) in enumerate(indeces, 1):
+                x = i + self.vpX
+                y = j + self.vpY
+                
+                if 0<=x<self.width and 0<=y<self.height:
+                    rayColor = self.rtPixelColor(x,y)
+                        
+                    if rayColor!=None:
+                        self.rtPoint(x,y,rayColor)
+                        
+                if flipEvery and count % flipEvery == 0:
+                    pygame.display.flip()
+        self.rtWithStats(render)
+        
+        if flipEvery:
+            pygame.display.flip()
+
+    def rtWithStats(self,render):
+        #Corre render() con self.stats (si hay) enganchado a los metodos del
+        #raytracer y deja el reporte en statsReport
+        stats = self.stats
+        if stats is None:
+            return render()
+        
+        stats.attach(self)
+        start = time.perf_counter()
+        try:
+            return render()
+        finally:
+            stats.wall = time.perf_counter() - start
+            stats.detach(self)
+            self.statsReport = stats.report()
+
+    def rtBlockRect(self,x,y,w,h):
+        #Rectangulo de pantalla del bloque de w x h pixeles desde (x,y), con
+        #las mismas coordenadas de rtPoint y solo donde rtPoint pintaria
+        x0 = max(x,self.vpX,0)
+        x1 = min(x+w,self.vpX+self.vpWidth,self.width)
+        y0 = max(y,self.vpY,1)
+        y1 = min(y+h,self.vpY+self.vpHeight,self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return (x0,self.height-(y1-1),x1-x0,y1-y0)
+
+    def rtRenderProgressive(self,startStep=16,callback=None):
+        #Render de vista previa: primero un rayo cada startStep pixeles, cuyo
+        #color llena su bloque de startStep x startStep, y luego pasadas con la
+        #mitad del paso que solo trazan los pixeles nuevos, hasta llegar a 1.
+        #startStep se redondea hacia abajo a una potencia de 2, asi cada
+        #cuadricula contiene a las anteriores: cada pixel se traza una sola vez
+        #y al terminar la imagen es la misma que la de rtRender; despues de
+        #cada pasada la imagen esta completa. callback(step) se llama al final
+        #de cada pasada (por ejemplo para refrescar la ventana); si devuelve
+        #False el render se cancela. Devuelve True si se completo.
+        self.rtPrepare()
+        
+        step = 1 << (max(startStep,1).bit_length()-1)
+        previous = None
+        while step >= 1:
+            for j in range(0,self.vpHeight,step):
+                for i in range(0,self.vpWidth,step):
+                    #Los pixeles de la pasada anterior ya estan trazados
+                    if previous and i % previous == 0 and j % previous == 0:
+                        continue
                     
+                    x = i + self.vpX
+                    y = j + self.vpY
+                    if 0<=x<self.width and 0<=y<self.height:
+                        rayColor = self.rtPixelColor(x,y)
+                        rect = self.rtBlockRect(x,y,step,step)
+                        if rect is None:
+                            continue
+                        #Sin color el bloque queda con el color de fondo, como en rtClear
+                        if rayColor!=None:
+                            self.screen.fill((int(rayColor[0]*255),
+                                              int(rayColor[1]*255),
+                                              int(rayColor[2]*255)),rect)
+                        else:
+                            self.screen.fill(self.clearColor,rect)
+            
+            if callback is not None and callback(step) is False:
+                return False
+            previous = step
+            step //= 2
+        
+        return True
+
+    def rtRenderAdaptive(self,threshold=0.1,maxSamples=16,seed=0,flipEvery=0):
+        #Antialiasing adaptivo: un rayo por el centro de cada pixel y, solo
+        #donde el color difiere de algun vecino en mas de threshold (en algun
+        #canal), subpixeles estratificados con jitter: primero 2x2 y, si siguen
+        #variando, una ronda de hasta maxSamples. El jitter sale de un
+        #generador por pixel sembrado con seed, asi que es reproducible.
+        #flipEvery: cada cuantas filas refrescar la ventana. Con self.stats se
+        #cuentan sus rayos como en rtRender
+        self.rtPrepare()
+        
+        background = [c/255 for c in self.clearColor]
+        xs = [x for x in range(self.vpX,self.vpX+self.vpWidth) if 0<=x<self.width]
+        ys = [y for y in range(self.vpY,self.vpY+self.vpHeight) if 0<=y<self.height]
+        
+        def render():
+            base = [[self.rtPixelColor(x,y) for x in xs] for y in ys]
+            
+            for j, y in enumerate(ys):
+                for i, x in enumerate(xs):
+                    color = base[j][i]
+                    if self.rtContrast(base,i,j,background) > threshold:
+                        color = self.rtSupersample(x,y,color,threshold,maxSamples,seed,background)
+                    if color!=None:
+                        self.rtPoint(x,y,color)
+                
+                if flipEvery and (j+1) % flipEvery == 0:
+                    pygame.display.flip()
+        self.rtWithStats(render)
+        
+        if flipEvery:
+            pygame.display.flip()
+
+    def rtContrast(self,base,i,j,background):
+        #Mayor diferencia por canal entre el pixel y sus cuatro vecinos
+        color = base[j][i] or background
+        contrast = 0
+        for ni, nj in ((i-1,j),(i+1,j),(i,j-1),(i,j+1)):
+            if 0<=nj<len(base) and 0<=ni<len(base[nj]):
+                other = base[nj][ni] or background
+                contrast = max(contrast,abs(color[0]-other[0]),abs(color[1]-other[1]),abs(color[2]-other[2]))
+        return contrast
+
+    def rtSupersample(self,x,y,color,threshold,maxSamples,seed,background):
+        #Rondas de k x k subpixeles estratificados con jitter: 2x2 y luego la
+        #mayor cuadricula que cabe en maxSamples. Las muestras que ya caen en
+        #una celda de la ronda siguiente (empezando por la del centro) se
+        #reutilizan, asi un pixel con 16 muestras cuesta 16 rayos en total.
+        #Con maxSamples menor que 4 no cabe ninguna ronda y queda el color
+        #del centro.
+        rng = random.Random(seed*1000003 + y*self.width + x)
+        samples = [(0.5,0.5,color or background)]
+        
+        largest = isqrt(maxSamples)
+        for k in sorted({min(2,largest),largest}):
+            if k < 2:
+                continue
+            
+            cells = {}
+            for sample in samples:
+                cells.setdefault((int(sample[0]*k),int(sample[1]*k)),sample)
+            for sy in range(k):
+                for sx in range(k):
+                    if (sx,sy) not in cells:
+                        dx = (sx+rng.random())/k
+                        dy = (sy+rng.random())/k
+                        cells[sx,sy] = (dx,dy,self.rtPixelColor(x,y,dx,dy) or background)
+            
+            samples = list(cells.values())
+            colors = [sample[2] for sample in samples]
+            color = [sum(c[i] for c in colors)/len(colors) for i in range(3)]
+            
+            spread = max(max(c[i] for c in colors)-min(c[i] for c in colors) for i in range(3))
+            if spread <= threshold:
+                break
+        
+        return color
+
+    def rtCastPacketArrays(self,orig,dirs):
+        #Hits mas cercanos de un paquete de rayos como arreglos: indice en
+        #self.scene de la figura (-1 sin hit), distancias, puntos, normales,
+        #texcoords y la mascara de rayos cuya figura tiene texcoords.
+        #Una llamada de NumPy por figura para todo el paquete.
+        n = len(dirs)
+        depth = np.full(n,np.inf)
+        nearest = np.full(n,-1)
+        points = np.zeros((n,3))
+        normals = np.zeros((n,3))
+        texcoords = np.zeros((n,2))
+        hasTexcoords = np.zeros(n,dtype=bool)
+        
+        with np.errstate(all="ignore"):
+            for k, obj in enumerate(self.scene):
+                hit = obj.ray_intersect_many(orig,dirs)
+                closer = hit[4] & (hit[0] < depth)
+                depth = np.where(closer,hit[0],depth)
+                nearest[closer] = k
+                points[closer] = hit[1][closer]
+                normals[closer] = hit[2][closer]
+                hasTexcoords[closer] = hit[3] is not None
+                if hit[3] is not None:
+                    texcoords[closer] = hit[3][closer]
+        
+        return nearest, depth, points, normals, texcoords, hasTexcoords
+
+    def rtCastPacket(self,orig,dirs):
+        #Version por paquetes de rtCastRay para rayos coherentes (primarios):
+        #una llamada de NumPy por figura para todo el paquete en lugar de una
+        #llamada por rayo y figura. Devuelve un Intercept (o None) por rayo.
+        nearest, depth, points, normals, texcoords, hasTexcoords = self.rtCastPacketArrays(orig,dirs)
+        
+        intercepts = []
+        for i, k in enumerate(nearest.tolist()):
+            if k < 0:
+                intercepts.append(None)
+                continue
+            
+            intercepts.append(Intercept(distance=float(depth[i]),
+                                        point=points[i].tolist(),
+                                        normal=normals[i].tolist(),
+                                        texcoords=tuple(texcoords[i].tolist()) if hasTexcoords[i] else None,
+                                        obj=self.scene[k]))
+        return intercepts
+
+    def rtRenderPacket(self,tile):
+        #Como rtRenderTile, pero trazando los rayos primarios del tile como un paquete
+        x0,y0,w,h = tile
+        xs, ys = np.meshgrid(np.arange(x0,x0+w),np.arange(y0,y0+h))
+        xs = xs.ravel()
+        ys = ys.ravel()
+        
+        Px = (((xs+0.5 - self.vpX)/self.vpWidth)*2-1)*self.rightEdge
+        Py = (((ys+0.5 - self.vpY)/self.vpHeight)*2-1)*self.topEdge
+        directions = normalize_many(np.stack((Px,Py,np.full(len(Px),-self.nearPlane)),axis=1))
+        
+        intercepts = self.rtCastPacket(self.camPosition,directions)
+        
+        #Los rayos que escapan se colorean todos juntos con el envMap
+        envColors = {}
+        misses = [i for i, intercept in enumerate(intercepts) if intercept is None]
+        if misses and self.envMap:
+            envColors = dict(zip(misses,self.envMap.lookup_many(directions[misses],self.envFilter).tolist()))
+        
+        colors = []
+        for i, (x, y, direction, intercept) in enumerate(zip(xs.tolist(),ys.tolist(),directions.tolist(),intercepts)):
+            rayColor = envColors.get(i) or self.rtRayColor(intercept,direction)
+            if rayColor!=None:
+                colors.append((x,y,rayColor))
+        return colors
+
+    def rtRenderPackets(self,packetSize=16,flipEvery=0):
+        #Render serial por bloques de packetSize x packetSize pixeles
+        #flipEvery: cada cuantos bloques refrescar la ventana
+        self.rtPrepare()
+        
+        for count, tile in enumerate(self.rtTiles(packetSize), 1):
+            for x, y, rayColor in self.rtRenderPacket(tile):
+                self.rtPoint(x,y,rayColor)
+                
+            if flipEvery and count % flipEvery == 0:
+                pygame.display.flip()
+        
+        if flipEvery:
+            pygame.display.flip()
+
+    def rtRenderDeferred(self,gbuffer=None):
+        #Render en dos pasadas (ver deferred.py): primero los hits primarios
+        #de todo el viewport en un G-buffer y despues el sombreado de todos
+        #los pixeles con operaciones de arreglos. Con un gbuffer de un render
+        #anterior (misma camara y geometria) solo se repite el sombreado.
+        #Devuelve el G-buffer.
+        if gbuffer is None:
+            gbuffer = build_gbuffer(self)
+        else:
+            self.rtPrepare(rebuild=False)
+        colors, valid = shade_gbuffer(self,gbuffer)
+        
+        for x, y, rayColor in zip(gbuffer.xs[valid].tolist(),gbuffer.ys[valid].tolist(),colors[valid].tolist()):
+            self.rtPoint(x,y,rayColor)
+        return gbuffer
+
+    def rtTiles(self,tileSize):
+        #Divide el viewport (recortado a la pantalla) en rectangulos x,y,w,h
+        x0 = max(self.vpX,0)
+        y0 = max(self.vpY,0)
+        x1 = min(self.vpX+self.vpWidth,self.width)
+        y1 = min(self.vpY+self.vpHeight,self.height)
+        
+        return [(x,y,min(tileSize,x1-x),min(tileSize,y1-y))
+                for y in range(y0,y1,tileSize)
+                for x in range(x0,x1,tileSize)]
+
+    def rtRenderTile(self,tile):
+        x0,y0,w,h = tile
+        colors = []
+        for y in range(y0,y0+h):
+            for x in range(x0,x0+w):
+                rayColor = self.rtPixelColor(x,y)
                 if rayColor!=None:
+                    colors.append((x,y,rayColor))
+        return colors
+
+    def rtRenderParallel(self,workers=None,tileSize=32,flipEvery=0,packets=False):
+        #Reparte los tiles del viewport entre un pool de procesos. La escena,
+        #las luces y el envMap se envian una sola vez a cada proceso (en el
+        #initializer); por cada tile solo viajan sus coordenadas y sus colores.
+        #flipEvery: cada cuantos tiles terminados refrescar la ventana
+        #packets: trazar los rayos primarios de cada tile como un paquete
+        self.rtPrepare()
+        tiles = self.rtTiles(tileSize)
+        
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_initWorker,
+                                 initargs=(self,)) as pool:
+            futures = [pool.submit(_renderWorkerTile,tile,packets) for tile in tiles]
+            
+            for count, future in enumerate(as_completed(futures), 1):
+                for x, y, rayColor in future.result():
                     self.rtPoint(x,y,rayColor)
-                    pygame.display.flip()
\ No newline at end of file
+                    
+                if flipEvery and count % flipEvery == 0:
+                    pygame.display.flip()
+        
+        if flipEvery:
+            pygame.display.flip()
+
+    def __getstate__(self):
+        #La pantalla no se envia a los procesos del render paralelo
+        state = self.__dict__.copy()
+        state["screen"] = None
+        #El sombreado compilado son closures; cada proceso lo arma de nuevo
+        state["lightingKernel"] = None
+        state["shadingKernel"] = None
+        return state
+
+
+#Raytracer de cada proceso del pool, recibido una vez en _initWorker
+_worker = None
+
+def _initWorker(raytracer):
+    global _worker
+    _worker = raytracer
+
+def _renderWorkerTile(tile,packets):
+    if packets:
+        return _worker.rtRenderPacket(tile)
+    return _worker.rtRenderTile(tile)
+
+#Las Surfaces de pygame que queden en la escena no se pueden serializar
+#directamente; se envian como bytes RGBA y se reconstruyen en cada proceso.
+def _surfaceFromBytes(data,size):
+    return pygame.image.fromstring(data,size,"RGBA")
+
+def _pickleSurface(surface):
+    return _surfaceFromBytes, (pygame.image.tostring(surface,"RGBA"),surface.get_size())
+
+copyreg.pickle(pygame.Surface,_pickleSurface)
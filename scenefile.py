@@ -0,0 +1,321 @@
+"""Escenas declarativas en JSON.
+
+Un archivo de escena describe la camara, el viewport, los materiales, las
+luces, las figuras y las rutas de texturas y del envMap; load_scene arma un
+RayTracer a partir de el sin ejecutar codigo de la escena:
+
+    raytracer = load_scene("scenes/osito.json")
+    raytracer.rtRender()
+
+Formato (todas las claves son opcionales salvo "shapes"):
+
+    {
+      "width": 1500, "height": 650,
+      "camera": {"position": [0, 0.5, 0.75], "fov": 60, "near": 0.1},
+      "viewport": [0, 0, 1500, 650],
+      "clearColor": [0.25, 0.25, 0.25],
+      "envMap": "cielo.png",
+      "textureFilter": "nearest",
+      "materials": {
+        "piel": {"diffuse": [0.6, 0.5, 0.2], "spec": 256, "Ks": 0.2, "type": "opaque"},
+        "caja": {"texture": "ros.jpg"}
+      },
+      "lights": [
+        {"type": "ambient", "intensity": 0.6},
+        {"type": "directional", "direction": [0, -1, 0], "intensity": 0.9},
+        {"type": "point", "point": [0, 2, -3], "color": [1, 1, 1]}
+      ],
+      "geometry": {
+        "regalo": {"type": "mesh", "file": "regalo.obj", "material": "caja"}
+      },
+      "shapes": [
+        {"type": "sphere", "position": [0, 0, -4], "radius": 1, "material": "piel"},
+        {"type": "mesh", "file": "oso.obj", "position": [0, 0, -4], "scale": 0.5, "material": "piel"},
+        {"type": "instance", "geometry": "regalo", "position": [2, -1, -6], "rotation": [0, 45, 0], "scale": 0.3}
+      ]
+    }
+
+Los tipos de figura y sus parametros son los de los constructores de
+figures.py (ver SHAPES); "mesh" carga un OBJ con mesh.load_obj. "geometry"
+define figuras con nombre que no van a la escena: cada "instance" coloca una
+de ellas con instance.Instance (position, rotation en grados y scale, un
+numero o uno por eje; material opcional) y todas las instancias comparten
+la misma figura, que se arma una sola vez. Las rutas
+relativas se resuelven desde la carpeta del archivo de escena y cada imagen
+se carga una sola vez aunque la usen varios materiales. validate_scene revisa
+la escena completa antes de cargar nada y reporta todos los errores juntos.
+"""
+import json
+import os
+
+import pygame
+
+from rt import RayTracer
+from figures import Sphere, Plane, Disk, AABB, Ellipsoid, OBB, ThinCylinder, Triangle
+from lights import AmbientLight, DirectionalLight, PointLight
+from materials import Material, OPAQUE, REFLECTIVE, TRANSPARENT
+from mesh import load_obj
+from instance import Instance, transform
+
+MATERIAL_TYPES = {"opaque": OPAQUE, "reflective": REFLECTIVE, "transparent": TRANSPARENT}
+
+# Tipo -> (clase, parametros obligatorios en el orden del constructor)
+SHAPES = {"sphere": (Sphere, ("position", "radius")),
+          "plane": (Plane, ("position", "normal")),
+          "disk": (Disk, ("position", "normal", "radius")),
+          "aabb": (AABB, ("position", "size")),
+          "ellipsoid": (Ellipsoid, ("position", "radii")),
+          "obb": (OBB, ("position", "size", "rotation_matrix")),
+          "cylinder": (ThinCylinder, ("position", "height", "radius")),
+          "triangle": (Triangle, ("v0", "v1", "v2"))}
+
+# Parametros opcionales de "mesh" ademas de "file"
+MESH_OPTIONS = ("position", "scale")
+
+# Parametros opcionales de "instance" ademas de "geometry"
+INSTANCE_OPTIONS = ("position", "rotation", "scale")
+
+LIGHTS = {"ambient": (AmbientLight, ()),
+          "directional": (DirectionalLight, ("direction",)),
+          "point": (PointLight, ("point",))}
+
+VECTORS = ("position", "normal", "size", "radii", "v0", "v1", "v2", "direction", "point", "color", "diffuse")
+
+
+class SceneError(ValueError):
+    """ La escena no es valida; errors tiene un mensaje por problema. """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("escena invalida:\n  " + "\n  ".join(errors))
+
+
+def read_scene(path):
+    """ Lee un archivo de escena y devuelve el diccionario validado. """
+    with open(path) as f:
+        data = json.load(f)
+    validate_scene(data)
+    return data
+
+
+def validate_scene(data):
+    """ Revisa tipos, parametros y referencias a materiales; lanza SceneError con todos los problemas. """
+    errors = []
+
+    def vector(value, where, size=3):
+        if not (isinstance(value, list) and len(value) == size and all(isinstance(c, (int, float)) for c in value)):
+            errors.append("%s: se esperaba una lista de %d numeros" % (where, size))
+
+    def number(value, where):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            errors.append("%s: se esperaba un numero" % where)
+
+    def table(value, where):
+        # Las secciones y entradas de la escena deben ser objetos JSON
+        if not isinstance(value, dict):
+            errors.append("%s: se esperaba un objeto" % where)
+            return False
+        return True
+
+    def path(value, where):
+        if not isinstance(value, str):
+            errors.append("%s: se esperaba la ruta de un archivo" % where)
+
+    def defined(value, names):
+        # Nombre de un material, de una geometria o de un tipo
+        return isinstance(value, str) and value in names
+
+    def check(entry, where, names):
+        for name in names:
+            if name not in entry:
+                errors.append("%s: falta %r" % (where, name))
+            elif name in VECTORS:
+                vector(entry[name], "%s.%s" % (where, name))
+            elif name == "rotation_matrix":
+                rows = entry[name]
+                if not (isinstance(rows, list) and len(rows) == 3):
+                    errors.append("%s.%s: se esperaba una matriz de 3 x 3" % (where, name))
+                else:
+                    for i, row in enumerate(rows):
+                        vector(row, "%s.%s[%d]" % (where, name, i))
+            else:
+                number(entry[name], "%s.%s" % (where, name))
+
+    if not isinstance(data, dict):
+        raise SceneError(["la escena debe ser un objeto JSON"])
+
+    for key in ("width", "height"):
+        if key in data:
+            number(data[key], key)
+    camera = data.get("camera", {})
+    if not table(camera, "camera"):
+        camera = {}
+    if "position" in camera:
+        vector(camera["position"], "camera.position")
+    for key in ("fov", "near"):
+        if key in camera:
+            number(camera[key], "camera." + key)
+    if "viewport" in data:
+        vector(data["viewport"], "viewport", 4)
+    if "clearColor" in data:
+        vector(data["clearColor"], "clearColor")
+    if data.get("textureFilter", "nearest") not in ("nearest", "bilinear", "trilinear"):
+        errors.append("textureFilter: debe ser nearest, bilinear o trilinear")
+    if "envMap" in data:
+        path(data["envMap"], "envMap")
+
+    materials = data.get("materials", {})
+    if not table(materials, "materials"):
+        materials = {}
+    for name, material in materials.items():
+        where = "materials.%s" % name
+        if not table(material, where):
+            continue
+        if not defined(material.get("type", "opaque"), MATERIAL_TYPES):
+            errors.append("%s.type: debe ser %s" % (where, ", ".join(MATERIAL_TYPES)))
+        if "diffuse" in material:
+            vector(material["diffuse"], where + ".diffuse")
+        for key in ("spec", "Ks", "ior"):
+            if key in material:
+                number(material[key], "%s.%s" % (where, key))
+        if "texture" in material:
+            path(material["texture"], where + ".texture")
+
+    lights = data.get("lights", [])
+    if not isinstance(lights, list):
+        errors.append("lights: se esperaba una lista de luces")
+        lights = []
+    for i, light in enumerate(lights):
+        where = "lights[%d]" % i
+        if not table(light, where):
+            continue
+        if not defined(light.get("type"), LIGHTS):
+            errors.append("%s.type: debe ser %s" % (where, ", ".join(LIGHTS)))
+            continue
+        check(light, where, LIGHTS[light["type"]][1])
+        for key in ("intensity", "color"):
+            if key in light:
+                check(light, where, (key,))
+
+    def shape_errors(shape, where, instances):
+        if not table(shape, where):
+            return
+        kind = shape.get("type")
+        if kind == "mesh":
+            if "file" not in shape:
+                errors.append("%s: falta 'file'" % where)
+            else:
+                path(shape["file"], where + ".file")
+            if "position" in shape:
+                vector(shape["position"], where + ".position")
+            if "scale" in shape:
+                number(shape["scale"], where + ".scale")
+        elif kind == "instance" and instances:
+            if not defined(shape.get("geometry"), geometry):
+                errors.append("%s.geometry: %r no esta en geometry" % (where, shape.get("geometry")))
+            for key in ("position", "rotation"):
+                if key in shape:
+                    vector(shape[key], "%s.%s" % (where, key))
+            if isinstance(shape.get("scale"), list):
+                vector(shape["scale"], where + ".scale")
+            elif "scale" in shape:
+                number(shape["scale"], where + ".scale")
+            if "material" in shape and not defined(shape["material"], materials):
+                errors.append("%s.material: %r no esta en materials" % (where, shape["material"]))
+            return
+        elif defined(kind, SHAPES):
+            check(shape, where, SHAPES[kind][1])
+        else:
+            kinds = list(SHAPES) + ["mesh"] + (["instance"] if instances else [])
+            errors.append("%s.type: %r no es un tipo de figura (%s)" % (where, kind, ", ".join(kinds)))
+            return
+        if not defined(shape.get("material"), materials):
+            errors.append("%s.material: %r no esta en materials" % (where, shape.get("material")))
+
+    geometry = data.get("geometry", {})
+    if not isinstance(geometry, dict):
+        errors.append("geometry: se esperaba un objeto con figuras por nombre")
+        geometry = {}
+    for name, shape in geometry.items():
+        shape_errors(shape, "geometry.%s" % name, False)
+
+    if not isinstance(data.get("shapes"), list):
+        errors.append("shapes: se esperaba una lista de figuras")
+    else:
+        for i, shape in enumerate(data["shapes"]):
+            shape_errors(shape, "shapes[%d]" % i, True)
+
+    if errors:
+        raise SceneError(errors)
+
+
+def load_scene(path, screen=None):
+    """ Arma un RayTracer con la escena del archivo path.
+
+    screen es la superficie donde se renderiza; si no se da, se crea una
+    fuera de pantalla del tamano width x height de la escena.
+    """
+    data = read_scene(path)
+    return build_raytracer(data, os.path.dirname(os.path.abspath(path)), screen)
+
+
+def build_raytracer(data, folder=".", screen=None):
+    """ Arma un RayTracer a partir de un diccionario de escena ya validado. """
+    if screen is None:
+        screen = pygame.Surface((int(data.get("width", 1500)), int(data.get("height", 650))))
+    raytracer = RayTracer(screen)
+
+    images = {}
+
+    def image(name):
+        # Cada imagen se carga una sola vez
+        path = os.path.join(folder, name)
+        if path not in images:
+            images[path] = pygame.image.load(path)
+        return images[path]
+
+    camera = data.get("camera", {})
+    if "viewport" in data:
+        raytracer.rtViewport(*data["viewport"])
+    raytracer.rtProyection(camera.get("fov", 60), camera.get("near", 0.1))
+    raytracer.camPosition = list(camera.get("position", [0, 0, 0]))
+    if "clearColor" in data:
+        raytracer.rtClearColor(*data["clearColor"])
+    if "envMap" in data:
+        raytracer.envMap = image(data["envMap"])
+    raytracer.textureFilter = data.get("textureFilter", "nearest")
+
+    materials = {}
+    for name, spec in data.get("materials", {}).items():
+        materials[name] = Material(diffuse=tuple(spec.get("diffuse", (1, 1, 1))),
+                                   spec=spec.get("spec", 1.0),
+                                   Ks=spec.get("Ks", 0.0),
+                                   ior=spec.get("ior", 1.0),
+                                   texture=image(spec["texture"]) if "texture" in spec else None,
+                                   matType=MATERIAL_TYPES[spec.get("type", "opaque")])
+
+    for spec in data.get("lights", []):
+        lightType, params = LIGHTS[spec["type"]]
+        options = {key: spec[key] for key in ("intensity", "color") if key in spec}
+        raytracer.lights.append(lightType(*[spec[name] for name in params], **options))
+
+    def shape(spec):
+        material = materials[spec["material"]]
+        if spec["type"] == "mesh":
+            options = {key: spec[key] for key in MESH_OPTIONS if key in spec}
+            return load_obj(os.path.join(folder, spec["file"]), material, **options)
+        shapeType, params = SHAPES[spec["type"]]
+        return shapeType(*[spec[name] for name in params], material=material)
+
+    # Cada geometria se arma una sola vez y la comparten todas sus instancias
+    geometry = {name: shape(spec) for name, spec in data.get("geometry", {}).items()}
+
+    for spec in data["shapes"]:
+        if spec["type"] == "instance":
+            options = {key: spec[key] for key in INSTANCE_OPTIONS if key in spec}
+            material = materials[spec["material"]] if "material" in spec else None
+            raytracer.scene.append(Instance(geometry[spec["geometry"]], transform(**options), material))
+        else:
+            raytracer.scene.append(shape(spec))
+
+    return raytracer
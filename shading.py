@@ -0,0 +1,245 @@
+"""Sombreado compilado para las luces y los materiales de un render.
+
+rtRayColor elige en cada hit la rama de OPAQUE, REFLECTIVE o TRANSPARENT y
+rtLighting recorre las luces comparando lightType y recalculando cosas que
+no dependen del hit. compile_shading arma una sola vez (en el primer hit
+despues de rtPrepare) una funcion de sombreado por material, con su rama ya
+elegida (y la de fresnel resuelta), sus Ks y spec fijos y su iluminacion
+especializada: la luz ambiental ya sumada, las luces direccionales y
+puntuales en una tabla con sus constantes (direccion hacia la luz, color,
+intensidad) ya resueltas y la direccion a la camara calculada una sola vez
+por hit, sin comparar lightType. compile_lighting hace lo mismo para las
+llamadas directas a rtLighting.
+
+Las operaciones son las mismas y en el mismo orden que las de rtRayColor y
+lights.py, asi que el resultado es identico al de raytracer.compiledShading
+= False; benchmarks/check_shading.py lo comprueba y mide el tiempo de
+sombreado de las dos versiones.
+
+Las luces, la camara, los parametros de los materiales y fresnel quedan
+fijos en las funciones compiladas: rtPrepare (que llaman todos los render)
+las descarta para que se vuelvan a compilar con los valores actuales.
+"""
+from math import sqrt
+
+from materials import OPAQUE, REFLECTIVE, TRANSPARENT
+from lights import totalInternalReflection, fresnel
+from vec3 import add, subtract, multiply, dot
+
+INF = float("inf")
+
+
+def light_table(raytracer):
+    # Luz ambiental sumada y (punto o None si es direccional, direccion hacia
+    # la luz, r, g, b, intensidad) de cada luz, en el orden de la escena
+    ambient = [0, 0, 0]
+    lights = []
+    for light in raytracer.lights:
+        if light.lightType == "Ambient":
+            lightColor = light.getLightColor()
+            ambient = [(ambient[i] + lightColor[i]) for i in range(3)]
+        elif light.lightType == "Directional":
+            lights.append((None, light.toLight) + tuple(light.color) + (light.intensity,))
+        elif light.lightType == "Point":
+            lights.append((tuple(light.point), None) + tuple(light.color) + (light.intensity,))
+    return tuple(ambient), tuple(lights)
+
+
+def compile_lighting(raytracer):
+    """ Funcion lighting(intercept, diffuse) equivalente a rtLighting para las luces actuales. """
+    ambient, lights = light_table(raytracer)
+    kernels = {}
+
+    def lighting(intercept, diffuse=True):
+        material = intercept.obj.material
+        kernel = kernels.get(material)
+        if kernel is None:
+            kernel = kernels[material] = material_lighting(raytracer, material, ambient, lights)
+        return kernel(intercept, diffuse)
+
+    return lighting
+
+
+def material_lighting(raytracer, material, ambient, lights):
+    # rtLighting para los hits de un material
+    Ks = material.Ks
+    spec = material.spec
+    diffuseKs = 1 - Ks
+    noAmbient = (0, 0, 0)
+    camX, camY, camZ = raytracer.camPosition
+
+    def lighting(intercept, diffuse=True):
+        point = intercept.point
+        obj = intercept.obj
+        px, py, pz = point
+        nx, ny, nz = intercept.normal
+        occluded = raytracer.rtOccluded
+
+        # Direccion hacia la camara, la misma para todas las luces
+        vx = camX - px
+        vy = camY - py
+        vz = camZ - pz
+        mag = sqrt(vx * vx + vy * vy + vz * vz)
+        vx = vx / mag
+        vy = vy / mag
+        vz = vz / mag
+
+        dr = dg = db = 0
+        sr = sg = sb = 0
+        for lightPoint, toLight, cr, cg, cb, intensity in lights:
+            if lightPoint is None:
+                lx, ly, lz = toLight
+                if occluded(point, toLight, INF, obj):
+                    continue
+            else:
+                dx = lightPoint[0] - px
+                dy = lightPoint[1] - py
+                dz = lightPoint[2] - pz
+                R = sqrt(dx * dx + dy * dy + dz * dz)
+                lx = dx / R
+                ly = dy / R
+                lz = dz / R
+                if occluded(point, [lx, ly, lz], R, obj):
+                    continue
+            nDotL = nx * lx + ny * ly + nz * lz
+
+            if diffuse:
+                amount = nDotL * intensity
+                if lightPoint is None:
+                    amount = max(0, min(1, amount))
+                    amount *= diffuseKs
+                else:
+                    amount *= diffuseKs
+                    amount /= R ** 2
+                    amount = max(0, min(1, amount))
+                dr += cr * amount
+                dg += cg * amount
+                db += cb * amount
+
+            # lights.reflectVector con el producto punto ya calculado
+            d = 2 * nDotL
+            rx = d * nx - lx
+            ry = d * ny - ly
+            rz = d * nz - lz
+            mag = sqrt(rx * rx + ry * ry + rz * rz)
+            specAmount = max(0, vx * (rx / mag) + vy * (ry / mag) + vz * (rz / mag)) ** spec
+            specAmount *= Ks
+            specAmount *= intensity
+            if lightPoint is not None:
+                specAmount /= R ** 2
+                specAmount = max(0, min(1, specAmount))
+            sr += cr * specAmount
+            sg += cg * specAmount
+            sb += cb * specAmount
+
+        return (ambient if diffuse else noAmbient), (dr, dg, db), (sr, sg, sb)
+
+    return lighting
+
+
+def compile_shading(raytracer):
+    """ Funcion shader(material) con la funcion de sombreado compilada de ese material (ver rtRayColor). """
+    ambient, lights = light_table(raytracer)
+    # Si rtLighting esta envuelto en esta instancia (stats.RenderStats), la
+    # iluminacion pasa por el para que se siga midiendo
+    wrapped = raytracer.__dict__.get("rtLighting")
+    kernels = {}
+
+    def shader(material):
+        shade = kernels.get(material)
+        if shade is None:
+            lighting = wrapped or material_lighting(raytracer, material, ambient, lights)
+            shade = kernels[material] = material_shading(raytracer, material, lighting)
+        return shade
+
+    return shader
+
+
+def material_shading(raytracer, material, lighting):
+    # Funcion shade(intercept, rayDirection, surfaceColor, recursion,
+    # throughput) -> color de la luz que llega al punto (ambiental, difusa,
+    # especular, reflejada y refractada), la rama de rtRayColor del material
+    ior = material.ior
+
+    if material.matType == OPAQUE:
+        def shade(intercept, rayDirection, surfaceColor, recursion, throughput):
+            ambientColor, diffuseColor, specularColor = lighting(intercept, True)
+            return [ambientColor[0] + diffuseColor[0] + specularColor[0],
+                    ambientColor[1] + diffuseColor[1] + specularColor[1],
+                    ambientColor[2] + diffuseColor[2] + specularColor[2]]
+        return shade
+
+    if material.matType == REFLECTIVE:
+        def shade(intercept, rayDirection, surfaceColor, recursion, throughput):
+            childThroughput = throughput * max(surfaceColor)
+            weight = raytracer.rtBranchWeight(childThroughput, recursion)
+            reflectColor = (0, 0, 0)
+            if weight:
+                reflectColor = raytracer.rtReflect(intercept, rayDirection, intercept.point, intercept.obj, recursion,
+                                                   throughput=childThroughput)
+                if weight != 1 and reflectColor != None:
+                    reflectColor = multiply(reflectColor, weight)
+            ambientColor, diffuseColor, specularColor = lighting(intercept, False)
+            return [ambientColor[i] + diffuseColor[i] + specularColor[i] + reflectColor[i] for i in range(3)]
+        return shade
+
+    if material.matType == TRANSPARENT and raytracer.fresnel:
+        def shade(intercept, rayDirection, surfaceColor, recursion, throughput):
+            # Reflejo y refraccion pesados por Kr y Kt
+            normal = intercept.normal
+            outside = dot(rayDirection, normal) < 0
+            bias = multiply(normal, 0.001)
+            ambientColor, diffuseColor, specularColor = lighting(intercept, False)
+
+            if totalInternalReflection(normal, rayDirection, 1.0, ior):
+                Kr, Kt = 1.0, 0.0
+            else:
+                Kr, Kt = fresnel(normal, rayDirection, 1.0, ior)
+            childThroughput = throughput * max(surfaceColor)
+
+            reflectColor = refractColor = (0, 0, 0)
+            weight = raytracer.rtBranchWeight(childThroughput * Kr, recursion)
+            if weight:
+                reflectOrig = add(intercept.point, bias) if outside else subtract(intercept.point, bias)
+                color = raytracer.rtReflect(intercept, rayDirection, reflectOrig, None, recursion,
+                                            throughput=childThroughput * Kr)
+                if color != None:
+                    reflectColor = multiply(color, Kr * weight)
+
+            weight = raytracer.rtBranchWeight(childThroughput * Kt, recursion) if Kt > 0 else 0
+            if weight:
+                refractOrig = subtract(intercept.point, bias) if outside else add(intercept.point, bias)
+                color = raytracer.rtRefract(intercept, rayDirection, refractOrig, recursion,
+                                            throughput=childThroughput * Kt)
+                if color != None:
+                    refractColor = multiply(color, Kt * weight)
+            return [ambientColor[i] + diffuseColor[i] + specularColor[i] + reflectColor[i] + refractColor[i]
+                    for i in range(3)]
+        return shade
+
+    if material.matType == TRANSPARENT:
+        def shade(intercept, rayDirection, surfaceColor, recursion, throughput):
+            normal = intercept.normal
+            outside = dot(rayDirection, normal) < 0
+            bias = multiply(normal, 0.001)
+            childThroughput = throughput * max(surfaceColor)
+            weight = raytracer.rtBranchWeight(childThroughput, recursion)
+
+            reflectColor = (0, 0, 0)
+            if weight:
+                reflectOrig = add(intercept.point, bias) if outside else subtract(intercept.point, bias)
+                reflectColor = raytracer.rtReflect(intercept, rayDirection, reflectOrig, None, recursion,
+                                                   throughput=childThroughput)
+            ambientColor, diffuseColor, specularColor = lighting(intercept, False)
+
+            if weight and not totalInternalReflection(normal, rayDirection, 1.0, ior):
+                refractOrig = subtract(intercept.point, bias) if outside else add(intercept.point, bias)
+                reflectColor = raytracer.rtRefract(intercept, rayDirection, refractOrig, recursion,
+                                                   throughput=childThroughput)
+            if weight != 1 and reflectColor != None:
+                reflectColor = multiply(reflectColor, weight)
+            return [ambientColor[i] + diffuseColor[i] + specularColor[i] + reflectColor[i] for i in range(3)]
+        return shade
+
+    # Otro matType: como en rtRayColor, sin luz
+    return None
@@ -0,0 +1,169 @@
+"""Snapshots binarios de una escena ya preparada.
+
+save_snapshot guarda un RayTracer con todo lo derivado de la escena: las
+matrices inversas de los OBB, las caras de cada AABB, las texturas ya
+decodificadas con sus mipmaps, las BVH de las mallas y la estructura de
+aceleracion de rtPrepare. Se serializa con pickle (protocolo 5) y los
+arreglos de NumPy van fuera de banda, alineados dentro del archivo;
+load_snapshot abre el archivo con mmap y los arreglos quedan apuntando a el
+sin copiarse.
+
+load_scene_cached usa el snapshot de un archivo de escena mientras siga
+vigente y si no lo reconstruye:
+
+    raytracer = load_scene_cached("scenes/osito.json")   # crea scenes/osito.snap
+    raytracer = load_scene_cached("scenes/osito.json")   # lo carga con mmap
+
+La clave del snapshot es un hash del archivo de escena y del tamano y la
+fecha de modificacion de cada imagen y malla que usa, asi que cualquier
+cambio en ellos lo invalida.
+"""
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+
+import pygame
+
+from scenefile import read_scene, build_raytracer
+
+MAGIC = b"RTSNAP\x00\x01"
+# Cambia cuando cambia el formato o lo que guardan las figuras
+VERSION = 5
+ALIGNMENT = 64
+
+
+class SnapshotError(Exception):
+    """ El archivo no es un snapshot valido o no corresponde a la escena. """
+
+
+def scene_key(scenePath, data=None, accelType="bvh"):
+    """ Hash de la escena, de los archivos que usa y de la estructura de aceleracion. """
+    if data is None:
+        data = read_scene(scenePath)
+    folder = os.path.dirname(os.path.abspath(scenePath))
+
+    digest = hashlib.sha256()
+    digest.update(("%d %s\n" % (VERSION, accelType)).encode())
+    with open(scenePath, "rb") as f:
+        digest.update(f.read())
+
+    for name in sorted(scene_files(data)):
+        path = os.path.join(folder, name)
+        status = os.stat(path)
+        digest.update(("%s %d %d\n" % (name, status.st_size, status.st_mtime_ns)).encode())
+    return digest.hexdigest()
+
+
+def scene_files(data):
+    # Imagenes y mallas que carga la escena
+    files = set()
+    if "envMap" in data:
+        files.add(data["envMap"])
+    for material in data.get("materials", {}).values():
+        if "texture" in material:
+            files.add(material["texture"])
+    for shape in data.get("shapes", []) + list(data.get("geometry", {}).values()):
+        if shape.get("type") == "mesh":
+            files.add(shape["file"])
+    return files
+
+
+def aligned(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def save_snapshot(raytracer, path, key=""):
+    """ Prepara el raytracer (rtPrepare) y lo guarda en path. """
+    raytracer.rtPrepare()
+
+    buffers = []
+    payload = pickle.dumps(raytracer, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+
+    # Cabecera: MAGIC, largo del JSON y el JSON con la ubicacion de cada bloque
+    header = {"version": VERSION, "key": key, "size": list(raytracer.screen.get_size())}
+    # Los offsets dependen del largo de la cabecera; se reserva espacio de sobra
+    reserved = aligned(len(MAGIC) + 8 + 256 + 32 * (len(raws) + 1))
+    offset = reserved
+    header["payload"] = [offset, len(payload)]
+    offset = aligned(offset + len(payload))
+    header["buffers"] = []
+    for raw in raws:
+        header["buffers"].append([offset, raw.nbytes])
+        offset = aligned(offset + raw.nbytes)
+
+    encoded = json.dumps(header).encode()
+    if len(MAGIC) + 8 + len(encoded) > reserved:
+        raise SnapshotError("cabecera demasiado grande")
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(encoded)) + encoded)
+        for (start, _), data in zip([header["payload"]] + header["buffers"], [payload] + raws):
+            f.seek(start)
+            f.write(data)
+        f.truncate(max(offset, reserved))
+    # Se reemplaza de una vez para que un proceso nunca lea un snapshot a medias
+    os.replace(temporary, path)
+
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise SnapshotError("no es un snapshot")
+    length, = struct.unpack("<Q", f.read(8))
+    header = json.loads(f.read(length))
+    if header.get("version") != VERSION:
+        raise SnapshotError("snapshot de otra version")
+    return header
+
+
+def load_snapshot(path, screen=None, key=None):
+    """ Carga un RayTracer guardado con save_snapshot.
+
+    Los arreglos de NumPy quedan mapeados desde el archivo (solo lectura). Si
+    se da key y no coincide con la del snapshot se lanza SnapshotError. screen
+    es la superficie de render, del mismo tamano que la original (el viewport
+    ya esta calculado); si no se da se crea una.
+    """
+    with open(path, "rb") as f:
+        header = read_header(f)
+        if key is not None and header["key"] != key:
+            raise SnapshotError("el snapshot no corresponde a la escena")
+        if screen is not None and list(screen.get_size()) != header["size"]:
+            raise SnapshotError("el snapshot es de otro tamano de pantalla")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapped)
+    start, length = header["payload"]
+    buffers = [view[o:o + n] for o, n in header["buffers"]]
+    raytracer = pickle.loads(view[start:start + length], buffers=buffers)
+
+    if screen is None:
+        screen = pygame.Surface(header["size"])
+    raytracer.screen = screen
+    _, _, raytracer.width, raytracer.height = screen.get_rect()
+    # El primer render usa la estructura de aceleracion guardada
+    raytracer.accelLoaded = True
+    return raytracer
+
+
+def load_scene_cached(scenePath, snapshotPath=None, screen=None, accelType="bvh"):
+    """ Como scenefile.load_scene, pero a traves de un snapshot que se rehace si la escena cambio. """
+    if snapshotPath is None:
+        snapshotPath = os.path.splitext(scenePath)[0] + ".snap"
+
+    data = read_scene(scenePath)
+    key = scene_key(scenePath, data, accelType)
+    try:
+        return load_snapshot(snapshotPath, screen, key)
+    except (OSError, ValueError, SnapshotError):
+        pass
+
+    raytracer = build_raytracer(data, os.path.dirname(os.path.abspath(scenePath)), screen)
+    raytracer.accelType = accelType
+    save_snapshot(raytracer, snapshotPath, key)
+    raytracer.accelLoaded = True
+    return raytracer
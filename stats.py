@@ -0,0 +1,179 @@
+"""Contadores y tiempos por etapa de un render, opcionales.
+
+Con raytracer.stats = RenderStats(), rtRender envuelve los metodos de esa
+instancia (y de sus figuras y texturas) al empezar y los restaura al
+terminar, dejando el reporte en raytracer.statsReport. Sin stats no se
+envuelve nada, asi que el ciclo de pixeles no paga ningun costo:
+
+    raytracer.stats = RenderStats()
+    raytracer.rtRender()
+    print(raytracer.stats.summary())
+
+Cuenta rayos por tipo (primarios, de sombra, reflejados y refractados), las
+llamadas y hits de ray_intersect / ray_distance / surface / ray_hits por
+clase de figura (surface arma el Intercept del hit mas cercano), los rayos
+que terminan en el envMap y los muestreos de textura. Las llamadas a una
+figura se cuentan solo en el metodo por el que entro el raytracer: si
+ray_hits usa ray_distance por dentro se cuenta un solo ray_hits. Con
+accelType "compiled" las esferas, elipsoides, cajas y cilindros se prueban
+en los grupos de NumPy de CompiledScene sin pasar por sus metodos, asi que
+de ellas solo se cuenta surface (el reporte dice que accel se uso). Los
+tiempos de rtCastRay, rtRayColor y de las luces (rtLighting, con sus rayos de
+sombra) son exclusivos: a cada etapa no se le suma el tiempo de las etapas
+que llama.
+"""
+import time
+
+RAY_KINDS = ("primary", "shadow", "reflection", "refraction")
+STAGES = ("rtCastRay", "rtRayColor", "lights")
+SHAPE_METHODS = ("ray_intersect", "ray_distance", "surface", "ray_hits")
+
+
+class RenderStats(object):
+    def __init__(self):
+        self.reset()
+        self.wrapped = []
+
+    def reset(self):
+        self.rays = dict.fromkeys(RAY_KINDS, 0)
+        self.shapes = {}
+        self.envMisses = 0
+        self.textureSamples = 0
+        self.times = dict.fromkeys(STAGES, 0.0)
+        self.wall = 0.0
+        self.accel = None
+        # True mientras corre un metodo de figura contado (los anidados no se cuentan)
+        self.inShape = False
+        # Tiempo de las etapas hijas de cada etapa en curso
+        self.stack = []
+
+    def wrap(self, obj, name, wrapper):
+        # Pone wrapper(metodo original) como atributo de la instancia
+        self.wrapped.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper(getattr(obj, name)))
+
+    def attach(self, raytracer):
+        """ Envuelve los metodos del raytracer, de sus figuras y de sus texturas. """
+        self.reset()
+        self.accel = raytracer.accelType
+        rays = self.rays
+
+        def counted(kind, function, secondary=False):
+            def wrapper(*args, **kwargs):
+                # Los rayos secundarios mas alla de raytracer.maxDepth no se trazan
+                # (recursion es el ultimo argumento posicional)
+                if not secondary or args[-1] + 1 < raytracer.maxDepth:
+                    rays[kind] += 1
+                return function(*args, **kwargs)
+            return wrapper
+
+        self.wrap(raytracer, "rtPixelColor", lambda f: counted("primary", f))
+        self.wrap(raytracer, "rtOccluded", lambda f: counted("shadow", f))
+        self.wrap(raytracer, "rtReflect", lambda f: counted("reflection", f, True))
+        self.wrap(raytracer, "rtRefract", lambda f: counted("refraction", f, True))
+
+        self.wrap(raytracer, "rtCastRay", lambda f: self.timed("rtCastRay", f))
+        self.wrap(raytracer, "rtLighting", lambda f: self.timed("lights", f))
+
+        def rayColor(function):
+            function = self.timed("rtRayColor", function)
+
+            def wrapper(intercept, rayDirection, recursion=0, throughput=1.0):
+                if intercept is None and raytracer.envMap:
+                    self.envMisses += 1
+                return function(intercept, rayDirection, recursion, throughput=throughput)
+            return wrapper
+        self.wrap(raytracer, "rtRayColor", rayColor)
+
+        textures = []
+        for obj in raytracer.scene:
+            counts = self.shapes.setdefault(type(obj).__name__, {})
+            for name in SHAPE_METHODS:
+                self.wrap(obj, name, lambda f, c=counts.setdefault(name, [0, 0]): self.hits(c, f))
+
+            texture = getattr(obj.material, "texture", None)
+            if texture is not None and all(texture is not t for t in textures):
+                textures.append(texture)
+
+        for texture in textures:
+            self.wrap(texture, "sample", self.sampled)
+
+    def detach(self, raytracer):
+        """ Deja los metodos como estaban antes de attach. """
+        for obj, name, previous in reversed(self.wrapped):
+            if previous is None:
+                del obj.__dict__[name]
+            else:
+                obj.__dict__[name] = previous
+        self.wrapped = []
+
+    def timed(self, stage, function):
+        times = self.times
+        stack = self.stack
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            stack.append(0.0)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                times[stage] += elapsed - stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+        return wrapper
+
+    def hits(self, counts, function):
+        # counts = [llamadas, hits]; un hit es un resultado que no es None ni False
+        def wrapper(*args):
+            if self.inShape:
+                return function(*args)
+            self.inShape = True
+            try:
+                result = function(*args)
+            finally:
+                self.inShape = False
+            counts[0] += 1
+            if result is not None and result is not False:
+                counts[1] += 1
+            return result
+        return wrapper
+
+    def sampled(self, function):
+        def wrapper(*args):
+            self.textureSamples += 1
+            return function(*args)
+        return wrapper
+
+    def report(self):
+        """ Diccionario con todos los contadores y tiempos (en segundos). """
+        total = sum(self.rays.values())
+        times = {stage: round(seconds, 6) for stage, seconds in self.times.items()}
+        times["other"] = round(max(self.wall - sum(self.times.values()), 0), 6)
+        return {"wall": round(self.wall, 6),
+                "accel": self.accel,
+                "rays": dict(self.rays, total=total),
+                "raysPerSec": round(total / self.wall, 1) if self.wall else None,
+                "times": times,
+                "shapes": {name: {method: {"calls": c[0], "hits": c[1]} for method, c in counts.items() if c[0]}
+                           for name, counts in sorted(self.shapes.items())},
+                "envMisses": self.envMisses,
+                "textureSamples": self.textureSamples}
+
+    def summary(self):
+        """ El reporte como texto para imprimir. """
+        report = self.report()
+        lines = ["Render: %.3f s, %d rayos" % (report["wall"], report["rays"]["total"])]
+        if report["raysPerSec"] is not None:
+            lines[0] += " (%.1f rayos/s)" % report["raysPerSec"]
+        lines[0] += ", accel %s" % report["accel"]
+        lines.append("  rayos: " + ", ".join("%s %d" % (kind, report["rays"][kind]) for kind in RAY_KINDS))
+        lines.append("  tiempo: " + ", ".join("%s %.3f s" % item for item in report["times"].items()))
+        for name, methods in report["shapes"].items():
+            if not methods:
+                continue
+            lines.append("  %s: " % name + ", ".join("%s %d/%d" % (method, c["hits"], c["calls"])
+                                                     for method, c in methods.items()))
+        lines.append("  envMap: %d, texturas: %d muestras" % (report["envMisses"], report["textureSamples"]))
+        return "\n".join(lines)
@@ -0,0 +1,219 @@
+"""Texturas como arreglos de NumPy, con filtrado bilineal y mipmaps.
+
+La imagen se convierte una sola vez: los texels originales de 8 bits se
+guardan para el muestreo nearest (que da exactamente los mismos colores que
+Surface.get_at), y una piramide de mipmaps en float32 (0 a 1) sirve para el
+muestreo bilineal y trilineal.
+
+Las coordenadas (u, v) van de 0 a 1 con v creciendo hacia abajo, igual que
+las que generan las figuras; fuera de ese rango se usa el texel del borde.
+
+EnvironmentMap es una textura equirectangular que se consulta por direccion,
+para los rayos que no tocan ninguna figura.
+"""
+from math import floor, log2, atan2, acos, pi
+
+import numpy as np
+import pygame
+
+NEAREST = "nearest"
+BILINEAR = "bilinear"
+TRILINEAR = "trilinear"
+
+# Valor de 0 a 1 de cada canal de 8 bits
+UNIT = [c / 255 for c in range(256)]
+
+
+class Texture(object):
+    def __init__(self, image, mipmaps=True):
+        # image puede ser una Surface de pygame o la ruta de una imagen
+        if isinstance(image, str):
+            image = pygame.image.load(image)
+
+        # surfarray indexa [x][y]; se guarda como [fila][columna]
+        self.pixels = np.ascontiguousarray(pygame.surfarray.array3d(image).transpose(1, 0, 2))
+        self.height, self.width = self.pixels.shape[:2]
+        # Copia plana para el muestreo nearest rayo por rayo, sin pasar por NumPy
+        self.data = self.pixels.tobytes()
+
+        self.levels = [self.pixels.astype(np.float32) / 255]
+        if mipmaps:
+            while max(self.levels[-1].shape[:2]) > 1:
+                self.levels.append(downsample(self.levels[-1]))
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def lod(self, footprint):
+        """ Nivel de mipmap para una huella de footprint (en unidades de uv) por pixel. """
+        texels = footprint * max(self.width, self.height)
+        if texels <= 1:
+            return 0.0
+        return min(log2(texels), len(self.levels) - 1)
+
+    def sample(self, u, v, filter=NEAREST, lod=0.0):
+        """ Color [r, g, b] de 0 a 1 en (u, v). """
+        if filter == NEAREST:
+            x = min(max(int(u * self.width), 0), self.width - 1)
+            y = min(max(int(v * self.height), 0), self.height - 1)
+            i = (y * self.width + x) * 3
+            data = self.data
+            return [UNIT[data[i]], UNIT[data[i + 1]], UNIT[data[i + 2]]]
+
+        if filter == BILINEAR or lod <= 0:
+            return bilinear(self.levels[0], u, v)
+
+        level = min(int(lod), len(self.levels) - 1)
+        color = bilinear(self.levels[level], u, v)
+        if level + 1 < len(self.levels):
+            # Trilineal: mezcla con el siguiente nivel segun la parte fraccionaria
+            blend = lod - level
+            upper = bilinear(self.levels[level + 1], u, v)
+            color = [color[i] * (1 - blend) + upper[i] * blend for i in range(3)]
+        return color
+
+    def sample_many(self, u, v, filter=NEAREST, lod=0.0):
+        """ Colores N x 3 (0 a 1) para los arreglos u y v. lod puede ser un arreglo.
+
+        Con NEAREST los valores son exactamente los de sample (float64); con
+        los filtros son float32, como los niveles de mipmap.
+        """
+        u = np.asarray(u, dtype=float)
+        v = np.asarray(v, dtype=float)
+
+        if filter == NEAREST:
+            x = np.clip((u * self.width).astype(int), 0, self.width - 1)
+            y = np.clip((v * self.height).astype(int), 0, self.height - 1)
+            return self.pixels[y, x] / 255.0
+
+        if filter == BILINEAR:
+            return bilinear_many(self.levels[0], u, v)
+
+        top = len(self.levels) - 1
+        lod = np.clip(np.broadcast_to(np.asarray(lod, dtype=float), u.shape), 0, top)
+        level = np.floor(lod).astype(int)
+        blend = (lod - level).astype(np.float32)[:, None]
+
+        colors = np.zeros((len(u), 3), dtype=np.float32)
+        for i in np.unique(level).tolist():
+            rows = level == i
+            color = bilinear_many(self.levels[i], u[rows], v[rows])
+            if i < top:
+                upper = bilinear_many(self.levels[i + 1], u[rows], v[rows])
+                color = color * (1 - blend[rows]) + upper * blend[rows]
+            colors[rows] = color
+        return colors
+
+
+class EnvironmentMap(Texture):
+    def __init__(self, image, blurWidth=64, blurRadius=2):
+        super().__init__(image)
+        # Copia de baja resolucion ya difuminada, para reflejos asperos
+        self.blurred = prefilter(self.levels, blurWidth, blurRadius)
+
+    def lookup(self, dir, filter=NEAREST, blurred=False):
+        """ Color [r, g, b] de 0 a 1 en la direccion dir (normalizada). """
+        u = atan2(dir[2], dir[0]) / (2 * pi) + 0.5
+        y = dir[1]
+        v = acos(1.0 if y > 1 else -1.0 if y < -1 else y) / pi
+
+        if blurred:
+            return bilinear(self.blurred, u, v, wrap=True)
+        if filter != NEAREST:
+            return bilinear(self.levels[0], u, v, wrap=True)
+
+        # Igual que sample(), escrito en linea porque se llama en cada rayo que escapa
+        width = self.width
+        x = int(u * width)
+        y = int(v * self.height)
+        i = (min(y, self.height - 1) * width + min(x, width - 1)) * 3
+        data = self.data
+        return [UNIT[data[i]], UNIT[data[i + 1]], UNIT[data[i + 2]]]
+
+    def lookup_many(self, dirs, filter=NEAREST, blurred=False):
+        """ Colores N x 3 para un arreglo N x 3 de direcciones. """
+        dirs = np.asarray(dirs, dtype=float).reshape(-1, 3)
+        u = np.arctan2(dirs[:, 2], dirs[:, 0]) / (2 * pi) + 0.5
+        v = np.arccos(np.clip(dirs[:, 1], -1, 1)) / pi
+
+        if blurred:
+            return bilinear_many(self.blurred, u, v, wrap=True)
+        if filter == NEAREST:
+            return self.sample_many(u, v)
+        return bilinear_many(self.levels[0], u, v, wrap=True)
+
+
+def prefilter(levels, width, radius):
+    # Primer mipmap de a lo sumo width columnas, con dos pasadas de un filtro
+    # de caja (aproxima una gaussiana). En horizontal la imagen da la vuelta.
+    level = next((l for l in levels if l.shape[1] <= width), levels[-1])
+    size = 2 * radius + 1
+    for _ in range(2):
+        level = sum(np.roll(level, k, axis=1) for k in range(-radius, radius + 1)) / size
+        padded = np.pad(level, ((radius, radius), (0, 0), (0, 0)), mode="edge")
+        level = sum(padded[k:k + level.shape[0]] for k in range(size)) / size
+    return level.astype(np.float32)
+
+
+def downsample(level):
+    # Promedio de bloques de 2x2; con tamanos impares se repite el borde
+    height, width = level.shape[:2]
+    if height % 2 and height > 1:
+        level = np.concatenate((level, level[-1:]), axis=0)
+    if width % 2 and width > 1:
+        level = np.concatenate((level, level[:, -1:]), axis=1)
+
+    if level.shape[0] > 1:
+        level = (level[0::2] + level[1::2]) / 2
+    if level.shape[1] > 1:
+        level = (level[:, 0::2] + level[:, 1::2]) / 2
+    return level.astype(np.float32)
+
+
+def bilinear(level, u, v, wrap=False):
+    # Con wrap la u da la vuelta (mapas de entorno); si no, se usa el borde
+    height, width = level.shape[:2]
+    x = u * width - 0.5
+    y = v * height - 0.5
+    x0 = floor(x)
+    y0 = floor(y)
+    fx = x - x0
+    fy = y - y0
+
+    if wrap:
+        x0, x1 = x0 % width, (x0 + 1) % width
+    else:
+        x0, x1 = min(max(x0, 0), width - 1), min(max(x0 + 1, 0), width - 1)
+    y0, y1 = min(max(y0, 0), height - 1), min(max(y0 + 1, 0), height - 1)
+
+    top = level[y0, x0] * (1 - fx) + level[y0, x1] * fx
+    bottom = level[y1, x0] * (1 - fx) + level[y1, x1] * fx
+    return (top * (1 - fy) + bottom * fy).tolist()
+
+
+def bilinear_many(level, u, v, wrap=False):
+    height, width = level.shape[:2]
+    x = u * width - 0.5
+    y = v * height - 0.5
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = (x - x0).astype(np.float32)[:, None]
+    fy = (y - y0).astype(np.float32)[:, None]
+
+    x0 = x0.astype(int)
+    y0 = y0.astype(int)
+    if wrap:
+        x1 = (x0 + 1) % width
+        x0 = x0 % width
+    else:
+        x1 = np.clip(x0 + 1, 0, width - 1)
+        x0 = np.clip(x0, 0, width - 1)
+    y1 = np.clip(y0 + 1, 0, height - 1)
+    y0 = np.clip(y0, 0, height - 1)
+
+    top = level[y0, x0] * (1 - fx) + level[y0, x1] * fx
+    bottom = level[y1, x0] * (1 - fx) + level[y1, x1] * fx
+    return top * (1 - fy) + bottom * fy
@@ -0,0 +1,81 @@
+"""Operaciones con vectores de 3 componentes.
+
+Es la unica capa de vectores que usan rt, figures y lights. Cada funcion
+trabaja directo sobre los componentes [0], [1] y [2] (sin zip, generadores ni
+validar longitudes) y devuelve una lista nueva; aceptan listas o tuplas.
+
+Las funciones terminadas en _many hacen lo mismo sobre arreglos de NumPy de
+N x 3 (o un solo vector de 3) y las usan los caminos vectorizados de
+figures, lights, deferred e instance.
+"""
+from math import sqrt
+
+import numpy as np
+
+
+def add(a, b):
+    return [a[0] + b[0], a[1] + b[1], a[2] + b[2]]
+
+
+def subtract(a, b):
+    return [a[0] - b[0], a[1] - b[1], a[2] - b[2]]
+
+
+def multiply(v, scalar):
+    return [v[0] * scalar, v[1] * scalar, v[2] * scalar]
+
+
+def divide(v, scalar):
+    return [v[0] / scalar, v[1] / scalar, v[2] / scalar]
+
+
+def negate(v):
+    return [-v[0], -v[1], -v[2]]
+
+
+def dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def cross(a, b):
+    return [a[1] * b[2] - a[2] * b[1],
+            a[2] * b[0] - a[0] * b[2],
+            a[0] * b[1] - a[1] * b[0]]
+
+
+def magnitude(v):
+    return sqrt(v[0] * v[0] + v[1] * v[1] + v[2] * v[2])
+
+
+def normalize(v):
+    x, y, z = v
+    mag = sqrt(x * x + y * y + z * z)
+    return [x / mag, y / mag, z / mag]
+
+
+def reflect(normal, direction):
+    # 2 (N . D) N - D, normalizado
+    d = 2 * (normal[0] * direction[0] + normal[1] * direction[1] + normal[2] * direction[2])
+    return normalize([d * normal[0] - direction[0],
+                      d * normal[1] - direction[1],
+                      d * normal[2] - direction[2]])
+
+
+def dot_many(a, b):
+    return a[..., 0] * b[..., 0] + a[..., 1] * b[..., 1] + a[..., 2] * b[..., 2]
+
+
+def cross_many(a, b):
+    return np.stack((a[..., 1] * b[..., 2] - a[..., 2] * b[..., 1],
+                     a[..., 2] * b[..., 0] - a[..., 0] * b[..., 2],
+                     a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]), axis=-1)
+
+
+def normalize_many(v):
+    return v / np.sqrt(dot_many(v, v))[..., None]
+
+
+def matrix_vector_many(matrix, v):
+    # matrix (3 x 3) por cada fila de v (N x 3)
+    return np.stack([matrix[i][0] * v[:, 0] + matrix[i][1] * v[:, 1] + matrix[i][2] * v[:, 2]
+                     for i in range(3)], axis=1)